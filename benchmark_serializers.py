@@ -0,0 +1,153 @@
+"""
+Benchmark of the fast read path (fast_serializers.py) against the DRF
+ModelSerializers it replaces, at 10k rows per resource.
+
+    python benchmark_serializers.py --rows 10000 --repeat 3
+
+Runs on a throwaway copy of the database (benchmark.sqlite3, deleted
+afterwards). For options, goals and contexts it checks that both paths
+render identical JSON, then reports the best-of-N time and the query count
+for serializing all rows, and for one API list page of --page-size rows.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class QueryCounter:
+    """Counts queries without keeping them (the debug query log is capped)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fast read serializers")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mantor.settings')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection, transaction
+    from django.db.models import Prefetch
+    from django.db.models.signals import post_save
+    from django.utils import timezone
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+    from life_manager import signals
+    from life_manager.models import StatusGroup, OptionCategory, StatusOption, SituationContext, ContextUsage, PersonalGoal
+    from life_manager.serializers import StatusOptionSerializer, PersonalGoalSerializer, SituationContextSerializer
+    from life_manager.fast_serializers import (
+        FastStatusOptionSerializer, FastPersonalGoalSerializer, FastSituationContextSerializer
+    )
+
+    setup_test_environment()
+    original_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # Seeding shouldn't call n8n
+    post_save.disconnect(signals.trigger_n8n_on_context_save, sender=SituationContext)
+
+    try:
+        n = args.rows
+        print(f"Seeding {n} options, goals and contexts...")
+        with transaction.atomic():
+            user = User.objects.create_user('benchmark', password='benchmark')
+            groups = StatusGroup.objects.bulk_create([StatusGroup(name=f"Group {i}") for i in range(5)])
+            categories = OptionCategory.objects.bulk_create([
+                OptionCategory(group=groups[i % 5], name=f"Category {i}") for i in range(50)
+            ])
+            options = StatusOption.objects.bulk_create([
+                StatusOption(group=groups[i % 5], category=categories[i % 50] if i % 3 else None,
+                             user=user, name=f"Option {i}", icon='fa-tag')
+                for i in range(n)
+            ])
+            contexts = SituationContext.objects.bulk_create([
+                SituationContext(unique_signature=f"bench-{i}") for i in range(n)
+            ])
+            # The contexts API lists the contexts the user has used
+            now = timezone.now()
+            ContextUsage.objects.bulk_create([
+                ContextUsage(user=user, context=context, first_used_at=now, last_used_at=now) for context in contexts
+            ], batch_size=5000)
+            through = SituationContext.options.through
+            through.objects.bulk_create([
+                through(situationcontext_id=context.id, statusoption_id=options[(i * 7 + k) % n].id)
+                for i, context in enumerate(contexts) for k in range(5)
+            ], batch_size=5000)
+            PersonalGoal.objects.bulk_create([
+                PersonalGoal(user=user, title=f"Goal {i}", description="Lorem ipsum " * 10,
+                             importance=1 + i % 4, is_completed=i % 5 == 0, context=contexts[i])
+                for i in range(n)
+            ])
+
+        cases = [
+            ('options', StatusOption.objects.filter(user=user).select_related('group', 'category').order_by('id'),
+             StatusOptionSerializer, FastStatusOptionSerializer),
+            ('goals', PersonalGoal.objects.filter(user=user).order_by('-importance', '-created_at', '-id'),
+             PersonalGoalSerializer, FastPersonalGoalSerializer),
+            # Same prefetch as ContextViewSet with options_details (group names)
+            ('contexts', SituationContext.objects.filter(usages__user=user).prefetch_related(
+                Prefetch('options', queryset=StatusOption.objects.select_related('group'))
+            ).order_by('-created_at', '-id'),
+             SituationContextSerializer, FastSituationContextSerializer),
+        ]
+        renderer = JSONRenderer()
+
+        print(f"\n--- Serializing all {n} rows (best of {args.repeat}) ---")
+        for name, queryset, serializer_class, fast_class in cases:
+            slow_queries = QueryCounter()
+            with connection.execute_wrapper(slow_queries):
+                slow_time, slow_data = best_of(args.repeat, lambda: serializer_class(queryset.all(), many=True).data)
+            fast = fast_class()
+            fast_queries = QueryCounter()
+            with connection.execute_wrapper(fast_queries):
+                fast_time, fast_data = best_of(args.repeat, lambda: fast.to_representation(fast.values(queryset.all())))
+            same = renderer.render(slow_data) == renderer.render(fast_data)
+            print(f"{name:<9} drf={slow_time * 1000:8.1f}ms ({slow_queries.count // args.repeat} queries)  "
+                  f"fast={fast_time * 1000:8.1f}ms ({fast_queries.count // args.repeat} queries)  "
+                  f"speedup={slow_time / fast_time:5.1f}x  identical={same}")
+
+        print(f"\n--- GET list page of {args.page_size} (best of {args.repeat}) ---")
+        client = Client()
+        client.force_login(user)
+        for name, query in (('options', ''), ('goals', ''), ('contexts', 'expand=options_details&')):
+            url = f"/{name}/?{query}page_size={args.page_size}"
+            slow_time, slow_response = best_of(args.repeat, lambda: client.get(url))
+            fast_time, fast_response = best_of(args.repeat, lambda: client.get(url + '&fast=1'))
+            results = json.loads(slow_response.content)['results']
+            same = results == json.loads(fast_response.content)['results']
+            print(f"{name:<9} rows={len(results):<5} drf={slow_time * 1000:8.1f}ms  fast={fast_time * 1000:8.1f}ms  "
+                  f"speedup={slow_time / fast_time:5.1f}x  identical={same}")
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(original_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
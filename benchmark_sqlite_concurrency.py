@@ -0,0 +1,166 @@
+"""
+Concurrent read/write benchmark of the SQLite settings (SQLITE_OPTIONS in
+mantor/settings.py) against Django's SQLite defaults.
+
+    python benchmark_sqlite_concurrency.py --writers 4 --readers 8 --seconds 10
+
+Each profile runs on its own throwaway databases (benchmark_sqlite_<profile>_<alias>.sqlite3
+for the main and chat databases, deleted afterwards) with the same workload:
+    writers  what the n8n worker threads do when a reply lands: in one
+             transaction, read the session, then save an assistant ChatMessage
+             (signals update the session stats, resource versions and search index),
+             then record a context usage in autocommit mode
+    readers  what the API does: the newest messages of a session and the
+             user's session list
+
+Reports operations per second, p95 latency and "database is locked" errors
+per thread kind.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+PROFILES = ['default', 'tuned']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {'write': [], 'read': []}
+        self.locked = {'write': 0, 'read': 0}
+        self.other_errors = {'write': 0, 'read': 0}
+
+    def add(self, kind, elapsed=None, locked=False, error=False):
+        with self.lock:
+            if locked:
+                self.locked[kind] += 1
+            elif error:
+                self.other_errors[kind] += 1
+            else:
+                self.latencies[kind].append(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite reads and writes")
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--profile', choices=PROFILES + ['both'], default='both')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mantor.settings')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import OperationalError, connections, transaction
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment
+    from django.contrib.auth.models import User
+    from life_manager.models import SituationContext, ChatSession, ChatMessage
+    from life_manager.routers import chat_db
+    from life_manager.services import record_context_usage
+
+    setup_test_environment()
+    options = {
+        # Django's defaults (deferred transactions, 5s timeout), rollback journal
+        'default': {'init_command': 'PRAGMA journal_mode=DELETE'},
+        'tuned': dict(settings.SQLITE_OPTIONS),
+    }
+
+    def run_profile(profile):
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if settings_dict['TEST'].get('MIRROR'):
+                continue  # The read replica stays a read-only view of the main test database
+            settings_dict['OPTIONS'] = options[profile]
+            settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / f'benchmark_sqlite_{profile}_{alias}.sqlite3')
+        connections.close_all()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+
+        try:
+            user = User.objects.create_user(f'bench-{profile}', password='bench')
+            sessions = [ChatSession.objects.create(user=user, title=f"Bench {i}") for i in range(args.sessions)]
+            contexts = [SituationContext.objects.create(unique_signature=f"bench-{i}") for i in range(args.sessions)]
+            journal_mode = connections[chat_db()].cursor().execute('PRAGMA journal_mode').fetchone()[0]
+
+            results = Results()
+            deadline = time.perf_counter() + args.seconds
+            start_barrier = threading.Barrier(args.writers + args.readers)
+
+            def timed(kind, fn):
+                start = time.perf_counter()
+                try:
+                    fn()
+                except OperationalError as exc:
+                    results.add(kind, locked='locked' in str(exc), error='locked' not in str(exc))
+                    return
+                results.add(kind, time.perf_counter() - start)
+
+            def writer(index):
+                start_barrier.wait()
+                i = 0
+                try:
+                    while time.perf_counter() < deadline:
+                        session_id = sessions[(index + i) % len(sessions)].id
+
+                        def save_reply():
+                            with transaction.atomic(using=chat_db()):
+                                session = ChatSession.objects.get(id=session_id)
+                                ChatMessage.objects.create(session=session, role='assistant', content=f"Reply {index}-{i}")
+
+                        timed('write', save_reply)
+                        timed('write', lambda: record_context_usage(user.id, contexts[i % len(contexts)].id))
+                        i += 1
+                finally:
+                    connections.close_all()
+
+            def reader(index):
+                start_barrier.wait()
+                i = 0
+                try:
+                    while time.perf_counter() < deadline:
+                        session_id = sessions[(index + i) % len(sessions)].id
+                        timed('read', lambda: list(ChatMessage.objects.filter(session_id=session_id).order_by('-id')[:50]))
+                        timed('read', lambda: list(ChatSession.objects.filter(user=user).order_by('-created_at', '-id')[:50]))
+                        i += 1
+                finally:
+                    connections.close_all()
+
+            threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+            threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            print(f"\n{profile} (journal_mode={journal_mode}, transaction_mode={options[profile].get('transaction_mode') or 'DEFERRED'})")
+            for kind in ('write', 'read'):
+                ms = [value * 1000 for value in results.latencies[kind]]
+                print(f"  {kind:<6} {len(ms) / args.seconds:9.1f} ops/s  p95={percentile(ms, 95):8.1f}ms  "
+                      f"locked={results.locked[kind]:<5} other errors={results.other_errors[kind]}")
+        finally:
+            connections.close_all()
+            runner.teardown_databases(old_config)
+
+    print(f"{args.writers} writer and {args.readers} reader threads, {args.seconds:.0f}s per profile")
+    for profile in PROFILES if args.profile == 'both' else [args.profile]:
+        run_profile(profile)
+
+
+if __name__ == '__main__':
+    main()
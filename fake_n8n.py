@@ -0,0 +1,191 @@
+"""
+Local stand-in for the n8n webhooks the app calls, for development and load tests.
+
+    python fake_n8n.py --port 5678 --latency lognormal:-1.5,0.6 --error-rate 0.05 --started-rate 0.05 --stream-rate 0.5
+
+Then point the app at it with N8N_BASE_URL=http://127.0.0.1:5678 (the default).
+
+Endpoints:
+    /webhook/context-trigger   context payloads and generate_plan (returns a plan)
+    /webhook/context-batch     batch mode, gzip bodies accepted, per-item results
+    /webhook/chat-trigger      chat replies, optionally streamed as JSON lines
+    /webhook/chat-summary      rolling chat summary
+    GET /stats                 request counters
+
+Latency distributions (seconds): fixed:S | uniform:LOW,HIGH | normal:MEAN,SD | lognormal:MU,SIGMA
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_latency(spec):
+    """
+    Turns a latency spec into a zero-argument sampler returning seconds.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    if kind == 'fixed':
+        return lambda: values[0] if values else 0.0
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeN8nConfig:
+    def __init__(self, latency='fixed:0.05', error_rate=0.0, started_rate=0.0, stream_rate=0.0,
+                 chunk_delay=0.02, chunks=8):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.started_rate = started_rate
+        self.stream_rate = stream_rate
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+
+class FakeN8nHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None  # Set by make_server
+
+    def log_message(self, format, *args):
+        pass  # Keep load-test output readable
+
+    # --- helpers ---
+
+    def _read_json(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            return {}
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, text):
+        """n8n streaming mode: JSON lines over a chunked response."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_line(item):
+            line = (json.dumps(item) + '\n').encode('utf-8')
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        write_line({"type": "begin"})
+        words = text.split(' ')
+        step = max(1, len(words) // self.config.chunks)
+        for i in range(0, len(words), step):
+            time.sleep(self.config.chunk_delay)
+            write_line({"type": "item", "content": ' '.join(words[i:i + step]) + ' '})
+        write_line({"type": "end"})
+        self.wfile.write(b"0\r\n\r\n")
+
+    # --- routes ---
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.config.stats_lock:
+                return self._send_json(dict(self.config.stats))
+        self._send_json({"message": "Not found"}, status=404)
+
+    def do_POST(self):
+        config = self.config
+        payload = self._read_json()
+        config.count(self.path)
+        time.sleep(config.latency())
+
+        if random.random() < config.error_rate:
+            config.count('errors')
+            return self._send_json({"message": "Error in workflow"}, status=500)
+
+        if self.path == '/webhook/context-batch':
+            results = [
+                {"context_id": item.get('context_id'), "ok": random.random() >= config.error_rate}
+                for item in payload.get('items', [])
+            ]
+            return self._send_json({"results": results})
+
+        if random.random() < config.started_rate:
+            config.count('workflow_started')
+            return self._send_json({"message": "Workflow was started"})
+
+        if self.path == '/webhook/chat-trigger':
+            reply = f"Fake reply to: {payload.get('message', '')} " + "lorem ipsum " * 20
+            if random.random() < config.stream_rate:
+                config.count('streamed')
+                return self._send_stream(reply.strip())
+            return self._send_json({"response": reply.strip()})
+
+        if self.path == '/webhook/chat-summary':
+            lines = [payload.get('summary', '')] + [m.get('content', '')[:80] for m in payload.get('messages', [])]
+            return self._send_json({"summary": '\n'.join(line for line in lines if line)})
+
+        if self.path == '/webhook/context-trigger':
+            return self._send_json({
+                "title": "Fake Plan",
+                "summary": f"Plan for context {payload.get('context_id')}",
+                "recommendation": "1. Breathe.\n2. Do the most important thing first.",
+            })
+
+        self._send_json({"message": "Not found"}, status=404)
+
+
+def make_server(host='127.0.0.1', port=5678, **config_kwargs):
+    """
+    Builds (server, config) without starting it; call server.serve_forever().
+    """
+    config = FakeN8nConfig(**config_kwargs)
+    handler = type('ConfiguredFakeN8nHandler', (FakeN8nHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake n8n webhook server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5678)
+    parser.add_argument('--latency', default='fixed:0.05', help="e.g. fixed:0.2, uniform:0.1,1, lognormal:-1.5,0.6")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument('--started-rate', type=float, default=0.0, help="Share answered with 'Workflow was started'")
+    parser.add_argument('--stream-rate', type=float, default=0.0, help="Share of chat replies streamed as JSON lines")
+    parser.add_argument('--chunk-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, _ = make_server(
+        args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+        started_rate=args.started_rate, stream_rate=args.stream_rate, chunk_delay=args.chunk_delay
+    )
+    print(f"Fake n8n listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
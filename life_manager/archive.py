@@ -0,0 +1,182 @@
+"""
+Cold storage for chat.
+
+Sessions without a message for CHAT_ARCHIVE_AFTER_DAYS are archived (the
+archive_chats command): their messages are serialized as one JSON
+transcript, zlib-compressed into a ChatArchive row and deleted from
+ChatMessage, which keeps the hot table and its indexes small. Archived
+messages are no longer in the search index nor in event catch-up.
+
+Reads stay transparent: session_messages() returns the archived messages
+as unsaved ChatMessage instances with their original ids and timestamps,
+so the serializers don't know the difference. A new message in an
+archived session restores the transcript first (see signals.py), keeping
+the ids in order for the history and summary code. The message list
+endpoint (/chat_messages/) only reads ChatMessage.
+
+Archiving and restoring a session hold its row lock, and the message
+signals update that row before checking for an archive, so a message
+that races the archiver is either archived with the rest or restores the
+session right after it is saved; none is left behind next to an archive.
+"""
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatSession, ChatMessage, ChatArchive
+from .routers import chat_db
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_session(session_id):
+    """
+    Locks the session row (archiving, restoring and new messages' stats
+    updates of one session are serialized). Returns its last_message_at
+    as {'last_message_at': ...}, or None if it's gone.
+    """
+    return ChatSession.objects.select_for_update().filter(id=session_id).values('last_message_at').first()
+
+
+def _delete_messages(session_id, last_message_id):
+    # In SQL: the ORM's delete signals would decrement the session's message
+    # count and record versions for messages that are only moving
+    with connections[chat_db()].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {ChatMessage._meta.db_table} WHERE session_id = %s AND id <= %s",
+            [session_id, last_message_id]
+        )
+
+
+def _insert_messages(messages):
+    # In SQL: bulk_create would stamp the messages with the current time
+    # (auto_now_add). Original ids are below any message written since, so
+    # the order is kept.
+    connection = connections[chat_db()]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {ChatMessage._meta.db_table} (id, session_id, role, content, timestamp) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            [(m.id, m.session_id, m.role, m.content, connection.ops.adapt_datetimefield_value(m.timestamp))
+             for m in messages],
+        )
+
+
+def pack(messages):
+    """(transcript blob, raw size) for messages ordered by id."""
+    raw = json.dumps(
+        [[m.id, m.role, m.content, m.timestamp.isoformat()] for m in messages],
+        ensure_ascii=False, separators=(',', ':'),
+    ).encode('utf-8')
+    return zlib.compress(raw, getattr(settings, 'CHAT_ARCHIVE_COMPRESSION_LEVEL', 6)), len(raw)
+
+
+def unpack(archive):
+    """The archived messages, oldest first, as unsaved ChatMessage instances."""
+    rows = json.loads(zlib.decompress(bytes(archive.transcript)).decode('utf-8'))
+    return [
+        ChatMessage(id=message_id, session_id=archive.session_id, role=role, content=content,
+                    timestamp=parse_datetime(timestamp))
+        for message_id, role, content, timestamp in rows
+    ]
+
+
+def archive_session(session_id, cutoff=None):
+    """
+    Moves the session's messages into its archive. Returns the archive, or
+    None if there was nothing to archive (no messages, already archived, or
+    a message since `cutoff`, re-checked under the lock).
+    """
+    with transaction.atomic(using=chat_db()):
+        session = _lock_session(session_id)
+        if session is None or ChatArchive.objects.filter(session_id=session_id).exists():
+            return None
+        if cutoff is not None and (session['last_message_at'] is None or session['last_message_at'] >= cutoff):
+            return None
+        messages = list(ChatMessage.objects.filter(session_id=session_id).order_by('id'))
+        if not messages:
+            return None
+        transcript, raw_size = pack(messages)
+        archive = ChatArchive.objects.create(
+            session_id=session_id, transcript=transcript, message_count=len(messages), raw_size=raw_size,
+            first_message_id=messages[0].id, last_message_id=messages[-1].id,
+        )
+        _delete_messages(session_id, messages[-1].id)
+    return archive
+
+
+def restore_session(session_id):
+    """Moves an archived session's messages back into ChatMessage. Returns how many."""
+    with transaction.atomic(using=chat_db()):
+        if _lock_session(session_id) is None:
+            return 0
+        archive = ChatArchive.objects.filter(session_id=session_id).first()
+        if archive is None:
+            return 0
+        messages = unpack(archive)
+        _insert_messages(messages)
+        archive.delete()
+    return len(messages)
+
+
+def inactivity_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'CHAT_ARCHIVE_AFTER_DAYS', 30)
+    return timezone.now() - timedelta(days=days)
+
+
+def inactive_sessions(days=None, cutoff=None):
+    """Unarchived sessions with messages, none of them in the last `days` days (or since `cutoff`)."""
+    if cutoff is None:
+        cutoff = inactivity_cutoff(days)
+    return ChatSession.objects.filter(
+        last_message_at__lt=cutoff, message_count__gt=0, archive__isnull=True
+    ).order_by('last_message_at', 'id')
+
+
+def archive_inactive_sessions(days=None, limit=None):
+    """Archives inactive sessions one transaction each. Returns [ChatArchive]."""
+    cutoff = inactivity_cutoff(days)
+    session_ids = inactive_sessions(cutoff=cutoff).values_list('id', flat=True)
+    if limit:
+        session_ids = session_ids[:limit]
+    archives = []
+    for session_id in list(session_ids):
+        archive = archive_session(session_id, cutoff)
+        if archive is not None:
+            archives.append(archive)
+    logger.info(f"Archived {len(archives)} chat sessions")
+    return archives
+
+
+def archived_messages(session_id):
+    """The archived messages of a session, oldest first, or None if it isn't archived."""
+    archive = ChatArchive.objects.filter(session_id=session_id).first()
+    return None if archive is None else unpack(archive)
+
+
+def session_messages(session):
+    """
+    The session's messages, from ChatMessage or its archive. Uses the
+    prefetched messages and the selected archive when there are.
+    """
+    try:
+        return unpack(session.archive)
+    except ChatArchive.DoesNotExist:
+        return list(session.messages.all())
+
+
+def archived_message(user, message_id):
+    """An archived message of the user's (any user's for staff), or None."""
+    archives = ChatArchive.objects.all() if user.is_staff else ChatArchive.objects.filter(session__user=user)
+    for archive in archives.filter(last_message_id__gte=message_id, first_message_id__lte=message_id):
+        for message in unpack(archive):
+            if message.id == message_id:
+                return message
+    return None
@@ -0,0 +1,203 @@
+"""
+Per-user live events (new chat messages, new recommendations, streamed
+reply chunks) for the Server-Sent Events endpoint.
+
+Events are pushed through an in-process broker. The event id is a cursor
+over both tables ("<last message id>.<last recommendation id>"), so a client
+reconnecting with Last-Event-ID is caught up straight from the database, and
+events saved by another worker process are picked up on the next heartbeat.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+
+from .models import ChatMessage, AiRecommendation
+from .serializers import ChatMessageSerializer, AiRecommendationSerializer
+
+logger = logging.getLogger(__name__)
+
+# Max rows replayed per table on (re)connect or heartbeat catch-up
+CATCH_UP_LIMIT = 200
+
+# Events buffered per connection before it falls back to a DB catch-up
+SUBSCRIBER_QUEUE_SIZE = 100
+
+RESYNC = object()
+
+
+class EventBroker:
+    """
+    Fans out events published from any thread (request threads, n8n worker
+    threads) to the asyncio queues of the user's open streams.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data, object_id=None):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_enqueue, queue, (event, data, object_id))
+            except RuntimeError:
+                pass  # Loop already closed; the stream is going away
+
+
+def _enqueue(queue, item):
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # Slow client: drop the backlog and let it re-read from the DB instead
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+event_broker = EventBroker()
+
+
+# --- Publishing (called from signals / the n8n worker threads) ---
+
+def publish_chat_message(message, user_id):
+    event_broker.publish(user_id, "chat.message", ChatMessageSerializer(message).data, message.id)
+
+
+def publish_recommendation(recommendation):
+    if recommendation.user_id:
+        event_broker.publish(
+            recommendation.user_id, "recommendation", AiRecommendationSerializer(recommendation).data, recommendation.id
+        )
+
+
+def publish_chat_chunk(user_id, session_id, delta):
+    event_broker.publish(user_id, "chat.chunk", {"session": session_id, "delta": delta})
+
+
+# --- Stream cursor & DB catch-up ---
+
+class StreamCursor:
+    """
+    Position of a stream in both tables; this is what goes in the SSE id field.
+    """
+
+    def __init__(self, message_id=0, recommendation_id=0):
+        self.message_id = message_id
+        self.recommendation_id = recommendation_id
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            message_id, recommendation_id = (int(part) for part in value.split("."))
+        except (AttributeError, ValueError):
+            return None
+        return cls(message_id, recommendation_id)
+
+    @classmethod
+    def latest(cls, user_id):
+        message_id = ChatMessage.objects.filter(session__user_id=user_id).order_by('-id').values_list('id', flat=True).first()
+        recommendation_id = AiRecommendation.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first()
+        return cls(message_id or 0, recommendation_id or 0)
+
+    def advance(self, event, object_id):
+        if event == "chat.message":
+            self.message_id = max(self.message_id, object_id)
+        elif event == "recommendation":
+            self.recommendation_id = max(self.recommendation_id, object_id)
+
+    def __str__(self):
+        return f"{self.message_id}.{self.recommendation_id}"
+
+
+def catch_up(user_id, cursor):
+    """
+    Returns [(event, data, object_id)] saved after the cursor, oldest first.
+    """
+    messages = ChatMessage.objects.filter(session__user_id=user_id, id__gt=cursor.message_id).order_by('id')[:CATCH_UP_LIMIT]
+    recommendations = AiRecommendation.objects.filter(user_id=user_id, id__gt=cursor.recommendation_id).order_by('id')[:CATCH_UP_LIMIT]
+    events = [("chat.message", ChatMessageSerializer(m).data, m.id) for m in messages]
+    events += [("recommendation", AiRecommendationSerializer(r).data, r.id) for r in recommendations]
+    return events
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(user_id, cursor, heartbeat=15):
+    """
+    Async generator of SSE frames for one connection.
+    Subscribes before the initial catch-up so nothing falls in between.
+    """
+    from asgiref.sync import sync_to_async
+
+    subscription = event_broker.subscribe(user_id)
+    queue = subscription[1]
+    # Ids already sent, so live events and catch-up reads don't double up
+    sent = deque(maxlen=2 * CATCH_UP_LIMIT)
+
+    def _frames(events):
+        for event, data, object_id in events:
+            if (event, object_id) in sent:
+                continue
+            sent.append((event, object_id))
+            cursor.advance(event, object_id)
+            yield format_event(event, data, cursor)
+
+    try:
+        if cursor is None:
+            cursor = await sync_to_async(StreamCursor.latest)(user_id)
+            backlog = []
+        else:
+            backlog = await sync_to_async(catch_up)(user_id, cursor)
+        yield "retry: 3000\n\n"
+        for frame in _frames(backlog):
+            yield frame
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is None or item is RESYNC:
+                # Also picks up rows saved by other worker processes
+                backlog = await sync_to_async(catch_up)(user_id, cursor)
+                if backlog:
+                    for frame in _frames(backlog):
+                        yield frame
+                else:
+                    yield ": keepalive\n\n"
+                continue
+
+            event, data, object_id = item
+            if object_id is None:
+                # Ephemeral (e.g. streamed reply chunks): not resumable, no id
+                yield format_event(event, data)
+            else:
+                for frame in _frames([item]):
+                    yield frame
+    finally:
+        event_broker.unsubscribe(user_id, subscription)
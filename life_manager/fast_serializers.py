@@ -0,0 +1,134 @@
+"""
+Read-only fast paths for the hot list/retrieve endpoints.
+
+Each class mirrors one DRF serializer's output exactly (same keys, same
+order, same formatting) but reads rows with `.values()` and builds plain
+dicts, skipping model instantiation and the per-field serializer machinery.
+Used by FastReadMixin when the request opts in with ?fast=1 (or the
+FAST_READ_SERIALIZATION setting is on). Keep them in sync with
+serializers.py when a serializer's fields change.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from .models import StatusOption, PersonalGoal, SituationContext
+
+# DRF's own formatting (timezone conversion, DATETIME_FORMAT, 'Z' suffix)
+_datetime = serializers.DateTimeField()
+
+
+def format_datetime(value):
+    return _datetime.to_representation(value) if value is not None else None
+
+
+class FastSerializer:
+    """
+    `fields`: the output field names to keep (what the DRF serializer would
+    render for this request, see SparseFieldsetMixin); None keeps them all.
+    """
+    def __init__(self, fields=None):
+        self.fields = set(fields) if fields is not None else None
+
+    def wants(self, name):
+        return self.fields is None or name in self.fields
+
+    def trim(self, items):
+        if self.fields is None:
+            return items
+        return [{key: value for key, value in item.items() if key in self.fields} for item in items]
+
+
+class FastStatusOptionSerializer(FastSerializer):
+    """Same output as StatusOptionSerializer."""
+    columns = ('id', 'name', 'icon', 'group_id', 'group__name', 'category_id')
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, rows):
+        return self.trim([
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'icon': row['icon'],
+                'group': row['group_id'],
+                'group_name': row['group__name'],
+                'category': row['category_id'],
+                # Write-only in practice: the model has no such attribute, so DRF renders null
+                'category_name': None,
+                'category_id': row['category_id'],
+            }
+            for row in rows
+        ])
+
+
+class FastPersonalGoalSerializer(FastSerializer):
+    """Same output as PersonalGoalSerializer."""
+    columns = ('id', 'title', 'description', 'importance', 'is_completed', 'linked_option_id',
+               'context_id', 'deadline', 'created_at', 'chat_session_id')
+    importance_labels = dict(PersonalGoal.IMPORTANCE_CHOICES)
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, rows):
+        labels = self.importance_labels
+        return self.trim([
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'importance': row['importance'],
+                'importance_display': labels.get(row['importance'], row['importance']),
+                'is_completed': row['is_completed'],
+                'linked_option': row['linked_option_id'],
+                'context': row['context_id'],
+                'deadline': format_datetime(row['deadline']),
+                'created_at': format_datetime(row['created_at']),
+                'chat_session': row['chat_session_id'],
+            }
+            for row in rows
+        ])
+
+
+class FastSituationContextSerializer(FastSerializer):
+    """
+    Same output as SituationContextSerializer, including the nested
+    options_details when expanded, with up to two extra queries per page
+    (membership and options) instead of a prefetch plus a group lookup per option.
+    """
+    columns = ('id', 'unique_signature', 'created_at')
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        option_ids = defaultdict(list)
+        if self.wants('options') or self.wants('options_details'):
+            through = SituationContext.options.through
+            # Option id order, as the prefetch behind the DRF serializer returns them
+            memberships = through.objects.filter(
+                situationcontext_id__in=[row['id'] for row in rows]
+            ).order_by('statusoption_id').values_list('situationcontext_id', 'statusoption_id')
+            for context_id, option_id in memberships:
+                option_ids[context_id].append(option_id)
+
+        wanted = {option_id for ids in option_ids.values() for option_id in ids}
+        options = {}
+        if wanted and self.wants('options_details'):
+            option_serializer = FastStatusOptionSerializer()
+            option_rows = option_serializer.values(StatusOption.objects.filter(id__in=wanted))
+            options = {option['id']: option for option in option_serializer.to_representation(option_rows)}
+
+        return self.trim([
+            {
+                'id': row['id'],
+                'unique_signature': row['unique_signature'],
+                'created_at': format_datetime(row['created_at']),
+                'options': option_ids[row['id']],
+                'options_details': [options[option_id] for option_id in option_ids[row['id']] if option_id in options],
+            }
+            for row in rows
+        ])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+
+from life_manager.archive import archive_inactive_sessions, inactive_sessions
+from life_manager.routers import chat_db
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the messages of chat sessions inactive for CHAT_ARCHIVE_AFTER_DAYS into compressed "
+        "ChatArchive transcripts (run daily). Archived sessions read the same through the API, "
+        "and come back to the message table on their next message."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Inactivity threshold (default CHAT_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--limit', type=int, default=None, help="Archive at most this many sessions.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the sessions that would be archived.")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM the chat database afterwards to return the freed pages (SQLite; locks it meanwhile).")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            sessions = inactive_sessions(options['days'])
+            stats = sessions.aggregate(messages=Sum('message_count'))
+            self.stdout.write(f"{sessions.count()} sessions ({stats['messages'] or 0} messages) would be archived.")
+            return
+
+        archives = archive_inactive_sessions(options['days'], options['limit'])
+        messages = sum(archive.message_count for archive in archives)
+        raw = sum(archive.raw_size for archive in archives)
+        compressed = sum(len(archive.transcript) for archive in archives)
+        ratio = f", {raw / compressed:.1f}x compression" if compressed else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {len(archives)} sessions ({messages} messages, {raw} -> {compressed} bytes{ratio})."
+        ))
+
+        connection = connections[chat_db()]
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+            self.stdout.write("Vacuumed the chat database.")
@@ -0,0 +1,124 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from life_manager import views
+from life_manager.models import (
+    SituationContext, ContextUsage, Note, PersonalGoal, ChatSession, ChatMessage,
+    Achievement, AiRecommendation, SyncTombstone, ResourceVersion,
+)
+from life_manager.services import get_all_relevant_goals
+
+# Ids only shape the plan, not the rows, so they need not exist
+SAMPLE_ID = 1
+PAGE_SIZE = 50
+
+# API list endpoints: the viewset's own queryset in its keyset order, one page
+VIEWSETS = [
+    ('api.chat_sessions', views.ChatSessionViewSet),
+    ('api.chat_messages', views.ChatMessageViewSet),
+    ('api.contexts', views.ContextViewSet),
+    ('api.notes', views.NoteViewSet),
+    ('api.goals', views.GoalViewSet),
+    ('api.subtasks', views.SubTaskViewSet),
+    ('api.achievements', views.AchievementViewSet),
+    ('api.recommendations', views.RecommendationViewSet),
+    ('api.options', views.OptionViewSet),
+    ('api.presets', views.PresetViewSet),
+]
+
+
+def viewset_queryset(viewset_class, user):
+    request = Request(APIRequestFactory().get('/'))
+    request.user = user
+    view = viewset_class(request=request, action='list', format_kwarg=None, kwargs={})
+    queryset = view.filter_queryset(view.get_queryset())
+    ordering = getattr(view, 'keyset_ordering', None)
+    return (queryset.order_by(*ordering) if ordering else queryset)[:PAGE_SIZE]
+
+
+def hot_querysets(user):
+    """(name, queryset) for the queries behind the dashboard, the API lists and the n8n hooks."""
+    context = SituationContext(id=SAMPLE_ID)
+    querysets = [
+        ('dashboard.notes', context.notes.all()),
+        ('dashboard.goals', get_all_relevant_goals(context)),
+        ('dashboard.recommendations', context.recommendations.filter(priority__gte=1).order_by('-priority', '-created_at')),
+        ('dashboard.context_usage', ContextUsage.objects.filter(user_id=user.id, context_id=SAMPLE_ID)),
+        ('dashboard.previous_context', ContextUsage.objects.filter(user_id=user.id).order_by('-last_used_at', '-id')[:1]),
+        ('quick_switch.recent', ContextUsage.objects.filter(user_id=user.id).order_by('-last_used_at', '-id')[:10]),
+        ('quick_switch.frequent', ContextUsage.objects.filter(user_id=user.id, visit_count__gt=0)
+         .order_by('-visit_count', '-last_used_at', '-id')[:10]),
+        ('payload.notes', Note.objects.filter(context_id=SAMPLE_ID).order_by('-created_at', '-id')[:5]),
+        ('payload.goals', PersonalGoal.objects.filter(context_id=SAMPLE_ID, is_completed=False)[:5]),
+        ('goals.open', PersonalGoal.objects.filter(user=user, is_completed=False).order_by('-importance', '-created_at')),
+        ('chat.history_tail', ChatMessage.objects.filter(session_id=SAMPLE_ID, id__gt=0).order_by('-id')[:40]),
+        ('chat.messages_page', ChatMessage.objects.filter(session_id=SAMPLE_ID).order_by('-id')[:PAGE_SIZE]),
+        ('chat.session_timeline', ChatMessage.objects.filter(session_id=SAMPLE_ID).order_by('timestamp')),
+        ('achievements.recent', Achievement.objects.filter(user=user).order_by('-date_achieved')[:PAGE_SIZE]),
+        ('events.catch_up_messages', ChatMessage.objects.filter(session__user_id=user.id, id__gt=0).order_by('id')[:PAGE_SIZE]),
+        ('events.catch_up_recommendations', AiRecommendation.objects.filter(user_id=user.id, id__gt=0).order_by('id')[:PAGE_SIZE]),
+        ('sync.tombstones', SyncTombstone.objects.filter(user=user, deleted_at__gte=timezone.now())),
+        ('versions.state', ResourceVersion.objects.filter(Q(user__isnull=True) | Q(user_id=user.id), resource__in=['notes'])),
+        ('chat.sessions_with_user', ChatSession.objects.filter(user=user).order_by('-created_at', '-id')[:PAGE_SIZE]),
+    ]
+    querysets += [(name, viewset_queryset(viewset_class, user)) for name, viewset_class in VIEWSETS]
+    return querysets
+
+
+def explain(queryset):
+    """EXPLAIN QUERY PLAN rows (id, parent, detail) of the queryset's SQL."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [(row[0], row[1], row[-1]) for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    """A table walked row by row: 'SCAN t', as opposed to SEARCH or SCAN ... USING INDEX."""
+    return detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail \
+        and not detail.startswith('SCAN (subquery') and 'VIRTUAL TABLE' not in detail
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN QUERY PLAN for the hot querysets of the dashboard, the API list "
+        "endpoints and the n8n hooks, and flags full table scans and temporary sorts. SQLite only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not only the flagged ones.")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any full scan is found.")
+
+    def handle(self, *args, **options):
+        user = User(id=SAMPLE_ID, username='audit')
+        full_scans = 0
+        sorts = 0
+
+        for name, queryset in hot_querysets(user):
+            if connections[queryset.db].vendor != 'sqlite':
+                raise CommandError(f"{name}: EXPLAIN QUERY PLAN needs SQLite, '{queryset.db}' is {connections[queryset.db].vendor}.")
+            plan = explain(queryset)
+            scans = [detail for _, _, detail in plan if is_full_scan(detail)]
+            temp_sorts = [detail for _, _, detail in plan if 'USE TEMP B-TREE' in detail]
+            full_scans += len(scans)
+            sorts += len(temp_sorts)
+
+            if scans:
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}: {'; '.join(scans)}"))
+            elif temp_sorts:
+                self.stdout.write(self.style.WARNING(f"TEMP SORT  {name}: {'; '.join(temp_sorts)}"))
+            else:
+                self.stdout.write(f"ok         {name}")
+            if options['verbose_plans'] or scans:
+                for _, parent, detail in plan:
+                    self.stdout.write(f"               {'  ' if parent else ''}{detail}")
+
+        summary = f"{full_scans} full scan(s), {sorts} temporary sort(s)."
+        if full_scans and options['strict']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not full_scans else self.style.WARNING(summary))
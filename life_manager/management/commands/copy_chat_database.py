@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+from life_manager.models import ChatSession, ChatMessage, ChatArchive
+from life_manager.routers import chat_db
+
+BATCH_SIZE = 2000
+
+MESSAGE_STATS = ('message_count', 'last_message_preview', 'last_message_at')
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the chat sessions and messages stored in the main database (before CHAT_DATABASE "
+        "was set) into the chat database, keeping their ids and timestamps so linked notes and goals "
+        "still resolve. Migrate the chat database first: manage.py migrate --database=chat"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Replace the chat database's sessions and messages if it already has some.")
+
+    def handle(self, *args, **options):
+        target = chat_db()
+        if target == DEFAULT_DB_ALIAS:
+            raise CommandError("CHAT_DATABASE is the main database: nothing to copy.")
+
+        if ChatSession.objects.using(target).exists() and not options['force']:
+            raise CommandError(f"'{target}' already has chat sessions; use --force to replace them.")
+
+        with transaction.atomic(using=target):
+            # In SQL: the ORM's delete signals would unlink the sessions from notes and goals
+            with connections[target].cursor() as cursor:
+                for model in (ChatMessage, ChatArchive, ChatSession):
+                    cursor.execute(f"DELETE FROM {model._meta.db_table}")
+            session_fields = self._source_fields(ChatSession)
+            sessions = self._copy(ChatSession, session_fields, target)
+            messages = self._copy(ChatMessage, self._source_fields(ChatMessage), target)
+            archives = self._copy(ChatArchive, self._source_fields(ChatArchive), target)
+            if session_fields is not None and not set(MESSAGE_STATS) <= {field.name for field in session_fields}:
+                # Added by migrations that only ran on the chat database
+                self._recompute_message_stats(target)
+            with connections[target].cursor() as cursor:
+                for sql in connections[target].ops.sequence_reset_sql(no_style(), [ChatSession, ChatMessage]):
+                    cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {sessions} chat sessions, {messages} messages and {archives} archives to '{target}'."
+        ))
+
+    def _source_fields(self, model):
+        """
+        The model's fields that have a column in the main database's table,
+        or None if it has no such table (ChatArchive: created after the split).
+        Since the split the router keeps chat migrations off the main database,
+        so its tables may lack newer columns (summary, message stats).
+        """
+        connection = connections[DEFAULT_DB_ALIAS]
+        table = model._meta.db_table
+        if table not in connection.introspection.table_names():
+            return None
+        with connection.cursor() as cursor:
+            columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        return [field for field in model._meta.concrete_fields if field.column in columns]
+
+    def _copy(self, model, fields, target):
+        # In SQL: bulk_create would stamp created_at and timestamp with the
+        # current time (auto_now_add, as in archive._insert_messages)
+        if fields is None:
+            return 0
+        names = {field.name for field in fields}
+        missing = [field for field in model._meta.concrete_fields if field.name not in names]
+        columns = [field.column for field in fields + missing]
+        connection = connections[target]
+        sql = (
+            f"INSERT INTO {model._meta.db_table} ({', '.join(connection.ops.quote_name(c) for c in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        defaults = [field.get_default() for field in missing]
+
+        copied = 0
+        rows = model.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values_list(
+            *[field.attname for field in fields]
+        ).iterator(chunk_size=BATCH_SIZE)
+        batch = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                batch.append([
+                    field.get_db_prep_save(value, connection)
+                    for field, value in zip(fields + missing, list(row) + defaults)
+                ])
+                if len(batch) == BATCH_SIZE:
+                    cursor.executemany(sql, batch)
+                    copied += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                copied += len(batch)
+        return copied
+
+    def _recompute_message_stats(self, target):
+        messages = ChatMessage.objects.using(target).filter(session=OuterRef('pk'))
+        last = messages.order_by('-timestamp', '-id')
+        ChatSession.objects.using(target).update(
+            message_count=Coalesce(
+                Subquery(messages.order_by().values('session').annotate(n=Count('id')).values('n')),
+                Value(0), output_field=IntegerField(),
+            ),
+            last_message_preview=Coalesce(Substr(Subquery(last.values('content')[:1]), 1, 200), Value('')),
+            last_message_at=Subquery(last.values('timestamp')[:1]),
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+from life_manager.search import SEARCH_SOURCES, create_search_schema, drop_search_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the full-text search tables, views and triggers and reindexes every row. "
+        "Run it after a migration remakes one of the indexed tables (SQLite drops a table's triggers with it)."
+    )
+
+    def handle(self, *args, **options):
+        for source in SEARCH_SOURCES:
+            connection = connections[router.db_for_write(source.model)]
+            drop_search_schema(connection, [source])
+            create_search_schema(connection, [source])
+            self.stdout.write(f"Reindexed {source.name} on '{connection.alias}'.")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
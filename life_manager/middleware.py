@@ -0,0 +1,221 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware wraps a sample of requests (SQL_INSTRUMENTATION_SAMPLE_RATE)
+in a connection execute_wrapper and records the query count, total SQL time
+and the slowest statements. Statements are normalized into fingerprints
+(literals and IN-lists collapsed) so the same query from different requests
+aggregates together. Sampled responses get a Server-Timing header and the
+per-route totals are served in Prometheus text format by the metrics view.
+
+Stats live in process memory: each worker reports its own, and Prometheus
+sums them across scrape targets.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Collapses what varies between executions of the same query: literals
+    and the length of IN (...) lists.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode('utf-8')).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """execute_wrapper collecting the queries of one request."""
+
+    def __init__(self, keep_slowest):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []  # [(seconds, sql)], longest first
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if len(self.slowest) < self.keep_slowest or elapsed > self.slowest[-1][0]:
+                self.slowest.append((elapsed, sql))
+                self.slowest.sort(key=lambda item: item[0], reverse=True)
+                del self.slowest[self.keep_slowest:]
+
+
+class RouteStats:
+    """
+    Thread-safe per-route and per-fingerprint totals since process start.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}        # (method, route) -> totals
+        self.slow_queries = {}  # fingerprint -> {'sql', 'count', 'seconds'}
+
+    def record(self, method, route, duration, recorder, slow_threshold):
+        with self.lock:
+            totals = self.routes.setdefault((method, route), {
+                'requests': 0, 'seconds': 0.0, 'queries': 0, 'sql_seconds': 0.0, 'max_queries': 0,
+            })
+            totals['requests'] += 1
+            totals['seconds'] += duration
+            totals['queries'] += recorder.count
+            totals['sql_seconds'] += recorder.total
+            totals['max_queries'] = max(totals['max_queries'], recorder.count)
+
+            for elapsed, sql in recorder.slowest:
+                if elapsed < slow_threshold:
+                    break
+                normalized = normalize_sql(sql)
+                slow = self.slow_queries.setdefault(fingerprint(normalized), {'sql': normalized, 'count': 0, 'seconds': 0.0})
+                slow['count'] += 1
+                slow['seconds'] += elapsed
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+            self.slow_queries.clear()
+
+    def prometheus(self):
+        """Renders the totals in the Prometheus text exposition format."""
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        with self.lock:
+            routes = sorted(self.routes.items())
+            slow_queries = sorted(self.slow_queries.items())
+
+        metrics = [
+            ('mantor_http_requests_total', 'counter', 'Sampled requests.', 'requests'),
+            ('mantor_http_request_duration_seconds_total', 'counter', 'Time spent in sampled requests.', 'seconds'),
+            ('mantor_db_queries_total', 'counter', 'SQL queries run by sampled requests.', 'queries'),
+            ('mantor_db_query_duration_seconds_total', 'counter', 'SQL time of sampled requests.', 'sql_seconds'),
+            ('mantor_db_queries_per_request_max', 'gauge', 'Most SQL queries run by one request.', 'max_queries'),
+        ]
+        lines = []
+        for name, kind, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), totals in routes:
+                lines.append(f'{name}{{method="{label(method)}",route="{label(route)}"}} {totals[key]}')
+
+        lines.append("# HELP mantor_db_slow_queries_total Statements slower than SQL_SLOW_QUERY_MS, by fingerprint.")
+        lines.append("# TYPE mantor_db_slow_queries_total counter")
+        for key, slow in slow_queries:
+            lines.append(f'mantor_db_slow_queries_total{{fingerprint="{key}",sql="{label(slow["sql"][:200])}"}} {slow["count"]}')
+        lines.append("# HELP mantor_db_slow_query_duration_seconds_total Time spent in slow statements, by fingerprint.")
+        lines.append("# TYPE mantor_db_slow_query_duration_seconds_total counter")
+        for key, slow in slow_queries:
+            lines.append(f'mantor_db_slow_query_duration_seconds_total{{fingerprint="{key}"}} {slow["seconds"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+route_stats = RouteStats()
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Settings:
+        SQL_INSTRUMENTATION_SAMPLE_RATE  share of requests instrumented (0 disables, 1 = all)
+        SQL_SLOW_QUERY_MS                statements at least this slow are logged and counted
+        SQL_INSTRUMENTATION_TOP_N        slowest statements kept per request
+
+    Runs natively in both the sync and async stacks, so async views (the SSE
+    event stream) aren't forced through a thread. A streaming response is
+    measured until its headers are ready; queries run while its body is
+    consumed aren't counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'SQL_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.slow_threshold = getattr(settings, 'SQL_SLOW_QUERY_MS', 100) / 1000.0
+        self.top_n = getattr(settings, 'SQL_INSTRUMENTATION_TOP_N', 3)
+
+    def _sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder(self.top_n)
+        start = time.perf_counter()
+        with self._instrument(recorder):
+            response = self.get_response(request)
+        return self._record(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        recorder = QueryRecorder(self.top_n)
+        start = time.perf_counter()
+        # Connections are per thread: the ORM runs in the request's
+        # thread-sensitive sync thread, so the wrappers go on its connections
+        stack = await sync_to_async(self._instrument)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._record(request, response, recorder, time.perf_counter() - start)
+
+    @staticmethod
+    def _instrument(recorder):
+        """Wraps the calling thread's connections; close the returned stack to unwrap."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def _record(self, request, response, recorder, duration):
+        match = getattr(request, 'resolver_match', None)
+        # Unmatched paths share one label so scanners can't blow up the series count
+        route = (match.route or match.view_name) if match else '<unmatched>'
+        route_stats.record(request.method, route, duration, recorder, self.slow_threshold)
+
+        for elapsed, sql in recorder.slowest:
+            if elapsed < self.slow_threshold:
+                break
+            normalized = normalize_sql(sql)
+            logger.warning(f"Slow query ({elapsed * 1000:.1f}ms) [{fingerprint(normalized)}] on {request.method} {route}: {normalized[:500]}")
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.total * 1000:.1f};desc="{recorder.count} queries", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0009_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='situationcontext',
+            name='last_payload_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0010_situationcontext_last_payload_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='summary_until_id',
+            field=models.PositiveBigIntegerField(default=0, help_text='Last message id folded into the summary'),
+        ),
+    ]
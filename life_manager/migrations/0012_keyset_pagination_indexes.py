@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-19 00:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0011_chatsession_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='achievement',
+            index=models.Index(fields=['user', 'date_achieved', 'id'], name='achievement_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airecommendation',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='airec_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['timestamp', 'id'], name='chatmessage_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='chatmessage_session_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='chatsession_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='note_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalgoal',
+            index=models.Index(fields=['user', 'importance', 'created_at', 'id'], name='goal_user_importance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='situationcontext',
+            index=models.Index(fields=['created_at', 'id'], name='context_created_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-19 00:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_message_stats(apps, schema_editor):
+    ChatSession = apps.get_model('life_manager', 'ChatSession')
+    ChatMessage = apps.get_model('life_manager', 'ChatMessage')
+    db = schema_editor.connection.alias
+
+    last = ChatMessage.objects.using(db).filter(session=OuterRef('pk')).order_by('-timestamp', '-id')
+    sessions = ChatSession.objects.using(db).annotate(
+        n=Count('messages'),
+        last_content=Subquery(last.values('content')[:1]),
+        last_at=Subquery(last.values('timestamp')[:1]),
+    )
+    batch = []
+    for session in sessions.iterator(chunk_size=500):
+        session.message_count = session.n
+        session.last_message_preview = (session.last_content or '')[:200]
+        session.last_message_at = session.last_at
+        batch.append(session)
+        if len(batch) >= 500:
+            ChatSession.objects.using(db).bulk_update(batch, ['message_count', 'last_message_preview', 'last_message_at'])
+            batch = []
+    if batch:
+        ChatSession.objects.using(db).bulk_update(batch, ['message_count', 'last_message_preview', 'last_message_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0012_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop, hints={'model_name': 'chatsession'}),
+    ]
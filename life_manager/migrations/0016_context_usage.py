@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-19 01:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def backfill_context_usage(apps, schema_editor):
+    """
+    Users have "used" every context they attached content to.
+    """
+    ContextUsage = apps.get_model('life_manager', 'ContextUsage')
+    db = schema_editor.connection.alias
+
+    spans = {}
+    sources = [('Note', 'created_at'), ('PersonalGoal', 'created_at'),
+               ('AiRecommendation', 'created_at'), ('Achievement', 'date_achieved')]
+    for model_name, date_field in sources:
+        model = apps.get_model('life_manager', model_name)
+        rows = (model.objects.using(db)
+                .filter(user__isnull=False, context__isnull=False)
+                .values('user_id', 'context_id')
+                .annotate(first=Min(date_field), last=Max(date_field)))
+        for row in rows:
+            key = (row['user_id'], row['context_id'])
+            first, last = spans.get(key, (row['first'], row['last']))
+            spans[key] = (min(first, row['first']), max(last, row['last']))
+
+    ContextUsage.objects.using(db).bulk_create([
+        ContextUsage(user_id=user_id, context_id=context_id, first_used_at=first, last_used_at=last)
+        for (user_id, context_id), (first, last) in spans.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0015_resource_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContextUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_used_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField()),
+                ('context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='life_manager.situationcontext')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='context_usages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'last_used_at'], name='contextusage_user_last_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'context'), name='contextusage_user_context_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_context_usage, migrations.RunPython.noop, hints={'model_name': 'contextusage'}),
+        # Option -> contexts lookups (?options_all= / ?options_any=). The auto-created
+        # unique index on the through table leads with the context id, so it can't serve them.
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS context_options_option_idx "
+            "ON life_manager_situationcontext_options (statusoption_id, situationcontext_id)",
+            "DROP INDEX IF EXISTS context_options_option_idx",
+            hints={'model_name': 'situationcontext'},
+        ),
+    ]
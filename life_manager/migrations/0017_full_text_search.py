@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-19 01:30
+
+from django.db import migrations
+
+
+def make_operation(source_name, model_name):
+    """
+    One operation per source, so the database router (hints) decides where
+    each index lives. The DDL is in life_manager/search.py, shared with the
+    rebuild_search_index command.
+    """
+    def forwards(apps, schema_editor):
+        from life_manager.search import SEARCH_SOURCES, create_search_schema
+        create_search_schema(schema_editor.connection, [s for s in SEARCH_SOURCES if s.name == source_name])
+
+    def backwards(apps, schema_editor):
+        from life_manager.search import SEARCH_SOURCES, drop_search_schema
+        drop_search_schema(schema_editor.connection, [s for s in SEARCH_SOURCES if s.name == source_name])
+
+    return migrations.RunPython(forwards, backwards, hints={'model_name': model_name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0016_context_usage'),
+    ]
+
+    operations = [
+        make_operation('notes', 'note'),
+        make_operation('goals', 'personalgoal'),
+        make_operation('recommendations', 'airecommendation'),
+        make_operation('chat', 'chatmessage'),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-19 01:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_note_vectors(apps, schema_editor):
+    from life_manager.tfidf import term_frequencies
+
+    Note = apps.get_model('life_manager', 'Note')
+    NoteVector = apps.get_model('life_manager', 'NoteVector')
+    db = schema_editor.connection.alias
+
+    vectors = []
+    for note_id, user_id, title, content in Note.objects.using(db).values_list('id', 'user_id', 'title', 'content').iterator():
+        terms, weights = term_frequencies(title, content)
+        vectors.append(NoteVector(note_id=note_id, user_id=user_id, terms=terms.tobytes(), weights=weights.tobytes()))
+        if len(vectors) >= 500:
+            NoteVector.objects.using(db).bulk_create(vectors)
+            vectors = []
+    NoteVector.objects.using(db).bulk_create(vectors)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0017_full_text_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteVector',
+            fields=[
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='life_manager.note')),
+                ('terms', models.BinaryField()),
+                ('weights', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'updated_at'], name='notevector_user_updated_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_note_vectors, migrations.RunPython.noop, hints={'model_name': 'notevector'}),
+    ]
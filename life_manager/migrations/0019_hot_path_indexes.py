@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0018_note_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airecommendation',
+            index=models.Index(fields=['context', 'priority', 'created_at'], name='airec_context_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['context', 'created_at', 'id'], name='note_context_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalgoal',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['user', 'importance', 'created_at'], name='goal_user_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalgoal',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['context', 'importance', 'created_at'], name='goal_context_open_idx'),
+        ),
+    ]
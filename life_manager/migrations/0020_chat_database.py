@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-19 01:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+SEARCH_INDEXES = [
+    ('notes', 'note'),
+    ('goals', 'personalgoal'),
+    ('recommendations', 'airecommendation'),
+    ('chat', 'chatmessage'),
+]
+
+
+def search_schema_operation(source_name, model_name, create):
+    """
+    SQLite remakes a table to alter its columns, and can't while the search
+    views select from it: the search schema is dropped before the AlterFields
+    (create=False) and recreated, reindexing every row, after them (create=True).
+    """
+    def run(apps, schema_editor, create):
+        from life_manager.search import SEARCH_SOURCES, create_search_schema, drop_search_schema
+        sources = [s for s in SEARCH_SOURCES if s.name == source_name]
+        (create_search_schema if create else drop_search_schema)(schema_editor.connection, sources)
+
+    return migrations.RunPython(
+        lambda apps, schema_editor: run(apps, schema_editor, create),
+        lambda apps, schema_editor: run(apps, schema_editor, not create),
+        hints={'model_name': model_name},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0019_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        *[search_schema_operation(source, model, create=False) for source, model in SEARCH_INDEXES],
+        migrations.AlterField(
+            model_name='airecommendation',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='recommendation_linked', to='life_manager.chatsession'),
+        ),
+        migrations.AlterField(
+            model_name='chatsession',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='goalplan',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='goal_plan_linked', to='life_manager.chatsession'),
+        ),
+        migrations.AlterField(
+            model_name='goaltaskinfo',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='goal_task_info_linked', to='life_manager.chatsession'),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='note_linked', to='life_manager.chatsession'),
+        ),
+        migrations.AlterField(
+            model_name='personalgoal',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='goal_linked', to='life_manager.chatsession'),
+        ),
+        migrations.AlterField(
+            model_name='subtask',
+            name='chat_session',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sub_task_linked', to='life_manager.chatsession'),
+        ),
+        *[search_schema_operation(source, model, create=True) for source, model in SEARCH_INDEXES],
+    ]
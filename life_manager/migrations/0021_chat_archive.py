@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0020_chat_database'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatArchive',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='life_manager.chatsession')),
+                ('transcript', models.BinaryField()),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('first_message_id', models.PositiveBigIntegerField(default=0)),
+                ('last_message_id', models.PositiveBigIntegerField(default=0)),
+                ('raw_size', models.PositiveIntegerField(default=0, help_text='Uncompressed transcript size in bytes')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_message_id', 'first_message_id'], name='chatarchive_message_ids_idx')],
+            },
+        ),
+    ]
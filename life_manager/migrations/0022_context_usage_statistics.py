@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('life_manager', '0021_chat_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextusage',
+            name='total_dwell_seconds',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='contextusage',
+            name='visit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='contextusage',
+            index=models.Index(fields=['user', 'visit_count', 'last_used_at'], name='contextusage_user_visits_idx'),
+        ),
+    ]
@@ -18,6 +18,7 @@ class StatusGroup(models.Model):
     """
     name = models.CharField(max_length=100, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
@@ -30,6 +31,7 @@ class OptionCategory(models.Model):
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='subcategories')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         if self.parent:
@@ -45,6 +47,7 @@ class StatusOption(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
     icon = models.CharField(max_length=50, blank=True, help_text="FontAwesome icon name (e.g., 'fa-home')")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.name} ({self.group.name})"
@@ -54,9 +57,23 @@ class StatusOption(models.Model):
 # --- 1.5 Chat Intelligence ---
 
 class ChatSession(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Chat models may live in another database (see routers.py): relations
+    # across the split have no SQL constraint and cascade through signals
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=200, blank=True)
+    # Rolling summary of the older messages, sent to n8n instead of the full history
+    summary = models.TextField(blank=True)
+    summary_until_id = models.PositiveBigIntegerField(default=0, help_text="Last message id folded into the summary")
+    # Denormalized by the ChatMessage signals so listing sessions never touches messages
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_preview = models.CharField(max_length=200, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='chatsession_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Chat {self.id} by {self.user.username}"
@@ -75,10 +92,37 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='chatmessage_timestamp_idx'),
+            models.Index(fields=['session', 'timestamp', 'id'], name='chatmessage_session_ts_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.role}] {self.content[:50]}"
 
+class ChatArchive(models.Model):
+    """
+    The messages of an inactive session, moved out of ChatMessage as one
+    zlib-compressed JSON transcript (see archive.py). The session itself
+    stays, with its message count and preview, so listing is unchanged.
+    """
+    session = models.OneToOneField(ChatSession, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    transcript = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    # Id range of the archived messages, to find the archive of a message id
+    first_message_id = models.PositiveBigIntegerField(default=0)
+    last_message_id = models.PositiveBigIntegerField(default=0)
+    raw_size = models.PositiveIntegerField(default=0, help_text="Uncompressed transcript size in bytes")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_message_id', 'first_message_id'], name='chatarchive_message_ids_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archive of chat {self.session_id} ({self.message_count} messages)"
+
 # --- 2. The Context Engine ---
 
 class SituationContext(models.Model):
@@ -90,10 +134,43 @@ class SituationContext(models.Model):
     # Unique signature is a string of sorted IDs (e.g., "1-4-12-33-40")
     unique_signature = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Hash of the last payload n8n accepted for this context (see N8nIntegrationService)
+    last_payload_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='context_created_idx'),
+        ]
 
     def __str__(self):
         return f"Context: {self.unique_signature}"
 
+class ContextUsage(models.Model):
+    """
+    Which contexts a user has actually been in (selected on the dashboard,
+    or attached notes/goals/recommendations to). Contexts are shared by
+    signature, so this is what scopes the contexts API to a user.
+    Dashboard visits also count visits and dwell time (record_context_visit).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='context_usages')
+    context = models.ForeignKey(SituationContext, on_delete=models.CASCADE, related_name='usages')
+    first_used_at = models.DateTimeField()
+    last_used_at = models.DateTimeField()
+    visit_count = models.PositiveIntegerField(default=0)
+    total_dwell_seconds = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'context'], name='contextusage_user_context_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_used_at'], name='contextusage_user_last_idx'),
+            models.Index(fields=['user', 'visit_count', 'last_used_at'], name='contextusage_user_visits_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.context_id}"
+
 # --- 3. Content & Goals ---
 
 class Note(models.Model):
@@ -104,12 +181,40 @@ class Note(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=200)
     content = models.TextField()
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='note_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='note_linked')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='note_user_created_idx'),
+            # Newest notes of a context (n8n payload)
+            models.Index(fields=['context', 'created_at', 'id'], name='note_context_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+class NoteVector(models.Model):
+    """
+    Hashed term frequencies of a note's title and content, for related-note
+    similarity (see tfidf.py). Stored as packed arrays: `terms` int32 term
+    ids (sorted), `weights` the matching float32 tf weights.
+    """
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    terms = models.BinaryField()
+    weights = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='notevector_user_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"Vector of note {self.note_id}"
+
 class PersonalGoal(models.Model):
     """
     Goals can be linked to EITHER:
@@ -132,13 +237,21 @@ class PersonalGoal(models.Model):
     # Flexible Linking
     linked_option = models.ForeignKey(StatusOption, on_delete=models.CASCADE, null=True, blank=True, related_name='goals')
     context = models.ForeignKey(SituationContext, on_delete=models.CASCADE, null=True, blank=True, related_name='goals')
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='goal_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='goal_linked')
     
     deadline = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-importance', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'importance', 'created_at', 'id'], name='goal_user_importance_idx'),
+            # Open goals in Meta.ordering. Partial: `is_completed=False` compiles to
+            # NOT is_completed, which SQLite can match to a condition but not seek on
+            models.Index(fields=['user', 'importance', 'created_at'], condition=Q(is_completed=False), name='goal_user_open_idx'),
+            models.Index(fields=['context', 'importance', 'created_at'], condition=Q(is_completed=False), name='goal_context_open_idx'),
+        ]
     
     def __str__(self):
         return f"[{self.get_importance_display()}] {self.title}"
@@ -152,7 +265,7 @@ class GoalPlan(models.Model):
     goal = models.OneToOneField(PersonalGoal, on_delete=models.CASCADE, related_name='plan')
     summary = models.TextField(blank=True)
     content = models.TextField(blank=True) # The "note" part
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='goal_plan_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='goal_plan_linked')
     
     def __str__(self):
         return f"Plan for {self.goal.title}"
@@ -164,7 +277,7 @@ class GoalTaskInfo(models.Model):
     goal = models.OneToOneField(PersonalGoal, on_delete=models.CASCADE, related_name='tasks_info')
     summary = models.TextField(blank=True)
     content = models.TextField(blank=True)
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='goal_task_info_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='goal_task_info_linked')
 
     def __str__(self):
         return f"Tasks Info for {self.goal.title}"
@@ -176,7 +289,7 @@ class SubTask(models.Model):
     goal = models.ForeignKey(PersonalGoal, on_delete=models.CASCADE, related_name='sub_tasks')
     description = models.CharField(max_length=255)
     is_completed = models.BooleanField(default=False)
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='sub_task_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='sub_task_linked')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -198,6 +311,12 @@ class Achievement(models.Model):
     
     points = models.IntegerField(default=0)
     date_achieved = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date_achieved', 'id'], name='achievement_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"Achievement: {self.title}"
@@ -210,6 +329,7 @@ class ContextPreset(models.Model):
     icon = models.CharField(max_length=50, default="star")
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     options = models.ManyToManyField(StatusOption)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -231,8 +351,61 @@ class AiRecommendation(models.Model):
     summary = models.TextField()
     recommendation = models.TextField()
     priority = models.IntegerField(choices=PRIORITY_CHOICES, default=2)
-    chat_session = models.OneToOneField(ChatSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='recommendation_linked')
+    chat_session = models.OneToOneField(ChatSession, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='recommendation_linked')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='airec_user_created_idx'),
+            # A context's recommendations by priority (dashboard)
+            models.Index(fields=['context', 'priority', 'created_at'], name='airec_context_priority_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_priority_display()})"
+
+# --- 5. Offline Sync ---
+
+class SyncTombstone(models.Model):
+    """
+    Records a deleted row so offline clients can drop it on their next delta sync.
+    user is null for shared (system) rows, which every user must drop.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    resource = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.resource} #{self.object_id}"
+
+# --- 6. HTTP Caching ---
+
+class ResourceVersion(models.Model):
+    """
+    Change counter per (user, API resource), bumped on every write by the
+    signals in signals.py. ETags and Last-Modified headers are derived from
+    it, so a conditional GET is answered without touching the resource's rows.
+    user is null for changes to shared (system) rows, which every user sees.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    resource = models.CharField(max_length=50)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'resource'], name='resourceversion_user_unique'),
+            # NULLs are distinct in the constraint above, so shared rows need their own
+            models.UniqueConstraint(fields=['resource'], condition=Q(user__isnull=True), name='resourceversion_shared_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} v{self.version}"
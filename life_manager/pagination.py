@@ -0,0 +1,107 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination.
+    Pages are ordered on the view's `keyset_ordering` (e.g. ('-created_at', '-id'),
+    always ending in a unique field) and the cursor carries the ordering values
+    of the last row, so the next page is a "rows after this key" range read on
+    an index: page 1000 costs the same as page 1.
+
+    Response: {"next": <url or null>, "results": [...]}
+    Page size: PAGE_SIZE setting, overridable with ?page_size= up to max_page_size.
+    """
+    ordering = ('-id',)
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, position):
+        """
+        Rows strictly after `position` in the ordering, as a lexicographic
+        comparison: (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal_prefix = {}
+        for field, direction, value in zip(self.fields, self.ordering, position):
+            lookup = 'lt' if direction.startswith('-') else 'gt'
+            condition |= Q(**equal_prefix, **{f"{field}__{lookup}": value})
+            equal_prefix[field] = value
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        values = []
+        for name in self.fields:
+            # Rows are model instances, or dicts on the .values() fast path
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
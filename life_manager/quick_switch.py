@@ -0,0 +1,92 @@
+"""
+Quick switch: a user's most recently used and most frequently visited
+contexts (ContextUsage), with their options, for jumping back into one.
+
+The lists are built once at CONTEXT_QUICK_SWITCH_LIMIT entries and held
+per process per user, keyed by the user's version token of 'context_usage'
+(bumped by record_context_usage when the lists change order or membership)
+and of the contexts and options they are rendered from. A request for a
+cached user costs one query on the version table; the least recently
+requested users are evicted. Reloads in the same context don't rebuild the
+lists, so their last_used_at and dwell time are as of the last visit.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .fast_serializers import FastSituationContextSerializer, format_datetime
+from .models import SituationContext, ContextUsage
+from .versions import resource_state
+
+RESOURCES = ('context_usage', 'contexts', 'options', 'groups')
+
+CONTEXT_FIELDS = ['id', 'unique_signature', 'created_at', 'options', 'options_details']
+
+
+def _usage_entry(usage, context):
+    return {
+        **context,
+        'visit_count': usage['visit_count'],
+        'total_dwell_seconds': usage['total_dwell_seconds'],
+        'last_used_at': format_datetime(usage['last_used_at']),
+    }
+
+
+def build_lists(user_id, limit):
+    """{'recent': [...], 'frequent': [...]}, up to `limit` contexts each."""
+    usages = ContextUsage.objects.filter(user_id=user_id).values(
+        'context_id', 'visit_count', 'total_dwell_seconds', 'last_used_at'
+    )
+    recent = list(usages.order_by('-last_used_at', '-id')[:limit])
+    frequent = list(usages.filter(visit_count__gt=0).order_by('-visit_count', '-last_used_at', '-id')[:limit])
+
+    serializer = FastSituationContextSerializer(fields=CONTEXT_FIELDS)
+    context_ids = {usage['context_id'] for usage in recent + frequent}
+    contexts = {
+        context['id']: context
+        for context in serializer.to_representation(serializer.values(SituationContext.objects.filter(id__in=context_ids)))
+    }
+    return {
+        name: [_usage_entry(usage, contexts[usage['context_id']]) for usage in usages if usage['context_id'] in contexts]
+        for name, usages in (('recent', recent), ('frequent', frequent))
+    }
+
+
+class QuickSwitchCache:
+    """Per-process LRU of users' quick-switch lists, keyed by their version token."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lists = OrderedDict()  # user_id -> (token, lists)
+
+    def get(self, user_id):
+        token, _ = resource_state(user_id, RESOURCES)
+        with self.lock:
+            cached = self.lists.get(user_id)
+            if cached and cached[0] == token:
+                self.lists.move_to_end(user_id)
+                return cached[1]
+
+        lists = build_lists(user_id, getattr(settings, 'CONTEXT_QUICK_SWITCH_LIMIT', 10))
+        with self.lock:
+            self.lists[user_id] = (token, lists)
+            self.lists.move_to_end(user_id)
+            while len(self.lists) > getattr(settings, 'CONTEXT_QUICK_SWITCH_MAX_USERS', 1024):
+                self.lists.popitem(last=False)
+        return lists
+
+    def clear(self):
+        with self.lock:
+            self.lists.clear()
+
+
+quick_switch_lists = QuickSwitchCache()
+
+
+def quick_switch(user_id, limit=None):
+    """The user's recent and frequent contexts, `limit` (at most CONTEXT_QUICK_SWITCH_LIMIT) each."""
+    lists = quick_switch_lists.get(user_id)
+    if limit is None:
+        return lists
+    return {name: entries[:limit] for name, entries in lists.items()}
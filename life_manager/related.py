@@ -0,0 +1,208 @@
+"""
+Related-context retrieval: the contexts a user has been in (ContextUsage)
+whose option sets are most similar (Jaccard) to a given set of options, and
+the notes and recommendations attached to them.
+
+Each user's contexts are held in a per-process packed-bitset index: context
+i is bit i, and every option has one Python int with the bits of the
+contexts containing it. A query adds up the bitsets of its options in
+bit-sliced counters (a handful of big-int operations, whatever the number
+of contexts), so the overlap with every context is known at once. Jaccard
+only depends on (overlap, context size), so candidates are taken from the
+few (overlap, size) buckets in descending similarity until K are found.
+
+Indexes are rebuilt lazily when the user's 'contexts' resource version
+changes (see versions.py) and the least recently queried users are evicted.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db.models import Case, When, FloatField, Value
+
+from .models import SituationContext, ContextUsage, Note, AiRecommendation
+from .versions import resource_state
+
+
+def _bitset(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _bit_positions(mask, limit):
+    """Up to `limit` set bit positions of mask, lowest first."""
+    positions = []
+    while mask and len(positions) < limit:
+        lowest = mask & -mask
+        positions.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return positions
+
+
+class ContextIndex:
+    """
+    contexts: context ids by bit position (most recently used first, which
+    is the tie-break between equally similar contexts);
+    memberships: (context_id, option_id) pairs.
+    """
+
+    def __init__(self, contexts, memberships):
+        self.contexts = list(contexts)
+        self.positions = {context_id: position for position, context_id in enumerate(self.contexts)}
+        self.all = (1 << len(self.contexts)) - 1
+
+        option_positions = defaultdict(list)
+        sizes = defaultdict(int)
+        for context_id, option_id in memberships:
+            position = self.positions.get(context_id)
+            if position is None:
+                continue
+            option_positions[option_id].append(position)
+            sizes[position] += 1
+
+        count = len(self.contexts)
+        self.options = {option_id: _bitset(positions, count) for option_id, positions in option_positions.items()}
+        size_positions = defaultdict(list)
+        for position, size in sizes.items():
+            size_positions[size].append(position)
+        self.sizes = {size: _bitset(positions, count) for size, positions in size_positions.items()}
+
+    def __len__(self):
+        return len(self.contexts)
+
+    def similar(self, option_ids, k=10, exclude=None, min_similarity=0.0):
+        """
+        [(similarity, context_id)] for the k contexts most similar to
+        option_ids, best first; contexts sharing no option are never returned.
+        """
+        query = [self.options[option_id] for option_id in set(option_ids) if option_id in self.options]
+        query_size = len(set(option_ids))
+        if not query or k <= 0:
+            return []
+
+        # Bit-sliced counters: bit i of the overlap count of every context
+        counters = []
+        for bitset in query:
+            carry = bitset
+            for i, counter in enumerate(counters):
+                counters[i], carry = counter ^ carry, counter & carry
+                if not carry:
+                    break
+            if carry:
+                counters.append(carry)
+
+        candidates = self.all
+        if exclude in self.positions:
+            candidates &= ~(1 << self.positions[exclude])
+
+        def exactly(overlap):
+            mask = candidates
+            for i, counter in enumerate(counters):
+                mask &= counter if overlap >> i & 1 else ~counter
+            return mask
+
+        buckets = []
+        for overlap in range(1, len(query) + 1):
+            for size, size_mask in self.sizes.items():
+                similarity = overlap / (query_size + size - overlap)
+                if similarity >= min_similarity:
+                    buckets.append((similarity, overlap, size, size_mask))
+
+        results = []
+        overlap_masks = {}
+        for similarity, overlap, size, size_mask in sorted(buckets, key=lambda b: (b[0], b[1]), reverse=True):
+            if overlap not in overlap_masks:
+                overlap_masks[overlap] = exactly(overlap)
+            mask = overlap_masks[overlap] & size_mask
+            for position in _bit_positions(mask, k - len(results)):
+                results.append((similarity, self.contexts[position]))
+            if len(results) >= k:
+                break
+        return results
+
+
+def build_index(user_id):
+    contexts = list(
+        ContextUsage.objects.filter(user_id=user_id)
+        .order_by('-last_used_at', '-id').values_list('context_id', flat=True)
+    )
+    memberships = SituationContext.options.through.objects.filter(
+        situationcontext__usages__user_id=user_id
+    ).values_list('situationcontext_id', 'statusoption_id')
+    return ContextIndex(contexts, memberships.iterator(chunk_size=10000))
+
+
+class ContextIndexCache:
+    """Per-process LRU of user indexes, keyed by their 'contexts' version token."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()  # user_id -> (token, ContextIndex)
+
+    def get(self, user_id):
+        token, _ = resource_state(user_id, ('contexts',))
+        with self.lock:
+            cached = self.indexes.get(user_id)
+            if cached and cached[0] == token:
+                self.indexes.move_to_end(user_id)
+                return cached[1]
+
+        index = build_index(user_id)
+        with self.lock:
+            self.indexes[user_id] = (token, index)
+            self.indexes.move_to_end(user_id)
+            while len(self.indexes) > getattr(settings, 'RELATED_CONTEXT_INDEX_MAX_USERS', 256):
+                self.indexes.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+
+context_indexes = ContextIndexCache()
+
+
+def similar_contexts(user_id, option_ids, exclude=None, k=None):
+    """[(similarity, context_id)], best first, among the user's contexts."""
+    if not user_id or not option_ids:
+        return []
+    if k is None:
+        k = getattr(settings, 'RELATED_CONTEXTS_TOP_K', 10)
+    return context_indexes.get(user_id).similar(
+        option_ids, k=k, exclude=exclude,
+        min_similarity=getattr(settings, 'RELATED_CONTEXTS_MIN_SIMILARITY', 0.25),
+    )
+
+
+def _ranked(queryset, similar, limit):
+    """The queryset's rows in the similar contexts, most similar context first, then newest."""
+    if not similar:
+        return queryset.none()
+    similarity = Case(
+        *[When(context_id=context_id, then=Value(score)) for score, context_id in similar],
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(context_id__in=[context_id for _, context_id in similar])
+        .annotate(similarity=similarity)
+        .order_by('-similarity', '-created_at', '-id')[:limit]
+    )
+
+
+def related_content(user, option_ids, exclude=None, limit=None):
+    """
+    The user's notes and recommendations from the contexts most similar to
+    option_ids (excluding the context `exclude`), each row annotated with
+    the `similarity` of its context. Returns (similar, notes, recommendations).
+    """
+    if not user.is_authenticated:
+        return [], Note.objects.none(), AiRecommendation.objects.none()
+    if limit is None:
+        limit = getattr(settings, 'RELATED_CONTENT_LIMIT', 10)
+    similar = similar_contexts(user.id, option_ids, exclude=exclude)
+    notes = _ranked(Note.objects.filter(user=user), similar, limit)
+    recommendations = _ranked(AiRecommendation.objects.filter(user=user), similar, limit)
+    return similar, notes, recommendations
@@ -0,0 +1,62 @@
+"""
+Database routing.
+
+Chat models live in their own database (CHAT_DATABASE), so the n8n worker
+threads writing messages don't contend for the main database's write lock
+with requests. Analytics reads go to a read-only connection (ANALYTICS_DATABASE)
+explicitly, through analytics_db(). Both default to 'default', which turns
+the split off.
+
+The ORM can't join across databases, so relations between chat and main
+models are plain id columns in SQL (db_constraint=False) and their
+cascades are done by signals (see signals.py) instead of on_delete.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+CHAT_MODELS = frozenset({'chatsession', 'chatmessage', 'chatarchive'})
+
+
+def chat_db():
+    return getattr(settings, 'CHAT_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def analytics_db():
+    return getattr(settings, 'ANALYTICS_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def is_chat_model(model):
+    return model._meta.app_label == 'life_manager' and model._meta.model_name in CHAT_MODELS
+
+
+class DatabaseRouter:
+
+    def db_for_read(self, model, **hints):
+        if is_chat_model(model):
+            return chat_db()
+        # Related rows of analytics results are read from the same replica
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == analytics_db():
+            return analytics_db()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return chat_db() if is_chat_model(model) else DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, chat_db(), analytics_db()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == analytics_db() != DEFAULT_DB_ALIAS:
+            # A copy of 'default', never migrated on its own
+            return False
+        if chat_db() == DEFAULT_DB_ALIAS:
+            return None
+        if app_label == 'life_manager' and model_name in CHAT_MODELS:
+            return db == chat_db()
+        if db == chat_db():
+            return False
+        return None
@@ -0,0 +1,225 @@
+"""
+Full-text search over notes, goals, recommendations and chat messages.
+
+Each source has an external-content FTS5 table (the text is stored once, in
+the source table) kept in sync by triggers. Besides the text columns, every
+indexed row carries an `owner` token ("u<user id>"), so a search MATCHes the
+user's token together with the query and FTS5 only scores that user's rows,
+however large the table. The content is read through a view that supplies
+the owner column.
+
+A search runs one ranked MATCH per source, on the database that source's
+model is routed to, and merges the hits by bm25 score (lower is better, as
+SQLite reports it). SQLite-only; on other backends search returns nothing.
+"""
+import re
+
+from django.db import connections, router
+
+from .models import Note, PersonalGoal, AiRecommendation, ChatMessage, SituationContext
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchSource:
+    """
+    name: API type name; columns: indexed text columns of the model's table;
+    owner_sql: SQL for the owning user id of a row aliased `t` (used by the view);
+    owner_of(row): the same in trigger bodies, where the row is `new`/`old`.
+    """
+    def __init__(self, name, model, columns, title_column, context_column='context_id',
+                 owner_sql='t.user_id', owner_of=lambda row: f"{row}.user_id", session_column='chat_session_id'):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.title_column = title_column
+        self.context_column = context_column
+        self.owner_sql = owner_sql
+        self.owner_of = owner_of
+        self.session_column = session_column
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def fts_table(self):
+        return f"{self.table}_fts"
+
+    @property
+    def content_view(self):
+        return f"{self.table}_fts_content"
+
+    def create_statements(self):
+        """The view, FTS table and triggers, then a rebuild indexing existing rows."""
+        fts, table, view = self.fts_table, self.table, self.content_view
+        cols = ', '.join(self.columns + ['owner'])
+
+        def values(row):
+            return ', '.join([f"{row}.{c}" for c in self.columns] + [f"'u' || {self.owner_of(row)}"])
+
+        return [
+            f"CREATE VIEW IF NOT EXISTS {view} AS SELECT t.id, "
+            f"{', '.join(f't.{c}' for c in self.columns)}, 'u' || {self.owner_sql} AS owner FROM {table} t",
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{view}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {values('new')}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {values('old')}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {values('old')}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {values('new')}); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+
+    def drop_statements(self):
+        fts = self.fts_table
+        return [
+            f"DROP TRIGGER IF EXISTS {fts}_ai",
+            f"DROP TRIGGER IF EXISTS {fts}_ad",
+            f"DROP TRIGGER IF EXISTS {fts}_au",
+            f"DROP TABLE IF EXISTS {fts}",
+            f"DROP VIEW IF EXISTS {self.content_view}",
+        ]
+
+
+SEARCH_SOURCES = [
+    SearchSource('notes', Note, ['title', 'content'], 'title'),
+    SearchSource('goals', PersonalGoal, ['title', 'description'], 'title'),
+    SearchSource('recommendations', AiRecommendation, ['title', 'summary', 'recommendation'], 'title'),
+    # Messages belong to the session's user, and have no context: context filters
+    # go through the notes/goals/recommendations the session is linked to
+    SearchSource('chat', ChatMessage, ['content'], None, context_column=None,
+                 owner_sql="(SELECT s.user_id FROM life_manager_chatsession s WHERE s.id = t.session_id)",
+                 owner_of=lambda row: f"(SELECT s.user_id FROM life_manager_chatsession s WHERE s.id = {row}.session_id)",
+                 session_column='session_id'),
+]
+
+SEARCH_SOURCE_NAMES = [source.name for source in SEARCH_SOURCES]
+
+
+def fts_query(text):
+    """
+    Turns free text into a safe FTS5 expression: every word must match, the
+    last one as a prefix (search-as-you-type). FTS5 operators in the input
+    are treated as plain words. Returns '' when there is nothing to search for.
+    """
+    tokens = _TOKEN.findall(text or '')
+    if not tokens:
+        return ''
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def scoped_match(source, user_id, expression):
+    """The user's owner token AND the expression, restricted to the text columns."""
+    return f"owner : \"u{user_id}\" AND {{{' '.join(source.columns)}}} : ({expression})"
+
+
+def create_search_schema(connection, sources=None):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for source in sources or SEARCH_SOURCES:
+            for statement in source.create_statements():
+                cursor.execute(statement)
+
+
+def drop_search_schema(connection, sources=None):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for source in sources or SEARCH_SOURCES:
+            for statement in source.drop_statements():
+                cursor.execute(statement)
+
+
+def _context_ids(context_id, option_id):
+    """
+    The contexts a search is restricted to, or None for no restriction.
+    """
+    if option_id is None:
+        return None if context_id is None else [context_id]
+    membership = SituationContext.options.through.objects.filter(statusoption_id=option_id)
+    if context_id is not None:
+        membership = membership.filter(situationcontext_id=context_id)
+    return list(membership.values_list('situationcontext_id', flat=True))
+
+
+def _linked_session_ids(user, context_ids):
+    """Chat sessions linked to the user's notes, goals or recommendations in these contexts."""
+    session_ids = set()
+    for model in (Note, PersonalGoal, AiRecommendation):
+        session_ids.update(model.objects.filter(
+            user=user, context_id__in=context_ids, chat_session__isnull=False
+        ).values_list('chat_session_id', flat=True))
+    return sorted(session_ids)
+
+
+def _search_source(source, user, expression, context_ids, limit):
+    fts = source.fts_table
+    where = [f"{fts} MATCH %s"]
+    params = [scoped_match(source, user.id, expression)]
+
+    if context_ids is not None:
+        if source.context_column:
+            ids, column = context_ids, f"t.{source.context_column}"
+        else:
+            ids, column = _linked_session_ids(user, context_ids), f"t.{source.session_column}"
+        if not ids:
+            return []
+        where.append(f"{column} IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+
+    title = f"t.{source.title_column}" if source.title_column else "NULL"
+    context = f"t.{source.context_column}" if source.context_column else "NULL"
+    sql = (
+        f"SELECT t.id, {title}, {context}, t.{source.session_column}, bm25({fts}), "
+        f"snippet({fts}, -1, '[', ']', '…', 12) "
+        f"FROM {fts} JOIN {source.table} t ON t.id = {fts}.rowid "
+        f"WHERE {' AND '.join(where)} "
+        f"ORDER BY bm25({fts}) LIMIT %s"
+    )
+    params.append(limit)
+
+    connection = connections[router.db_for_read(source.model)]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'type': source.name,
+            'id': row_id,
+            'title': title_value,
+            'context': context_value,
+            'chat_session': session_id,
+            'score': score,
+            'snippet': snippet,
+        }
+        for row_id, title_value, context_value, session_id, score, snippet in rows
+    ]
+
+
+def search(user, text, types=None, context_id=None, option_id=None, limit=20):
+    """
+    Ranked hits for `text` across the user's content, best first.
+    types: subset of SEARCH_SOURCE_NAMES (default all); context_id/option_id
+    restrict hits to that context / to contexts containing that option.
+    """
+    expression = fts_query(text)
+    if not expression:
+        return []
+    context_ids = _context_ids(context_id, option_id)
+
+    hits = []
+    for source in SEARCH_SOURCES:
+        if types and source.name not in types:
+            continue
+        hits.extend(_search_source(source, user, expression, context_ids, limit))
+    hits.sort(key=lambda hit: hit['score'])
+    return hits[:limit]
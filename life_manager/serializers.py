@@ -1,11 +1,47 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import (
     StatusGroup, OptionCategory, StatusOption, 
     SituationContext, Note, PersonalGoal, 
     Achievement, ContextPreset, AiRecommendation,
-    ChatSession, ChatMessage, Profile
+    ChatSession, ChatMessage, Profile, SubTask, GoalPlan, GoalTaskInfo
 )
 from django.contrib.auth.models import User
+from .archive import session_messages
+
+def _query_list(request, param):
+    return {name.strip() for value in request.query_params.getlist(param) for name in value.split(',') if name.strip()}
+
+def sparse_field_names(request, names, expandable=()):
+    """
+    The subset of `names` (in order) a read request asked for:
+    fields in `expandable` only when named in ?expand=, and only the fields
+    named in ?fields= when it is given (expanded fields are always kept).
+    """
+    expand = _query_list(request, 'expand')
+    only = _query_list(request, 'fields')
+    return [
+        name for name in names
+        if (name not in expandable or name in expand)
+        and (not only or name in only or name in expand)
+    ]
+
+class SparseFieldsetMixin:
+    """
+    ?fields=id,title trims a response to those fields; fields listed in
+    Meta.expandable_fields (heavy nested data) are left out unless named in
+    ?expand=. Only the top-level serializer of a read request is trimmed:
+    writes, nested serializers and internal use (no request) get every field.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        allowed = set(sparse_field_names(request, self.fields.keys(), getattr(self.Meta, 'expandable_fields', ())))
+        for name in list(self.fields):
+            if name not in allowed:
+                self.fields.pop(name)
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -26,31 +62,46 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         Profile.objects.create(user=user, phone_number=phone_number)
         return user
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = ['id', 'role', 'content', 'timestamp', 'session']
 
-class ChatSessionSerializer(serializers.ModelSerializer):
-    messages = ChatMessageSerializer(many=True, read_only=True)
+class ChatSessionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # From ChatMessage or, for archived sessions, the compressed transcript
+    messages = serializers.SerializerMethodField()
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = ChatSession
         fields = ['id', 'user', 'title', 'created_at', 'messages']
 
-class StatusGroupSerializer(serializers.ModelSerializer):
+    def get_messages(self, obj):
+        return ChatMessageSerializer(session_messages(obj), many=True).data
+
+class ChatSessionListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Session metadata only (no messages), for listing chats.
+    """
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'user', 'title', 'created_at', 'message_count', 'last_message_preview', 'last_message_at']
+        read_only_fields = ['message_count', 'last_message_preview', 'last_message_at']
+
+class StatusGroupSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = StatusGroup
         fields = '__all__'
 
-class OptionCategorySerializer(serializers.ModelSerializer):
+class OptionCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     group_name = serializers.CharField(source='group.name', read_only=True)
     class Meta:
         model = OptionCategory
         fields = ['id', 'group', 'group_name', 'parent', 'name']
 
-class StatusOptionSerializer(serializers.ModelSerializer):
+class StatusOptionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(required=False, allow_null=True)
     group_name = serializers.CharField(source='group.name', read_only=True)
     
@@ -77,7 +128,7 @@ class StatusOptionSerializer(serializers.ModelSerializer):
             
         return super().create(validated_data)
 
-class SituationContextSerializer(serializers.ModelSerializer):
+class SituationContextSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # For reading, we might want to see which options are selected.
     # For writing, we just pass IDs usually.
     # DRF defaults to PrimaryKeyRelatedField for M2M writing.
@@ -86,14 +137,16 @@ class SituationContextSerializer(serializers.ModelSerializer):
     class Meta:
         model = SituationContext
         fields = ['id', 'unique_signature', 'created_at', 'options', 'options_details']
+        # Only with ?expand=options_details; 'options' already lists the ids
+        expandable_fields = ['options_details']
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Note
         fields = '__all__'
         read_only_fields = []
 
-class PersonalGoalSerializer(serializers.ModelSerializer):
+class PersonalGoalSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     importance_display = serializers.CharField(source='get_importance_display', read_only=True)
     
     class Meta:
@@ -102,12 +155,48 @@ class PersonalGoalSerializer(serializers.ModelSerializer):
                   'is_completed', 'linked_option', 'context', 'deadline', 'created_at', 'chat_session']
         read_only_fields = []
 
-class AchievementSerializer(serializers.ModelSerializer):
+class SubTaskSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = SubTask
+        fields = ['id', 'goal', 'description', 'is_completed', 'created_at', 'chat_session']
+        read_only_fields = ['chat_session']
+
+    def validate_goal(self, goal):
+        request = self.context.get('request')
+        if request and goal.user_id != request.user.id:
+            raise serializers.ValidationError("You can only add sub-tasks to your own goals.")
+        return goal
+
+class GoalPlanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GoalPlan
+        fields = ['id', 'summary', 'content', 'chat_session']
+
+class GoalTaskInfoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GoalTaskInfo
+        fields = ['id', 'summary', 'content', 'chat_session']
+
+class GoalWorkspaceSerializer(PersonalGoalSerializer):
+    """
+    A goal with everything its workspace shows: plan, task info, sub-tasks
+    (oldest first) and the linked chat's metadata. Read-only; the view loads
+    it with select_related/prefetch_related in a fixed number of queries.
+    """
+    plan = GoalPlanSerializer(read_only=True)
+    tasks_info = GoalTaskInfoSerializer(read_only=True)
+    sub_tasks = SubTaskSerializer(many=True, read_only=True)
+    chat = ChatSessionListSerializer(source='chat_session', read_only=True)
+
+    class Meta(PersonalGoalSerializer.Meta):
+        fields = PersonalGoalSerializer.Meta.fields + ['plan', 'tasks_info', 'sub_tasks', 'chat']
+
+class AchievementSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Achievement
         fields = '__all__'
 
-class AiRecommendationSerializer(serializers.ModelSerializer):
+class AiRecommendationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     priority_display = serializers.CharField(source='get_priority_display', read_only=True)
     
     class Meta:
@@ -115,7 +204,7 @@ class AiRecommendationSerializer(serializers.ModelSerializer):
         fields = ['id', 'context', 'title', 'summary', 'recommendation', 'priority', 'priority_display', 'created_at', 'chat_session']
         read_only_fields = []
 
-class ContextPresetSerializer(serializers.ModelSerializer):
+class ContextPresetSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # 'options' is a ManyToManyField. By default it expects a list of IDs.
     
     class Meta:
@@ -1,10 +1,18 @@
+import atexit
 import datetime
+import gzip
+import hashlib
 import requests
 import json
 from requests.adapters import HTTPAdapter, Retry
 from django.conf import settings
-from django.db.models import Count, Sum, Q
-from .models import SituationContext, StatusOption, PersonalGoal, StatusGroup, Achievement, ContextPreset
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Q, F, Prefetch
+from django.utils import timezone
+from .models import SituationContext, StatusOption, PersonalGoal, StatusGroup, Achievement, ContextPreset, Note, ContextUsage
+from .routers import analytics_db
+from .tfidf import relevant_notes
+from .versions import bump_version
 
 # --- 1. Context Resolution Logic ---
 
@@ -32,6 +40,72 @@ def get_situation_from_selection(selected_option_ids):
         
     return context, created
 
+def record_context_usage(user_id, context_id, visits=0, was_most_recent=None):
+    """
+    Marks the context as used by the user (see ContextUsage): one UPDATE
+    for a context they already use, an INSERT the first time. `visits` is
+    added to the visit count (see record_context_visit).
+
+    The quick-switch lists' version is only bumped when they change
+    order or membership: a new context, a visit, or a context moving to
+    the front of the recent list, so reloading the dashboard in the same
+    context keeps them cached. `was_most_recent` says whether the context
+    already was the user's most recently used one, when the caller knows
+    (otherwise one query tells).
+    """
+    if not user_id or not context_id:
+        return
+    now = timezone.now()
+    usages = ContextUsage.objects.filter(user_id=user_id)
+    if was_most_recent is None and not visits:
+        was_most_recent = usages.order_by('-last_used_at', '-id').values_list('context_id', flat=True).first() == context_id
+    changes = {'last_used_at': now}
+    if visits:
+        changes['visit_count'] = F('visit_count') + visits
+    if not usages.filter(context_id=context_id).update(**changes):
+        try:
+            with transaction.atomic():
+                ContextUsage.objects.create(
+                    user_id=user_id, context_id=context_id, first_used_at=now, last_used_at=now, visit_count=visits
+                )
+        except IntegrityError:
+            # Recorded concurrently
+            return
+        # The context just joined the user's contexts list
+        bump_version('contexts', user_id)
+    elif not visits and was_most_recent:
+        return
+    # Recency and statistics (the quick-switch lists, see quick_switch.py)
+    bump_version('context_usage', user_id)
+
+def record_context_visit(user_id, context_id):
+    """
+    The dashboard resolved this context for the user: record_context_usage,
+    plus the usage statistics, updated in place. The time since the user's
+    last use of any context is dwell time in that context, capped at
+    CONTEXT_DWELL_MAX_SECONDS (an open tab isn't a day spent there); a
+    visit counts when they switch contexts or come back after that long,
+    not on every reload.
+    """
+    if not user_id or not context_id:
+        return
+    now = timezone.now()
+    max_dwell = getattr(settings, 'CONTEXT_DWELL_MAX_SECONDS', 1800)
+    usages = ContextUsage.objects.filter(user_id=user_id)
+
+    previous = usages.order_by('-last_used_at', '-id').values_list('context_id', 'last_used_at').first()
+    new_visit = True
+    if previous:
+        previous_context_id, last_used_at = previous
+        elapsed = max((now - last_used_at).total_seconds(), 0)
+        new_visit = previous_context_id != context_id or elapsed > max_dwell
+        dwell = int(min(elapsed, max_dwell))
+        if dwell:
+            usages.filter(context_id=previous_context_id).update(total_dwell_seconds=F('total_dwell_seconds') + dwell)
+
+    record_context_usage(user_id, context_id, visits=int(new_visit),
+                         was_most_recent=previous is not None and previous[0] == context_id)
+
 # --- 2. Smart Defaults Logic ---
 
 def get_smart_defaults(request):
@@ -93,24 +167,28 @@ def get_all_relevant_goals(context):
 # --- 4. Analytics Service ---
 
 class AnalyticsService:
+    """
+    Reporting queries. They read from the analytics database (a read-only
+    replica when ANALYTICS_DATABASE is set, see routers.py).
+    """
     @staticmethod
     def get_top_performing_locations():
         """Top places where achievements happened"""
-        return StatusOption.objects.filter(group__name="Place") \
+        return StatusOption.objects.using(analytics_db()).filter(group__name="Place") \
             .annotate(num_achievements=Count('contexts__achievement')) \
             .order_by('-num_achievements')
 
     @staticmethod
     def get_status_productivity_stats():
         """Status vs Points (Busy/Free) - Now under Myself group"""
-        return StatusOption.objects.filter(group__name="Myself", category__name="Status") \
+        return StatusOption.objects.using(analytics_db()).filter(group__name="Myself", category__name="Status") \
             .annotate(total_points=Sum('contexts__achievement__points')) \
             .order_by('-total_points')
 
     @staticmethod
     def get_mood_productivity_stats():
         """Mood vs Points (Happy/Focus) - Now under Myself group"""
-        return StatusOption.objects.filter(group__name="Myself", category__name="Mood") \
+        return StatusOption.objects.using(analytics_db()).filter(group__name="Myself", category__name="Mood") \
             .annotate(total_points=Sum('contexts__achievement__points')) \
             .order_by('-total_points')
             
@@ -138,7 +216,7 @@ class AnalyticsService:
         start_date = today - datetime.timedelta(days=days_back)
         
         # Get all contexts created in range
-        active_options = StatusOption.objects.filter(
+        active_options = StatusOption.objects.using(analytics_db()).filter(
             group__name__in=["Place", "Activity"],
             contexts__created_at__date__gte=start_date
         ).distinct()
@@ -147,7 +225,7 @@ class AnalyticsService:
         
         for option in active_options:
             # Get dates where this option was used
-            dates_used = SituationContext.objects.filter(
+            dates_used = SituationContext.objects.using(analytics_db()).filter(
                 options=option,
                 created_at__date__gte=start_date
             ).dates('created_at', 'day', order='DESC')
@@ -193,13 +271,13 @@ class AnalyticsService:
         Returns simple badges/stats.
         """
         # Total Points
-        total_points = Achievement.objects.aggregate(total=Sum('points'))['total'] or 0
+        total_points = Achievement.objects.using(analytics_db()).aggregate(total=Sum('points'))['total'] or 0
         
         # Badges
         badges = []
         
         # 1. Newcomer
-        if SituationContext.objects.exists():
+        if SituationContext.objects.using(analytics_db()).exists():
             badges.append({'name': 'Started Journey', 'icon': 'fa-flag', 'color': 'text-green-500'})
             
         # 2. High Achiever
@@ -208,7 +286,7 @@ class AnalyticsService:
              
         # 3. Night Owl (Contexts after 11 PM)
         # Filter logic is a bit complex for SQLite time extraction sometimes, doing python check for prototype
-        night_contexts = SituationContext.objects.filter(created_at__hour__gte=23).count()
+        night_contexts = SituationContext.objects.using(analytics_db()).filter(created_at__hour__gte=23).count()
         if night_contexts > 5:
              badges.append({'name': 'Night Owl', 'icon': 'fa-moon', 'color': 'text-purple-500'})
              
@@ -221,24 +299,128 @@ class AnalyticsService:
 
 import threading
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling n8n while the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    Opens after `failure_threshold` consecutive failures, fails fast while
+    open, and after `reset_timeout` seconds lets a single probe call through:
+    success closes it, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.last_success_at = None
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """
+        Returns True if this call is the half-open probe.
+        Raises CircuitOpenError if the call must not go through.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logger.info(f"{self.name} circuit half-open, probing.")
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            raise CircuitOpenError(f"{self.name} circuit is open ({self.last_error}); failing fast.")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"{self.name} circuit closed, n8n recovered.")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+            self.last_success_at = time.time()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"{self.name} circuit opened after {self.consecutive_failures} consecutive failures: {error}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0
+            return max(0, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            state = self.state
+            if state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                state = self.HALF_OPEN  # Next call will probe
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "last_error": self.last_error,
+                "last_success_at": datetime.datetime.fromtimestamp(self.last_success_at).isoformat() if self.last_success_at else None,
+            }
+
 class N8nIntegrationService:
     # Centralized N8N Base URL
-    N8N_BASE_URL = "http://localhost:5678"
+    N8N_BASE_URL = getattr(settings, 'N8N_BASE_URL', "http://localhost:5678")
 
     N8N_WEBHOOK_URL = f"{N8N_BASE_URL}/webhook/context-trigger"
+    N8N_CONTEXT_BATCH_WEBHOOK_URL = f"{N8N_BASE_URL}/webhook/context-batch"
     N8N_CHAT_WEBHOOK_URL = f"{N8N_BASE_URL}/webhook/chat-trigger"
+    N8N_CHAT_SUMMARY_WEBHOOK_URL = f"{N8N_BASE_URL}/webhook/chat-summary"
+
+    # One breaker for the whole n8n host: when it is down, every webhook is down
+    breaker = CircuitBreaker(
+        "n8n",
+        failure_threshold=getattr(settings, 'N8N_CIRCUIT_FAILURE_THRESHOLD', 5),
+        reset_timeout=getattr(settings, 'N8N_CIRCUIT_RESET_SECONDS', 30),
+    )
 
     @staticmethod
-    def post_with_retry(url, payload, description, timeout=30):
+    def post_with_retry(url, payload, description, timeout=30, stream=False, compress=False):
         """
         Sends a POST request with robust retry logic (Exponential Backoff).
+        With stream=True the body is left unread for the caller to iterate.
+        With compress=True the JSON body is sent gzip-encoded.
+        Guarded by the n8n circuit breaker: raises CircuitOpenError without
+        touching the network while n8n is considered down.
         """
+        breaker = N8nIntegrationService.breaker
+        is_probe = breaker.before_call()
+
         session = requests.Session()
         retries = Retry(
-            total=5,
+            total=0 if is_probe else 5, # A probe should answer quickly
             backoff_factor=1,  # Wait 1s, 2s, 4s, 8s, 16s...
             status_forcelist=[500, 502, 503, 504],
             allowed_methods=["POST"]
@@ -248,15 +430,28 @@ class N8nIntegrationService:
 
         try:
             logger.info(f"--- Sending {description} to n8n: {url} ---")
-            response = session.post(url, json=payload, timeout=timeout)
+            if compress:
+                body = gzip.compress(json.dumps(payload).encode('utf-8'))
+                headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+                response = session.post(url, data=body, headers=headers, timeout=timeout, stream=stream)
+            else:
+                response = session.post(url, json=payload, timeout=timeout, stream=stream)
             response.raise_for_status()
             logger.info(f"n8n Response for {description}: {response.status_code}")
+            breaker.record_success()
             return response
-        except requests.exceptions.RetryError:
+        except requests.exceptions.RetryError as e:
             logger.error(f"Max retries exceeded for {description} to {url}")
+            breaker.record_failure(e)
             raise
         except Exception as e:
             logger.error(f"Error triggering n8n for {description}: {e}")
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status is not None and status < 500:
+                # n8n answered; a 4xx is our request's fault, not an outage
+                breaker.record_success()
+            else:
+                breaker.record_failure(e)
             raise
 
     @staticmethod
@@ -264,39 +459,183 @@ class N8nIntegrationService:
         """
         Internal worker to send payload synchronously.
         Meant to be run in a thread.
+        Returns True if n8n accepted the payload.
         """
         try:
            N8nIntegrationService.post_with_retry(url, payload, description)
+        except Exception:
+            return False # Error already logged in helper
+        return True
+
+    @staticmethod
+    def estimate_tokens(text):
+        """Rough token count (~4 characters per token), good enough for budgeting."""
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def assemble_chat_history(session_id, token_budget=None):
+        """
+        Returns (summary, history) for a chat payload: the session's rolling
+        summary plus the newest unsummarized messages, added newest to oldest
+        until the token budget is spent. Reads one session row and a bounded
+        tail (CHAT_HISTORY_MAX_TAIL), never the whole session.
+        """
+        from .models import ChatSession, ChatMessage # Import locally
+
+        if token_budget is None:
+            token_budget = getattr(settings, 'CHAT_HISTORY_TOKEN_BUDGET', 2000)
+        max_tail = getattr(settings, 'CHAT_HISTORY_MAX_TAIL', 40)
+
+        session = ChatSession.objects.filter(id=session_id).values('summary', 'summary_until_id').first()
+        if session is None:
+            return "", []
+
+        summary = session['summary']
+        remaining = token_budget - N8nIntegrationService.estimate_tokens(summary) if summary else token_budget
+
+        tail = ChatMessage.objects.filter(
+            session_id=session_id, id__gt=session['summary_until_id']
+        ).order_by('-id').values_list('role', 'content')[:max_tail]
+
+        history = []
+        for role, content in tail:
+            cost = N8nIntegrationService.estimate_tokens(content)
+            if cost > remaining:
+                if not history and remaining > 0:
+                    # Always keep (the end of) the newest message
+                    history.append({"role": role, "content": content[-remaining * 4:]})
+                break
+            history.append({"role": role, "content": content})
+            remaining -= cost
+
+        history.reverse()
+        return summary, history
+
+    @staticmethod
+    def _summarize_locally(summary, messages, max_chars):
+        """
+        Fallback when the n8n summarizer is unavailable: keep the first
+        sentence of each message and drop the oldest lines past max_chars.
+        """
+        lines = [summary] if summary else []
+        for msg in messages:
+            first_sentence = msg['content'].strip().split('\n', 1)[0].split('. ', 1)[0]
+            lines.append(f"{msg['role']}: {first_sentence[:200]}")
+        text = "\n".join(lines)
+        return text[-max_chars:]
+
+    @staticmethod
+    def refresh_chat_summary(session_id):
+        """
+        Incrementally folds older messages into ChatSession.summary.
+        Once 2*N messages are unsummarized (N = CHAT_SUMMARY_EVERY), the oldest
+        N are merged into the summary, so the verbatim tail stays between N and
+        2*N messages. Runs in the chat worker thread after a reply is saved.
+        """
+        from .models import ChatSession, ChatMessage # Import locally
+
+        every = getattr(settings, 'CHAT_SUMMARY_EVERY', 10)
+        max_chars = getattr(settings, 'CHAT_SUMMARY_MAX_CHARS', 4000)
+
+        session = ChatSession.objects.filter(id=session_id).values('summary', 'summary_until_id').first()
+        if session is None:
+            return
+
+        pending = list(
+            ChatMessage.objects.filter(session_id=session_id, id__gt=session['summary_until_id'])
+            .order_by('id').values('id', 'role', 'content')[:2 * every]
+        )
+        if len(pending) < 2 * every:
+            return
+
+        to_fold = pending[:every]
+        summary = None
+        try:
+            response = N8nIntegrationService.post_with_retry(
+                N8nIntegrationService.N8N_CHAT_SUMMARY_WEBHOOK_URL,
+                {
+                    "session_id": session_id,
+                    "summary": session['summary'],
+                    "messages": [{"role": m['role'], "content": m['content']} for m in to_fold],
+                    "max_chars": max_chars,
+                },
+                "Chat Summary",
+                timeout=60
+            )
+            summary = response.json().get('summary')
         except Exception:
             pass # Error already logged in helper
 
+        if not summary:
+            summary = N8nIntegrationService._summarize_locally(session['summary'], to_fold, max_chars)
+
+        # Guarded on the old boundary so a concurrent refresh can't fold twice
+        ChatSession.objects.filter(id=session_id, summary_until_id=session['summary_until_id']).update(
+            summary=summary[:max_chars], summary_until_id=to_fold[-1]['id']
+        )
+        logger.info(f"Folded {len(to_fold)} messages into the summary of Session {session_id}")
+
+    @staticmethod
+    def _read_chat_reply(response, session_id):
+        """
+        Reads an n8n chat reply. Streaming workflows answer with JSON lines
+        ({"type": "begin"|"item"|"end", "content": ...}); each item is relayed
+        to the user's event stream as it arrives and the joined text is returned
+        as {"response": ...}. Anything else is parsed as a regular JSON body.
+        """
+        from .events import publish_chat_chunk
+        from .models import ChatSession
+
+        chunks = []
+        buffered = []
+        streaming = False
+        user_id = False  # Looked up on the first chunk
+
+        for line in response.iter_lines():
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            if not line.strip():
+                continue
+            if not streaming and not buffered:
+                try:
+                    first = json.loads(line)
+                except ValueError:
+                    first = None
+                streaming = isinstance(first, dict) and first.get('type') in ('begin', 'item')
+            if not streaming:
+                buffered.append(line)
+                continue
+
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if item.get('type') == 'item' and item.get('content'):
+                chunks.append(item['content'])
+                if user_id is False:
+                    user_id = ChatSession.objects.filter(id=session_id).values_list('user_id', flat=True).first()
+                if user_id:
+                    publish_chat_chunk(user_id, session_id, item['content'])
+
+        if streaming:
+            return {"response": "".join(chunks)}
+        return json.loads("\n".join(buffered))
+
     @staticmethod
     def trigger_chat_response(session_id, message_content):
         """
         Sends chat message to n8n for AI response (Async).
         Updated to handle response and save it as an assistant message.
         """
-        # Fetch History
-        from .models import ChatMessage # Import locally
-        # Get last 10 messages (excluding the current one if it was just saved? 
-        # Actually usually this triggers on post_save of the USER message.
-        # So the user message IS in the DB.
-        # We want everything leading up to this point. 
-        # But wait, trigger_chat_message sends "message_content". 
-        # If we include history, we should include the current message in history or separately?
-        # Standard generic AI prompts usually take a list of messages.
-        # Let's send history separately as 'history'.
-        
-        last_messages = ChatMessage.objects.filter(session_id=session_id).order_by('-timestamp')[:10]
-        # Reverse to chronological order
-        history = [
-            {"role": msg.role, "content": msg.content} 
-            for msg in reversed(last_messages)
-        ]
+        # Rolling summary + newest messages that fit the token budget.
+        # The user message that triggered this is already saved, so it is the
+        # newest entry of the history.
+        summary, history = N8nIntegrationService.assemble_chat_history(session_id)
 
         payload = {
             "session_id": session_id,
             "message": message_content,
+            "summary": summary,
             "history": history,
             "timestamp": datetime.datetime.now().isoformat()
         }
@@ -307,11 +646,12 @@ class N8nIntegrationService:
                     N8nIntegrationService.N8N_CHAT_WEBHOOK_URL, 
                     payload, 
                     "Chat",
-                    timeout=60 # Long timeout for AI generation
+                    timeout=60, # Long timeout for AI generation
+                    stream=True
                 )
                 
-                # Parse Response
-                data = response.json()
+                # Parse Response (relaying chunks live if the workflow streams)
+                data = N8nIntegrationService._read_chat_reply(response, session_id)
 
                 # Robust check for "Workflow was started" or invalid responses
                 if data.get("message") == "Workflow was started":
@@ -339,6 +679,7 @@ class N8nIntegrationService:
                         content=ai_text
                     )
                     logger.info(f"Saved AI response for Session {session_id}")
+                    N8nIntegrationService.refresh_chat_summary(session_id)
 
             except Exception as e:
                 logger.error(f"Error in Chat N8N flow: {e}")
@@ -348,31 +689,33 @@ class N8nIntegrationService:
         thread.start()
 
     @staticmethod
-    def trigger_context_processing(context_id):
+    def build_context_payload(context_id):
         """
-        Sends context data to n8n for AI processing (Async).
+        Builds the n8n payload for a context in a fixed number of queries
+        (context + options with group/category, notes, goals).
+        Returns (context, payload, payload_hash); all None if the context is gone.
+        The hash covers everything except the send timestamp, so it only
+        changes when something n8n cares about has changed.
         """
-        try:
-            context = SituationContext.objects.get(id=context_id)
-        except SituationContext.DoesNotExist:
-            logger.warning(f"Context {context_id} not found for n8n trigger.")
-            return
+        context = SituationContext.objects.filter(id=context_id).prefetch_related(
+            Prefetch('options', queryset=StatusOption.objects.select_related('group', 'category').order_by('id'))
+        ).first()
+        if context is None:
+            return None, None, None
 
-        # 1. Prepare Data Payload
         options_data = [
             {
-                "id": opt.id, 
-                "name": opt.name, 
-                "group": opt.group.name, 
+                "id": opt.id,
+                "name": opt.name,
+                "group": opt.group.name,
                 "category": opt.category.name if opt.category else None
-            } 
+            }
             for opt in context.options.all()
         ]
 
-        # Fetch related content for context (Notes & Goals)
         # We limit to recent or active ones to avoid huge payloads
-        notes = context.notes.all().order_by('-created_at')[:5]
-        goals = context.goals.filter(is_completed=False)[:5]
+        notes = Note.objects.filter(context_id=context.id).only('title', 'content', 'user_id').order_by('-created_at', '-id')[:5]
+        goals = PersonalGoal.objects.filter(context_id=context.id, is_completed=False).only('title', 'importance', 'user_id')[:5]
 
         payload = {
             "context_id": context.id,
@@ -381,12 +724,234 @@ class N8nIntegrationService:
             "options": options_data,
             "notes": [{"title": n.title, "content": n.content} for n in notes],
             "active_goals": [{"title": g.title, "importance": g.get_importance_display()} for g in goals],
-            "timestamp": datetime.datetime.now().isoformat()
         }
+        relevant_limit = getattr(settings, 'N8N_CONTEXT_RELEVANT_NOTES', 0)
+        if relevant_limit:
+            payload["relevant_notes"] = N8nIntegrationService._relevant_notes(
+                options_data, notes, goals, relevant_limit
+            )
+        payload_hash = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()
+        payload["timestamp"] = datetime.datetime.now().isoformat()
+        return context, payload, payload_hash
+
+    @staticmethod
+    def _relevant_notes(options_data, notes, goals, limit):
+        """
+        The notes (from any context) of the context's note and goal owners that
+        are most similar (TF-IDF) to the context's options, notes and goals,
+        leaving out the notes already in the payload.
+        """
+        text = ' '.join(
+            [opt["name"] for opt in options_data]
+            + [f"{n.title} {n.content}" for n in notes]
+            + [g.title for g in goals]
+        )
+        included = {n.id for n in notes}
+        owners = {n.user_id for n in notes} | {g.user_id for g in goals}
+        scored = sorted(
+            (hit for owner in owners if owner for hit in relevant_notes(owner, text, limit, exclude=included)),
+            reverse=True
+        )[:limit]
+        by_id = Note.objects.in_bulk([note_id for _, note_id in scored])
+        return [
+            {"title": by_id[note_id].title, "content": by_id[note_id].content, "similarity": round(score, 4)}
+            for score, note_id in scored if note_id in by_id
+        ]
+
+    @staticmethod
+    def _send_context_payload(context_id, payload, payload_hash):
+        """
+        Sends a context payload and remembers its hash once n8n accepted it.
+        Meant to be run in a thread.
+        """
+        if N8nIntegrationService._send_payload(N8nIntegrationService.N8N_WEBHOOK_URL, payload, "Context"):
+            # .update() so the post_save trigger doesn't fire again
+            SituationContext.objects.filter(id=context_id).update(last_payload_hash=payload_hash)
+
+    @staticmethod
+    def trigger_context_processing(context_id, force=False):
+        """
+        Sends context data to n8n for AI processing (Async).
+        Skipped when the payload is identical to the last one n8n accepted,
+        unless force=True.
+        """
+        context, payload, payload_hash = N8nIntegrationService.build_context_payload(context_id)
+        if context is None:
+            logger.warning(f"Context {context_id} not found for n8n trigger.")
+            return
+
+        if not force and payload_hash == context.last_payload_hash:
+            logger.info(f"Context {context_id} unchanged since last delivery, skipping n8n trigger.")
+            return
+
+        if getattr(settings, 'N8N_CONTEXT_BATCH_ENABLED', False):
+            context_batcher.enqueue(context_id, payload, payload_hash)
+            return
 
-        # 2. Send Webhook via Thread
+        # Send Webhook via Thread
         thread = threading.Thread(
-            target=N8nIntegrationService._send_payload,
-            args=(N8nIntegrationService.N8N_WEBHOOK_URL, payload, "Context")
+            target=N8nIntegrationService._send_context_payload,
+            args=(context_id, payload, payload_hash)
         )
         thread.start()
+
+
+class ContextBatcher:
+    """
+    Batch mode for context payloads.
+    Pending payloads are keyed by context (a newer payload replaces the pending
+    one) and sent as one gzip-compressed array to the context-batch webhook
+    when the flush timer fires or max_size payloads are pending.
+
+    n8n answers {"results": [{"context_id": 1, "ok": true}, ...]}; accepted
+    items record their hash, failed ones are re-queued on their own for up to
+    max_attempts. A 2xx without a results list counts as all accepted.
+    """
+
+    def __init__(self, flush_seconds, max_size, max_attempts):
+        self.flush_seconds = flush_seconds
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending = {}  # context_id -> (payload, payload_hash, attempts)
+        self._timer = None
+
+    def enqueue(self, context_id, payload, payload_hash, attempts=0, replace=True):
+        with self._lock:
+            if replace or context_id not in self._pending:
+                self._pending[context_id] = (payload, payload_hash, attempts)
+            batch = self._take() if len(self._pending) >= self.max_size else None
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            threading.Thread(target=self._send, args=(batch,)).start()
+
+    def flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _take(self):
+        # Caller holds the lock
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _send(self, batch):
+        items = [payload for payload, _, _ in batch.values()]
+        results = None
+        try:
+            response = N8nIntegrationService.post_with_retry(
+                N8nIntegrationService.N8N_CONTEXT_BATCH_WEBHOOK_URL,
+                {"items": items},
+                f"Context Batch ({len(items)})",
+                compress=True
+            )
+            try:
+                results = response.json().get('results')
+            except (ValueError, AttributeError):
+                results = None
+            if not isinstance(results, list):
+                results = [{"context_id": context_id, "ok": True} for context_id in batch]
+        except CircuitOpenError:
+            # n8n is known to be down: park the whole batch without spending attempts
+            for context_id, (payload, payload_hash, attempts) in batch.items():
+                self.enqueue(context_id, payload, payload_hash, attempts, replace=False)
+            return
+        except Exception:
+            results = [] # Error already logged in helper; everything is retried
+
+        accepted = {r.get('context_id') for r in results if isinstance(r, dict) and r.get('ok')}
+        delivered = [
+            SituationContext(id=context_id, last_payload_hash=payload_hash)
+            for context_id, (_, payload_hash, _) in batch.items() if context_id in accepted
+        ]
+        if delivered:
+            SituationContext.objects.bulk_update(delivered, ['last_payload_hash'])
+
+        for context_id, (payload, payload_hash, attempts) in batch.items():
+            if context_id in accepted:
+                continue
+            if attempts + 1 < self.max_attempts:
+                # Don't clobber a newer payload queued meanwhile
+                self.enqueue(context_id, payload, payload_hash, attempts + 1, replace=False)
+            else:
+                logger.error(f"Giving up on context {context_id} after {attempts + 1} batch attempts.")
+
+
+context_batcher = ContextBatcher(
+    flush_seconds=getattr(settings, 'N8N_CONTEXT_BATCH_FLUSH_SECONDS', 2.0),
+    max_size=getattr(settings, 'N8N_CONTEXT_BATCH_MAX_SIZE', 100),
+    max_attempts=getattr(settings, 'N8N_CONTEXT_BATCH_MAX_ATTEMPTS', 3),
+)
+# Don't drop whatever is still pending on shutdown
+atexit.register(context_batcher.flush)
+
+# --- 6. AI Plan Cache ---
+
+# Payload keys that decide what plan n8n produces; anything else (timestamps,
+# client metadata) must not split the cache.
+PLAN_KEY_FIELDS = ('context_id', 'context', 'signature', 'active_goals', 'notes')
+
+def plan_cache_key(user_id, payload):
+    """
+    Canonical cache key for a generate_plan payload: a hash of the normalized
+    context/goals/notes, scoped to the user.
+    """
+    normalized = {key: payload.get(key) for key in PLAN_KEY_FIELDS if payload.get(key) not in (None, '', [], {})}
+    digest = hashlib.sha256(
+        json.dumps(normalized, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    ).hexdigest()
+    return f"ai-plan:{user_id}:{digest}"
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, the others block until it finishes and get the same result (or
+    the same exception), or TimeoutError once `timeout` runs out. Per process
+    (an in-process lock); the plan cache covers repeats after.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+plan_single_flight = SingleFlight()
@@ -1,7 +1,20 @@
-from django.db.models.signals import post_save
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.utils import timezone
 from django.dispatch import receiver
-from .models import SituationContext, Note, PersonalGoal, ChatMessage, Achievement
-from .services import N8nIntegrationService, AnalyticsService
+from django.contrib.auth.models import User
+from .models import (
+    SituationContext, Note, PersonalGoal, GoalPlan, GoalTaskInfo, SubTask, ChatMessage, ChatSession, ChatArchive,
+    Achievement, AiRecommendation, ContextPreset, SyncTombstone
+)
+from .services import N8nIntegrationService, AnalyticsService, record_context_usage
+from . import events
+from .archive import restore_session
+from .sync import SYNC_RESOURCE_NAMES
+from .routers import chat_db
+from .tfidf import index_note
+from .versions import VERSIONED_RESOURCES, bump_version, owner_id
 
 @receiver(post_save, sender=SituationContext)
 def trigger_n8n_on_context_save(sender, instance, created, **kwargs):
@@ -10,6 +23,13 @@ def trigger_n8n_on_context_save(sender, instance, created, **kwargs):
     """
     N8nIntegrationService.trigger_context_processing(instance.id)
 
+@receiver(post_save, sender=Note)
+def index_note_on_save(sender, instance, **kwargs):
+    """
+    Refresh the note's TF-IDF vector (related notes).
+    """
+    index_note(instance)
+
 @receiver(post_save, sender=Note)
 def trigger_n8n_on_note_save(sender, instance, created, **kwargs):
     """
@@ -41,6 +61,15 @@ def trigger_n8n_on_goal_save(sender, instance, created, **kwargs):
                 points=AnalyticsService.calculate_points(instance.importance)
             )
 
+@receiver(pre_save, sender=ChatMessage)
+def restore_archived_session(sender, instance, **kwargs):
+    """
+    A new message in an archived session brings the session's messages
+    back to ChatMessage first (see archive.py).
+    """
+    if instance._state.adding and ChatArchive.objects.filter(session_id=instance.session_id).exists():
+        restore_session(instance.session_id)
+
 @receiver(post_save, sender=ChatMessage)
 def trigger_n8n_on_chat_message(sender, instance, created, **kwargs):
     """
@@ -49,3 +78,143 @@ def trigger_n8n_on_chat_message(sender, instance, created, **kwargs):
     if created and instance.role == 'user':
         # Use on_commit or async task in prod, but direct call for now
         N8nIntegrationService.trigger_chat_response(instance.session.id, instance.content)
+
+@receiver(post_save, sender=ChatMessage)
+def publish_chat_message_event(sender, instance, created, using, **kwargs):
+    """
+    Push new chat messages (user, assistant or system) to the owner's event stream.
+    """
+    if created:
+        user_id = instance.session.user_id
+        # On the chat database's transaction, which may not be the default one
+        transaction.on_commit(lambda: events.publish_chat_message(instance, user_id), using=using)
+
+@receiver(post_save, sender=AiRecommendation)
+def publish_recommendation_event(sender, instance, created, **kwargs):
+    """
+    Push new AI recommendations to the owner's event stream.
+    """
+    if created:
+        transaction.on_commit(lambda: events.publish_recommendation(instance))
+
+@receiver(post_save, sender=ChatMessage)
+def update_session_message_stats(sender, instance, created, **kwargs):
+    """
+    Keep the session's message count and last-message preview current,
+    so the session list never has to load messages.
+    """
+    if created:
+        ChatSession.objects.filter(id=instance.session_id).update(
+            message_count=F('message_count') + 1,
+            last_message_preview=instance.content[:200],
+            last_message_at=instance.timestamp,
+        )
+
+@receiver(post_save, sender=ChatMessage)
+def restore_session_archived_meanwhile(sender, instance, created, **kwargs):
+    """
+    The archiver may have taken the session between restore_archived_session
+    and the insert. Connected after update_session_message_stats, whose
+    update waits for the archiver's lock on the session row, so an archive
+    committed meanwhile is seen here and the session is restored.
+    """
+    if created and ChatArchive.objects.filter(session_id=instance.session_id).exists():
+        restore_session(instance.session_id)
+
+@receiver(post_delete, sender=ChatMessage)
+def decrement_session_message_count(sender, instance, **kwargs):
+    ChatSession.objects.filter(id=instance.session_id, message_count__gt=0).update(message_count=F('message_count') - 1)
+
+# Cascades between the chat database and the main one (see routers.py)
+
+@receiver(post_delete, sender=ChatSession)
+def unlink_deleted_chat_session(sender, instance, **kwargs):
+    for model in (Note, PersonalGoal, GoalPlan, GoalTaskInfo, SubTask, AiRecommendation):
+        model.objects.filter(chat_session_id=instance.id).update(chat_session=None)
+
+# Deleting a user takes their rows with them in one cascade, whose signals
+# all carry the same `origin` (the deleted user or queryset): nothing may be
+# written for those users meanwhile, it would fail the user's FK at commit.
+
+@receiver(pre_delete, sender=User)
+def mark_user_deleting(sender, instance, origin=None, **kwargs):
+    if origin is not None:
+        if not hasattr(origin, '_deleting_user_ids'):
+            origin._deleting_user_ids = set()
+        origin._deleting_user_ids.add(instance.id)
+
+def user_being_deleted(user_id, origin):
+    return user_id is not None and user_id in getattr(origin, '_deleting_user_ids', ())
+
+@receiver(post_delete, sender=User)
+def delete_user_chat_sessions(sender, instance, using, **kwargs):
+    """
+    Once the user is gone, in SQL: the ORM's delete signals would record
+    versions and tombstones for them. Their linked content went with them.
+    """
+    user_id = instance.id
+
+    def delete_chat():
+        with connections[chat_db()].cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {ChatMessage._meta.db_table} WHERE session_id IN "
+                f"(SELECT id FROM {ChatSession._meta.db_table} WHERE user_id = %s)", [user_id]
+            )
+            cursor.execute(
+                f"DELETE FROM {ChatArchive._meta.db_table} WHERE session_id IN "
+                f"(SELECT id FROM {ChatSession._meta.db_table} WHERE user_id = %s)", [user_id]
+            )
+            cursor.execute(f"DELETE FROM {ChatSession._meta.db_table} WHERE user_id = %s", [user_id])
+
+    transaction.on_commit(delete_chat, using=using)
+
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Leave a tombstone for deleted rows of synced models so offline clients drop them.
+    Not for a user's own rows when the user is deleted: their clients go too.
+    """
+    if user_being_deleted(instance.user_id, origin):
+        return
+    SyncTombstone.objects.create(user_id=instance.user_id, resource=SYNC_RESOURCE_NAMES[sender], object_id=instance.pk)
+
+# Connected per model (not globally) so other models keep Django's fast-delete path
+for synced_model in SYNC_RESOURCE_NAMES:
+    post_delete.connect(record_sync_tombstone, sender=synced_model, dispatch_uid=f"sync_tombstone_{synced_model.__name__}")
+
+@receiver(m2m_changed, sender=ContextPreset.options.through)
+def touch_preset_on_options_change(sender, instance, action, **kwargs):
+    """
+    Changing a preset's options doesn't save the preset; bump updated_at so it syncs.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, ContextPreset):
+        ContextPreset.objects.filter(id=instance.id).update(updated_at=timezone.now())
+        bump_version('presets', instance.user_id)
+
+def bump_resource_version(sender, instance, origin=None, **kwargs):
+    """
+    Bump the owner's version of the API resource, so ETags of responses built from it change.
+    Not while the owner is being deleted: their versions go with them.
+    """
+    user_id = owner_id(instance)
+    if user_being_deleted(user_id, origin):
+        return
+    bump_version(VERSIONED_RESOURCES[sender], user_id)
+
+for versioned_model in VERSIONED_RESOURCES:
+    post_save.connect(bump_resource_version, sender=versioned_model, dispatch_uid=f"resource_version_save_{versioned_model.__name__}")
+    post_delete.connect(bump_resource_version, sender=versioned_model, dispatch_uid=f"resource_version_delete_{versioned_model.__name__}")
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=PersonalGoal)
+@receiver(post_save, sender=AiRecommendation)
+def record_context_usage_on_content(sender, instance, created, **kwargs):
+    """
+    Attaching content to a context puts it in the user's contexts.
+    """
+    if created:
+        record_context_usage(instance.user_id, instance.context_id)
+
+@receiver(m2m_changed, sender=SituationContext.options.through)
+def bump_contexts_on_options_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('contexts')
@@ -1,3 +1,1557 @@
-from django.test import TestCase
+import base64
+import io
+import threading
+import types
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.db.models.signals import pre_save
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import signals
+from .archive import archive_inactive_sessions, archive_session, inactivity_cutoff
+from .events import StreamCursor, catch_up, event_broker, stream_events
+from .models import (
+    StatusGroup, StatusOption, SituationContext, ContextUsage, Note, PersonalGoal, GoalPlan, GoalTaskInfo, SubTask,
+    ChatSession, ChatMessage, ChatArchive, AiRecommendation, NoteVector, SyncTombstone, ResourceVersion
+)
+from .middleware import QueryInstrumentationMiddleware, normalize_sql, route_stats
+from .quick_switch import build_lists, quick_switch_lists
+from .related import ContextIndex, context_indexes
+from .services import (
+    CircuitOpenError, ContextBatcher, N8nIntegrationService, SingleFlight,
+    record_context_usage, record_context_visit,
+)
+from .sync import decode_token, encode_token
+from .tfidf import note_corpora, term_frequencies
+
+
+class InlineThread:
+    """Runs its target on start(), so background deliveries finish inside the test."""
+
+    def __init__(self, target=None, args=(), kwargs=None, **options):
+        self.target, self.args, self.kwargs = target, args, kwargs or {}
+
+    def start(self):
+        self.target(*self.args, **self.kwargs)
+
+
+# The services module's view of threading (patching threading.Thread itself
+# would also run asgiref's and the test client's threads inline)
+INLINE_THREADING = types.SimpleNamespace(**{**vars(threading), 'Thread': InlineThread})
+
+
+class LifeManagerTestCase(TestCase):
+    """
+    Chat models live in the chat database (routers.py). n8n is never called:
+    every webhook fails at once, as when n8n is down, and the threads that
+    deliver them run inline.
+    """
+    databases = {'default', 'chat'}
+
+    def setUp(self):
+        patcher = mock.patch(
+            'life_manager.services.N8nIntegrationService.post_with_retry',
+            side_effect=requests.exceptions.ConnectionError("n8n is not running in tests"),
+        )
+        self.post_with_retry = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('life_manager.services.threading', INLINE_THREADING)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('alice', password='secret')
+        self.context = SituationContext.objects.create(unique_signature='1-2')
+        self.post_with_retry.reset_mock()
+
+    def create_context(self, signature, options):
+        context = SituationContext.objects.create(unique_signature=signature)
+        context.options.add(*options)
+        return context
+
+    def webhook_calls(self, description):
+        return sum(1 for call in self.post_with_retry.call_args_list if call.args[2] == description)
+
+    def check_constraints(self):
+        for alias in self.databases:
+            connections[alias].check_constraints()
+
+
+class SyncTombstoneTests(LifeManagerTestCase):
+
+    def test_deleted_rows_leave_tombstones(self):
+        note = Note.objects.create(user=self.user, context=self.context, title='t', content='c')
+        note_id = note.id
+        note.delete()
+
+        self.assertTrue(SyncTombstone.objects.filter(user=self.user, resource='notes', object_id=note_id).exists())
+
+    def test_deleting_a_user_writes_no_tombstones_for_them(self):
+        other = User.objects.create_user('bob')
+        Note.objects.create(user=self.user, context=self.context, title='t', content='c')
+        PersonalGoal.objects.create(user=self.user, context=self.context, title='g')
+        Note.objects.create(user=other, context=self.context, title='kept', content='c')
+
+        self.user.delete()
+
+        self.check_constraints()
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertFalse(SyncTombstone.objects.exists())
+        self.assertEqual(Note.objects.get().user, other)
+
+        # Other users' deletions are still recorded
+        Note.objects.get().delete()
+        self.assertTrue(SyncTombstone.objects.filter(user=other).exists())
+
+
+class SyncTokenTests(LifeManagerTestCase):
+
+    def token(self, raw):
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def test_round_trip(self):
+        moment = timezone.now()
+
+        self.assertEqual(decode_token(encode_token(moment)), moment)
+
+    def test_malformed_tokens_are_none(self):
+        for token in ('garbage', self.token('v2:2026-01-01T00:00:00+00:00'), self.token('v1:yesterday'),
+                      self.token('v1:2026-13-45T00:00:00'), self.token('v1:2026-01-01T00:00:00')):
+            self.assertIsNone(decode_token(token), token)
+
+    def test_sync_rejects_invalid_tokens(self):
+        self.client.force_login(self.user)
+        for raw in ('v1:2026-13-45T00:00:00', 'v1:2026-01-01T00:00:00'):
+            response = self.client.get('/sync/', {'since': self.token(raw)})
+            self.assertEqual(response.status_code, 400, raw)
+            self.assertEqual(response.json(), {'error': 'Invalid sync token.'})
+
+    def test_sync_with_a_valid_token(self):
+        self.client.force_login(self.user)
+        token = self.client.get('/sync/').json()['token']
+
+        response = self.client.get('/sync/', {'since': token})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['full'])
+
+
+class ResourceVersionTests(LifeManagerTestCase):
+
+    def create_content(self, user):
+        Note.objects.create(user=user, context=self.context, title='t', content='c')
+        goal = PersonalGoal.objects.create(user=user, context=self.context, title='g')
+        SubTask.objects.create(goal=goal, description='s')
+
+    def test_writes_bump_the_owners_version(self):
+        self.create_content(self.user)
+        versions = dict(ResourceVersion.objects.filter(user=self.user).values_list('resource', 'version'))
+
+        Note.objects.get().delete()
+
+        self.assertEqual(ResourceVersion.objects.get(user=self.user, resource='notes').version, versions['notes'] + 1)
+        self.assertIn('subtasks', versions)
+
+    def test_deleting_a_user_with_content_takes_their_versions(self):
+        self.create_content(self.user)
+        user_id = self.user.id
+        self.assertTrue(ResourceVersion.objects.filter(user_id=user_id).exists())
+
+        self.user.delete()
+
+        self.check_constraints()
+        self.assertFalse(ResourceVersion.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Note.objects.exists())
+
+    def test_deleting_users_by_queryset(self):
+        other = User.objects.create_user('bob')
+        self.create_content(self.user)
+        self.create_content(other)
+
+        User.objects.filter(id__in=[self.user.id, other.id]).delete()
+
+        self.check_constraints()
+        self.assertFalse(ResourceVersion.objects.filter(user__isnull=False).exists())
+        self.assertFalse(SyncTombstone.objects.exists())
+
+
+class ContextApiTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        group = StatusGroup.objects.create(name='Place')
+        self.home, self.work, self.gym = (StatusOption.objects.create(group=group, name=name) for name in ('Home', 'Work', 'Gym'))
+        self.home_work = self.create_context('home-work', [self.home, self.work])
+        self.work_gym = self.create_context('work-gym', [self.work, self.gym])
+        self.bobs = self.create_context('home-gym', [self.home, self.gym])
+        record_context_usage(self.user.id, self.home_work.id)
+        record_context_usage(self.user.id, self.work_gym.id)
+        record_context_usage(User.objects.create_user('bob').id, self.bobs.id)
+        self.client.force_login(self.user)
+
+    def context_ids(self, query=''):
+        response = self.client.get(f'/contexts/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {context['id'] for context in response.json()['results']}
+
+    def test_lists_only_the_users_contexts(self):
+        self.assertEqual(self.context_ids(), {self.home_work.id, self.work_gym.id})
+        self.assertEqual(self.client.get(f'/contexts/{self.bobs.id}/').status_code, 404)
+
+    def test_options_all_needs_every_option(self):
+        self.assertEqual(self.context_ids(f'options_all={self.home.id},{self.work.id}'), {self.home_work.id})
+        self.assertEqual(self.context_ids(f'options_all={self.work.id}'), {self.home_work.id, self.work_gym.id})
+        # Bob's context has both, but isn't the user's
+        self.assertEqual(self.context_ids(f'options_all={self.home.id},{self.gym.id}'), set())
+
+    def test_options_any_needs_one_option(self):
+        self.assertEqual(self.context_ids(f'options_any={self.home.id},{self.gym.id}'), {self.home_work.id, self.work_gym.id})
+        self.assertEqual(self.context_ids(f'options_any={self.gym.id}'), {self.work_gym.id})
+
+    def test_filters_combine(self):
+        query = f'options_all={self.work.id}&options_any={self.gym.id}'
+        self.assertEqual(self.context_ids(query), {self.work_gym.id})
+
+    def test_invalid_option_ids_are_rejected(self):
+        for query in ('options_all=a,b', f'options_any={self.home.id},x', 'options_all=-1', 'options_all=²'):
+            response = self.client.get(f'/contexts/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split('=')[0], response.json())
+
+    def test_creating_a_context_records_its_usage(self):
+        response = self.client.post('/contexts/', {'unique_signature': 'gym', 'options': [self.gym.id]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(ContextUsage.objects.filter(user=self.user, context_id=response.json()['id']).exists())
+
+
+class QueryInstrumentationTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        route_stats.reset()
+        self.addCleanup(route_stats.reset)
+
+    def test_sync_requests_are_measured(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/notes/')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+        self.assertIn(('GET', '^notes/$'), route_stats.routes)
+
+    async def test_async_views_stay_async(self):
+        async def view(request):
+            await sync_to_async(list)(User.objects.all())
+            return HttpResponse('ok')
+
+        middleware = QueryInstrumentationMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertEqual(route_stats.routes[('GET', '<unmatched>')]['queries'], 1)
+
+    async def test_event_stream_through_the_async_stack(self):
+        response = await self.async_client.get('/events/')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(len(route_stats.routes), 1)
+
+    @override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        response = QueryInstrumentationMiddleware(lambda request: HttpResponse('ok'))(RequestFactory().get('/'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(route_stats.routes, {})
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a = 'x'  AND b IN (%s, %s, %s) AND c = 42"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?",
+        )
+
+
+class N8nHealthTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.breaker = N8nIntegrationService.breaker
+        self.addCleanup(self.breaker.record_success)
+        with self.assertLogs('life_manager.services', 'WARNING'):
+            for _ in range(self.breaker.failure_threshold):
+                self.breaker.record_failure(Exception("connect to http://n8n.internal:5678 refused"))
+
+    def test_anonymous_callers_get_the_state_only(self):
+        response = self.client.get('/health/n8n/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(set(response.json()), {'state', 'consecutive_failures', 'retry_after'})
+        self.assertEqual(response.json()['state'], 'open')
+        self.assertGreater(response.json()['retry_after'], 0)
+        self.assertNotIn(b'n8n.internal', response.content)
+
+    def test_staff_get_the_full_snapshot(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        response = self.client.get('/health/n8n/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('n8n.internal', response.json()['last_error'])
+
+    def test_closed_circuit_is_healthy(self):
+        self.breaker.record_success()
+
+        response = self.client.get('/health/n8n/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'state': 'closed', 'consecutive_failures': 0, 'retry_after': 0})
+
+
+class GeneratePlanTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.post_with_retry.side_effect = None
+        self.post_with_retry.return_value.json.return_value = {'title': 'Plan', 'summary': 'S', 'recommendation': 'Do it'}
+        self.client.force_login(self.user)
+
+    def plan_calls(self):
+        # Context webhooks go through the same helper
+        return self.webhook_calls("Generate Plan")
+
+    def generate(self, query=''):
+        return self.client.post(f'/recommendations/generate_plan/{query}',
+                                {'context_id': self.context.id, 'goals': [{'title': 'Run'}]},
+                                content_type='application/json')
+
+    def test_identical_payloads_are_served_from_the_cache(self):
+        first = self.generate()
+        second = self.generate()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(self.plan_calls(), 1)
+
+        self.assertNotEqual(self.generate('?refresh=1').json()['id'], first.json()['id'])
+        self.assertEqual(self.plan_calls(), 2)
+
+    @override_settings(PLAN_RETRY_AFTER_SECONDS=7)
+    def test_waiting_on_a_call_in_flight_times_out_with_503(self):
+        with mock.patch('life_manager.views.plan_single_flight.do', side_effect=TimeoutError):
+            response = self.generate()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+
+class SingleFlightTests(TestCase):
+
+    def test_followers_share_the_leaders_result(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'plan'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', slow, timeout=5)))
+        follower.start()
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(results, ['plan', 'plan'])
+        self.assertEqual(len(calls), 1)
+
+    def test_follower_gives_up_after_its_timeout(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        leader = threading.Thread(target=flight.do, args=('key', slow))
+        leader.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(TimeoutError):
+                flight.do('key', slow, timeout=0.01)
+        finally:
+            release.set()
+            leader.join()
+
+
+class ChatArchiveTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session = ChatSession.objects.create(user=self.user, title='Old')
+        for i in range(5):
+            ChatMessage.objects.create(session=self.session, role='assistant', content=f"Message {i}")
+        self.make_inactive()
+        self.client.force_login(self.user)
+
+    def make_inactive(self):
+        old = timezone.now() - timedelta(days=60)
+        ChatMessage.objects.filter(session=self.session).update(timestamp=old)
+        ChatSession.objects.filter(id=self.session.id).update(last_message_at=old)
+
+    def page(self):
+        return self.client.get(f'/chat_sessions/{self.session.id}/messages/').json()
+
+    def test_archived_sessions_read_the_same(self):
+        before = self.page()
+
+        archives = archive_inactive_sessions()
+
+        self.assertEqual([archive.session_id for archive in archives], [self.session.id])
+        self.assertFalse(ChatMessage.objects.filter(session=self.session).exists())
+        self.assertEqual(self.page(), before)
+        response = self.client.get(f"/chat_messages/{before[0]['id']}/")
+        self.assertEqual(response.json()['content'], 'Message 0')
+        self.assertEqual(self.client.get('/chat_messages/%C2%B2/').status_code, 404)
+
+    def test_a_new_message_restores_the_session(self):
+        ids = list(ChatMessage.objects.filter(session=self.session).values_list('id', flat=True))
+        archive_inactive_sessions()
+
+        ChatMessage.objects.create(session=self.session, role='assistant', content='Back')
+
+        self.assertFalse(ChatArchive.objects.exists())
+        restored = list(ChatMessage.objects.filter(session=self.session).order_by('id').values_list('id', 'content'))
+        self.assertEqual([message_id for message_id, _ in restored[:5]], ids)
+        self.assertEqual(restored[-1][1], 'Back')
+
+    def test_a_message_saved_while_archiving_restores_the_session(self):
+        # The pre_save check ran before the archiver committed
+        pre_save.disconnect(signals.restore_archived_session, sender=ChatMessage)
+        self.addCleanup(pre_save.connect, signals.restore_archived_session, sender=ChatMessage)
+        archive_inactive_sessions()
+
+        ChatMessage.objects.create(session=self.session, role='assistant', content='Raced')
+
+        self.assertFalse(ChatArchive.objects.exists())
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 6)
+
+    def test_a_session_active_since_it_was_selected_is_not_archived(self):
+        cutoff = inactivity_cutoff()
+        ChatMessage.objects.create(session=self.session, role='assistant', content='Just now')
+
+        self.assertIsNone(archive_session(self.session.id, cutoff))
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 6)
+
+
+class ContextPayloadTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        group = StatusGroup.objects.create(name='Place')
+        self.context.options.add(*(StatusOption.objects.create(group=group, name=f"Option {i}") for i in range(3)))
+
+    def test_payload_is_built_in_fixed_queries(self):
+        for i in range(8):
+            Note.objects.create(user=self.user, context=self.context, title=f"Note {i}", content='c')
+            PersonalGoal.objects.create(user=self.user, context=self.context, title=f"Goal {i}")
+
+        # Context, its options (with group and category), notes, goals
+        with self.assertNumQueries(4):
+            context, payload, payload_hash = N8nIntegrationService.build_context_payload(self.context.id)
+
+        self.assertEqual(len(payload['options']), 3)
+        self.assertEqual(len(payload['notes']), 5)
+        self.assertEqual(len(payload['active_goals']), 5)
+        self.assertEqual(len(payload_hash), 64)
+
+    def test_hash_ignores_the_timestamp(self):
+        _, first, first_hash = N8nIntegrationService.build_context_payload(self.context.id)
+        _, second, second_hash = N8nIntegrationService.build_context_payload(self.context.id)
+
+        self.assertEqual(first_hash, second_hash)
+        self.assertIn('timestamp', first)
+
+    def test_unchanged_payloads_are_not_sent_again(self):
+        self.post_with_retry.side_effect = None
+        N8nIntegrationService.trigger_context_processing(self.context.id)
+        N8nIntegrationService.trigger_context_processing(self.context.id)
+        self.assertEqual(self.webhook_calls("Context"), 1)
+
+        N8nIntegrationService.trigger_context_processing(self.context.id, force=True)
+        self.assertEqual(self.webhook_calls("Context"), 2)
+
+        # A new note changes the payload (and its save triggers the delivery)
+        Note.objects.create(user=self.user, context=self.context, title='New', content='c')
+        self.assertEqual(self.webhook_calls("Context"), 3)
+
+    def test_failed_deliveries_are_sent_again(self):
+        N8nIntegrationService.trigger_context_processing(self.context.id)
+        self.assertEqual(SituationContext.objects.get(id=self.context.id).last_payload_hash, '')
+
+        N8nIntegrationService.trigger_context_processing(self.context.id)
+
+        self.assertEqual(self.webhook_calls("Context"), 2)
+
+    def test_missing_context_is_skipped(self):
+        with self.assertLogs('life_manager.services', 'WARNING'):
+            N8nIntegrationService.trigger_context_processing(0)
+        self.assertEqual(self.webhook_calls("Context"), 0)
+
+
+class EventStreamTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+        self.messages = [
+            ChatMessage.objects.create(session=self.session, role='assistant', content=f"Reply {i}") for i in range(3)
+        ]
+        self.recommendation = AiRecommendation.objects.create(
+            user=self.user, context=self.context, title='Rec', summary='S', recommendation='R'
+        )
+        other_session = ChatSession.objects.create(user=User.objects.create_user('bob'), title='Bob')
+        ChatMessage.objects.create(session=other_session, role='assistant', content='Not yours')
+
+    def test_cursor_round_trip(self):
+        cursor = StreamCursor.parse('12.3')
+        self.assertEqual((cursor.message_id, cursor.recommendation_id), (12, 3))
+        self.assertEqual(str(cursor), '12.3')
+
+    def test_malformed_cursors_are_rejected(self):
+        for value in ('', '12', '1.2.3', 'a.b', None):
+            self.assertIsNone(StreamCursor.parse(value), value)
+
+    def test_cursor_only_moves_forward(self):
+        cursor = StreamCursor(5, 2)
+        cursor.advance('chat.message', 3)
+        cursor.advance('recommendation', 4)
+        cursor.advance('chat.chunk', 9)
+        self.assertEqual(str(cursor), '5.4')
+
+    def test_latest_cursor_is_the_users_newest_rows(self):
+        cursor = StreamCursor.latest(self.user.id)
+        self.assertEqual(str(cursor), f"{self.messages[-1].id}.{self.recommendation.id}")
+
+    def test_catch_up_returns_the_users_rows_after_the_cursor(self):
+        events = catch_up(self.user.id, StreamCursor(self.messages[0].id, 0))
+
+        self.assertEqual(
+            [(event, object_id) for event, _, object_id in events],
+            [('chat.message', self.messages[1].id), ('chat.message', self.messages[2].id),
+             ('recommendation', self.recommendation.id)],
+        )
+        self.assertEqual(catch_up(self.user.id, StreamCursor.latest(self.user.id)), [])
+
+    async def test_stream_replays_then_relays_live_events(self):
+        stream = stream_events(self.user.id, StreamCursor(self.messages[1].id, self.recommendation.id), heartbeat=5)
+        try:
+            self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+            frame = await anext(stream)
+            self.assertTrue(frame.startswith(f"id: {self.messages[2].id}.{self.recommendation.id}\nevent: chat.message\n"))
+
+            # Live, ephemeral events carry no id
+            event_broker.publish(self.user.id, 'chat.chunk', {'session': self.session.id, 'delta': 'Hel'})
+            self.assertEqual(await anext(stream), 'event: chat.chunk\ndata: {"session": %d, "delta": "Hel"}\n\n' % self.session.id)
+        finally:
+            await stream.aclose()
+        self.assertNotIn(self.user.id, event_broker._subscribers)
+
+
+@override_settings(CHAT_SUMMARY_EVERY=3, CHAT_HISTORY_TOKEN_BUDGET=2000, CHAT_HISTORY_MAX_TAIL=40)
+class ChatSummaryTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+
+    def add_messages(self, count):
+        start = ChatMessage.objects.filter(session=self.session).count()
+        return [
+            ChatMessage.objects.create(session=self.session, role='assistant', content=f"Point {start + i}. More detail.")
+            for i in range(count)
+        ]
+
+    def refreshed(self):
+        N8nIntegrationService.refresh_chat_summary(self.session.id)
+        return ChatSession.objects.get(id=self.session.id)
+
+    def test_no_refresh_below_the_threshold(self):
+        self.add_messages(5)
+
+        session = self.refreshed()
+
+        self.assertEqual((session.summary, session.summary_until_id), ('', 0))
+        self.assertEqual(self.webhook_calls("Chat Summary"), 0)
+
+    def test_refresh_at_the_threshold_folds_the_oldest_messages(self):
+        messages = self.add_messages(6)
+
+        session = self.refreshed()
+
+        # n8n is down: the local fallback keeps each message's first sentence
+        self.assertEqual(session.summary_until_id, messages[2].id)
+        self.assertEqual(session.summary, "assistant: Point 0\nassistant: Point 1\nassistant: Point 2")
+        self.assertEqual(self.webhook_calls("Chat Summary"), 1)
+
+        # The tail is back to N messages: nothing more to fold
+        self.assertEqual(self.refreshed().summary_until_id, messages[2].id)
+
+    def test_refresh_uses_the_n8n_summary(self):
+        self.post_with_retry.side_effect = None
+        self.post_with_retry.return_value.json.return_value = {'summary': 'They talked about points.'}
+        self.add_messages(6)
+
+        self.assertEqual(self.refreshed().summary, 'They talked about points.')
+
+    def test_history_is_the_summary_plus_the_unsummarized_tail(self):
+        messages = self.add_messages(6)
+        self.refreshed()
+
+        summary, history = N8nIntegrationService.assemble_chat_history(self.session.id)
+
+        self.assertTrue(summary.startswith('assistant: Point 0'))
+        self.assertEqual([entry['content'] for entry in history], [m.content for m in messages[3:]])
+
+    def test_history_keeps_the_newest_messages_within_the_budget(self):
+        self.add_messages(3)
+        ChatMessage.objects.create(session=self.session, role='assistant', content='x' * 400)
+
+        # 101 tokens for the newest message, 6 for each one before
+        summary, history = N8nIntegrationService.assemble_chat_history(self.session.id, token_budget=110)
+
+        self.assertEqual(summary, '')
+        self.assertEqual(history[-1], {'role': 'assistant', 'content': 'x' * 400})
+        self.assertEqual(len(history), 2)
+
+    def test_an_oversized_newest_message_is_cut_to_its_end(self):
+        ChatMessage.objects.create(session=self.session, role='assistant', content='a' * 100 + 'END')
+
+        _, history = N8nIntegrationService.assemble_chat_history(self.session.id, token_budget=5)
+
+        self.assertEqual(history, [{'role': 'assistant', 'content': ('a' * 100 + 'END')[-20:]}])
+
+
+class ContextBatcherTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = SituationContext.objects.create(unique_signature='3-4')
+        self.post_with_retry.reset_mock()
+        self.batcher = ContextBatcher(flush_seconds=60, max_size=3, max_attempts=2)
+        self.addCleanup(self.batcher._take)  # Cancels the flush timer
+
+    def answer(self, results):
+        self.post_with_retry.side_effect = None
+        self.post_with_retry.return_value.json.return_value = {'results': results}
+
+    def sent_items(self):
+        return [call.args[1]['items'] for call in self.post_with_retry.call_args_list]
+
+    def hash_of(self, context):
+        return SituationContext.objects.get(id=context.id).last_payload_hash
+
+    def test_flush_sends_one_compressed_batch(self):
+        self.answer([{'context_id': self.context.id, 'ok': True}, {'context_id': self.other.id, 'ok': True}])
+        self.batcher.enqueue(self.context.id, {'context_id': self.context.id, 'v': 1}, 'old')
+        self.batcher.enqueue(self.context.id, {'context_id': self.context.id, 'v': 2}, 'hash-1')
+        self.batcher.enqueue(self.other.id, {'context_id': self.other.id}, 'hash-2')
+
+        self.batcher.flush()
+
+        # The newer payload of a context replaces the pending one
+        self.assertEqual(self.sent_items(), [[{'context_id': self.context.id, 'v': 2}, {'context_id': self.other.id}]])
+        self.assertTrue(self.post_with_retry.call_args.kwargs['compress'])
+        self.assertEqual((self.hash_of(self.context), self.hash_of(self.other)), ('hash-1', 'hash-2'))
+        self.assertEqual(self.batcher._pending, {})
+
+    def test_a_full_batch_is_sent_without_waiting(self):
+        self.answer([{'context_id': 1000 + i, 'ok': True} for i in range(3)])
+        for i in range(3):
+            self.batcher.enqueue(1000 + i, {'context_id': 1000 + i}, f"hash-{i}")
+
+        self.assertEqual(len(self.sent_items()), 1)
+        self.assertEqual(len(self.sent_items()[0]), 3)
+
+    def test_rejected_items_are_retried_until_max_attempts(self):
+        self.answer([{'context_id': self.context.id, 'ok': True}, {'context_id': self.other.id, 'ok': False}])
+        self.batcher.enqueue(self.context.id, {'context_id': self.context.id}, 'hash-1')
+        self.batcher.enqueue(self.other.id, {'context_id': self.other.id}, 'hash-2')
+
+        self.batcher.flush()
+
+        self.assertEqual(self.hash_of(self.context), 'hash-1')
+        self.assertEqual(self.hash_of(self.other), '')
+        self.assertEqual(list(self.batcher._pending), [self.other.id])
+
+        with self.assertLogs('life_manager.services', 'ERROR'):
+            self.batcher.flush()
+        self.assertEqual(self.batcher._pending, {})
+
+    def test_an_open_circuit_parks_the_batch(self):
+        self.post_with_retry.side_effect = CircuitOpenError("open")
+        self.batcher.enqueue(self.context.id, {'context_id': self.context.id}, 'hash-1')
+
+        for _ in range(3):
+            self.batcher.flush()
+
+        # No attempt was spent
+        self.assertEqual(self.batcher._pending[self.context.id][2], 0)
+
+    @override_settings(N8N_CONTEXT_BATCH_ENABLED=True)
+    def test_batch_mode_queues_context_deliveries(self):
+        with mock.patch('life_manager.services.context_batcher') as batcher:
+            N8nIntegrationService.trigger_context_processing(self.context.id)
+
+        context_id, payload, payload_hash = batcher.enqueue.call_args.args
+        self.assertEqual((context_id, payload['context_id']), (self.context.id, self.context.id))
+        self.assertEqual(self.webhook_calls("Context"), 0)
+
+
+class KeysetPaginationTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.notes = [Note.objects.create(user=self.user, context=self.context, title=f"Note {i}", content='c') for i in range(7)]
+        # Ties on created_at are broken by id
+        Note.objects.filter(id__in=[note.id for note in self.notes[2:5]]).update(created_at=self.notes[2].created_at)
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [note['id'] for note in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Note.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        self.assertEqual(self.walk('/notes/?page_size=2'), expected)
+        self.assertEqual(self.walk('/notes/?page_size=3&fields=id'), expected)
+
+    def test_last_page_has_no_next_link(self):
+        response = self.client.get('/notes/?page_size=7')
+
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertIsNone(response.json()['next'])
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.client.get('/notes/?page_size=0').json()['results']), 1)
+        self.assertEqual(len(self.client.get('/notes/?page_size=abc').json()['results']), 7)
+
+    def test_invalid_cursors_return_404(self):
+        wrong_length = base64.urlsafe_b64encode(b'[1]').decode('ascii')
+        for cursor in ('garbage', wrong_length, base64.urlsafe_b64encode(b'["not a date", 1]').decode('ascii')):
+            response = self.client.get(f'/notes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+
+
+class ChatSessionApiTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+        self.messages = [
+            ChatMessage.objects.create(session=self.session, role='assistant', content=f"Reply {i}") for i in range(6)
+        ]
+        self.client.force_login(self.user)
+
+    def message_ids(self, query=''):
+        response = self.client.get(f'/chat_sessions/{self.session.id}/messages/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [message['id'] for message in response.json()]
+
+    def test_list_has_stats_but_no_messages(self):
+        ChatSession.objects.create(user=User.objects.create_user('bob'), title='Not yours')
+
+        sessions = self.client.get('/chat_sessions/').json()['results']
+
+        self.assertEqual(len(sessions), 1)
+        self.assertNotIn('messages', sessions[0])
+        self.assertEqual(sessions[0]['message_count'], 6)
+        self.assertEqual(sessions[0]['last_message_preview'], 'Reply 5')
+
+    def test_list_queries_do_not_grow_with_messages(self):
+        for i in range(3):
+            session = ChatSession.objects.create(user=self.user, title=f"More {i}")
+            ChatMessage.objects.create(session=session, role='assistant', content='Hi')
+
+        # Session, user and versions; then one page read, whatever the messages
+        with self.assertNumQueries(3, using='default'), self.assertNumQueries(1, using='chat'):
+            self.client.get('/chat_sessions/')
+
+    def test_retrieve_nests_the_messages(self):
+        response = self.client.get(f'/chat_sessions/{self.session.id}/')
+
+        self.assertEqual([message['id'] for message in response.json()['messages']], [m.id for m in self.messages])
+
+    def test_messages_newest_page_oldest_first(self):
+        self.assertEqual(self.message_ids('?limit=2'), [self.messages[4].id, self.messages[5].id])
+
+    def test_messages_after_a_known_id(self):
+        self.assertEqual(self.message_ids(f'?after={self.messages[3].id}'), [self.messages[4].id, self.messages[5].id])
+        self.assertEqual(self.message_ids(f'?after={self.messages[5].id}'), [])
+
+    def test_bad_limit_and_after_fall_back_to_defaults(self):
+        self.assertEqual(len(self.message_ids('?limit=abc&after=abc')), 6)
+        self.assertEqual(len(self.message_ids('?after=²')), 6)
+        self.assertEqual(len(self.message_ids('?limit=0')), 1)
+
+    def test_deleting_a_message_updates_the_count(self):
+        self.messages[0].delete()
+
+        self.assertEqual(ChatSession.objects.get(id=self.session.id).message_count, 5)
+
+    def test_archived_sessions_ignore_a_bad_after(self):
+        archive_session(self.session.id)
+
+        self.assertEqual(len(self.message_ids('?after=²')), 6)
+        self.assertEqual(self.message_ids(f'?after={self.messages[4].id}'), [self.messages[5].id])
+
+    def test_other_users_sessions_are_hidden(self):
+        other = ChatSession.objects.create(user=User.objects.create_user('bob'), title='Not yours')
+
+        self.assertEqual(self.client.get(f'/chat_sessions/{other.id}/messages/').status_code, 404)
+
+
+class BulkWriteTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.goal = PersonalGoal.objects.create(user=self.user, context=self.context, title='Goal')
+        self.subtasks = [SubTask.objects.create(goal=self.goal, description=f"Step {i}") for i in range(3)]
+        self.client.force_login(self.user)
+
+    def bulk(self, method, resource, items):
+        return getattr(self.client, method)(f'/{resource}/bulk/', items, content_type='application/json')
+
+    def test_create_writes_every_row(self):
+        items = [{'context': self.context.id, 'title': f"Note {i}", 'content': 'c'} for i in range(3)]
+
+        response = self.bulk('post', 'notes', items)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([note['title'] for note in response.json()], ['Note 0', 'Note 1', 'Note 2'])
+        self.assertEqual(Note.objects.filter(user=self.user).count(), 3)
+        # One chat session per note, as for single creates
+        self.assertEqual(ChatSession.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(ResourceVersion.objects.filter(user=self.user, resource='notes').exists())
+
+    def test_one_invalid_row_rejects_the_batch(self):
+        items = [
+            {'context': self.context.id, 'title': 'Fine', 'content': 'c'},
+            {'context': self.context.id, 'content': 'no title'},
+        ]
+
+        response = self.bulk('post', 'notes', items)
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('title', errors[1])
+        self.assertFalse(Note.objects.exists())
+        self.assertFalse(ChatSession.objects.exists())
+
+    def test_list_filters_by_goal(self):
+        other_goal = PersonalGoal.objects.create(user=self.user, context=self.context, title='Other')
+        SubTask.objects.create(goal=other_goal, description='Elsewhere')
+
+        self.assertEqual(len(self.client.get(f'/subtasks/?goal={self.goal.id}').json()['results']), 3)
+        # Not an id: no filter
+        self.assertEqual(len(self.client.get('/subtasks/?goal=²').json()['results']), 4)
+
+    def test_update_changes_only_the_given_fields(self):
+        items = [{'id': subtask.id, 'is_completed': True} for subtask in self.subtasks[:2]]
+
+        response = self.bulk('patch', 'subtasks', items)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(SubTask.objects.order_by('id').values_list('description', 'is_completed')),
+            [('Step 0', True), ('Step 1', True), ('Step 2', False)],
+        )
+
+    def test_update_with_an_invalid_row_changes_nothing(self):
+        other_goal = PersonalGoal.objects.create(user=User.objects.create_user('bob'), context=self.context, title='Not yours')
+        items = [
+            {'id': self.subtasks[0].id, 'is_completed': True},
+            {'id': self.subtasks[1].id, 'goal': other_goal.id},
+        ]
+
+        response = self.bulk('patch', 'subtasks', items)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['id'] for error in response.json()['errors']], [self.subtasks[1].id])
+        self.assertFalse(SubTask.objects.filter(is_completed=True).exists())
+
+    def test_update_of_missing_or_foreign_rows_is_404(self):
+        foreign_goal = PersonalGoal.objects.create(user=User.objects.create_user('bob'), context=self.context, title='Not yours')
+        foreign = SubTask.objects.create(goal=foreign_goal, description='Not yours')
+        items = [{'id': self.subtasks[0].id, 'is_completed': True}, {'id': foreign.id, 'is_completed': True}]
+
+        response = self.bulk('patch', 'subtasks', items)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['ids'], [foreign.id])
+        self.assertFalse(SubTask.objects.filter(is_completed=True).exists())
+
+    def test_update_needs_unique_integer_ids(self):
+        for items in (
+            [{'is_completed': True}],
+            [{'id': str(self.subtasks[0].id), 'is_completed': True}],
+            [{'id': self.subtasks[0].id}, {'id': self.subtasks[0].id}],
+        ):
+            response = self.bulk('patch', 'subtasks', items)
+            self.assertEqual(response.status_code, 400, items)
+            self.assertEqual(response.json()['error'], 'Every object needs a unique integer "id".')
+
+    def test_malformed_batches_are_rejected(self):
+        for items in ({'title': 'not a list'}, [], ['not an object']):
+            response = self.bulk('post', 'notes', items)
+            self.assertEqual(response.status_code, 400, items)
+            self.assertEqual(response.json()['error'], 'Expected a non-empty list of objects.')
+
+    @mock.patch('life_manager.views.BulkWriteMixin.bulk_max_items', 2)
+    def test_batches_over_the_limit_are_rejected(self):
+        items = [{'context': self.context.id, 'title': f"Note {i}", 'content': 'c'} for i in range(3)]
+
+        response = self.bulk('post', 'notes', items)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'At most 2 objects per request.')
+        self.assertFalse(Note.objects.exists())
+
+
+class SparseFieldsetTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        group = StatusGroup.objects.create(name='Place')
+        self.home = StatusOption.objects.create(group=group, name='Home')
+        self.context.options.add(self.home)
+        record_context_usage(self.user.id, self.context.id)
+        self.note = Note.objects.create(user=self.user, context=self.context, title='Title', content='Long body')
+        self.client.force_login(self.user)
+
+    def test_fields_trim_the_response_and_the_query(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get('/notes/?fields=id,title')
+
+        self.assertEqual(response.json()['results'], [{'id': self.note.id, 'title': 'Title'}])
+        note_query = next(query['sql'] for query in queries if 'FROM "life_manager_note"' in query['sql'])
+        self.assertNotIn('"content"', note_query)
+
+    def test_fields_apply_to_retrieve(self):
+        response = self.client.get(f'/notes/{self.note.id}/?fields=title')
+
+        self.assertEqual(response.json(), {'title': 'Title'})
+
+    def test_unknown_field_names_are_ignored(self):
+        self.assertEqual(self.client.get(f'/notes/{self.note.id}/?fields=id,nonexistent').json(), {'id': self.note.id})
+        # Nothing known asked for: nothing rendered, but no error either
+        response = self.client.get(f'/notes/{self.note.id}/?fields=nonexistent')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {})
+
+    def test_expandable_fields_only_with_expand(self):
+        context = self.client.get(f'/contexts/{self.context.id}/').json()
+        self.assertNotIn('options_details', context)
+        self.assertEqual(context['options'], [self.home.id])
+
+        context = self.client.get(f'/contexts/{self.context.id}/?expand=options_details').json()
+        self.assertEqual([option['name'] for option in context['options_details']], ['Home'])
+
+        # Expanded fields are kept next to ?fields=
+        context = self.client.get(f'/contexts/{self.context.id}/?fields=id&expand=options_details').json()
+        self.assertEqual(set(context), {'id', 'options_details'})
+
+    def test_writes_return_every_field(self):
+        response = self.client.patch(f'/notes/{self.note.id}/?fields=id', {'title': 'New'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], 'Long body')
+
+    def test_fast_reads_render_the_same_json(self):
+        PersonalGoal.objects.create(user=self.user, context=self.context, title='Goal', description='d')
+
+        for query in ('', '&fields=id,title', '&fields=importance_display'):
+            slow = self.client.get(f'/goals/?fast=0{query}').json()
+            fast = self.client.get(f'/goals/?fast=1{query}').json()
+            self.assertEqual(fast, slow, query)
+
+
+class GoalWorkspaceTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.goal = self.create_goal('Run a marathon')
+        self.client.force_login(self.user)
+
+    def create_goal(self, title):
+        session = ChatSession.objects.create(user=self.user, title=title)
+        ChatMessage.objects.create(session=session, role='assistant', content=f"About {title}")
+        goal = PersonalGoal.objects.create(user=self.user, context=self.context, title=title, chat_session=session)
+        GoalPlan.objects.create(goal=goal, summary='Plan', content='Train')
+        GoalTaskInfo.objects.create(goal=goal, summary='Tasks')
+        for i in range(3):
+            SubTask.objects.create(goal=goal, description=f"{title} step {i}")
+        return goal
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['chat']) as chat:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(default), len(chat)
+
+    def test_workspace_has_plan_task_info_sub_tasks_and_chat(self):
+        workspace = self.client.get(f'/goals/{self.goal.id}/workspace/').json()
+
+        self.assertEqual(workspace['title'], 'Run a marathon')
+        self.assertEqual(workspace['plan']['content'], 'Train')
+        self.assertEqual(workspace['tasks_info']['summary'], 'Tasks')
+        self.assertEqual([subtask['description'] for subtask in workspace['sub_tasks']],
+                         [f"Run a marathon step {i}" for i in range(3)])
+        self.assertEqual(workspace['chat']['message_count'], 1)
+        self.assertNotIn('messages', workspace['chat'])
+
+    def test_workspace_without_plan_or_chat(self):
+        goal = PersonalGoal.objects.create(user=self.user, context=self.context, title='Bare')
+
+        workspace = self.client.get(f'/goals/{goal.id}/workspace/').json()
+
+        self.assertIsNone(workspace['plan'])
+        self.assertIsNone(workspace['tasks_info'])
+        self.assertEqual(workspace['sub_tasks'], [])
+        self.assertIsNone(workspace['chat'])
+
+    def test_other_users_goals_are_hidden(self):
+        other = PersonalGoal.objects.create(user=User.objects.create_user('bob'), context=self.context, title='Not yours')
+
+        self.assertEqual(self.client.get(f'/goals/{other.id}/workspace/').status_code, 404)
+
+    def test_workspaces_queries_do_not_grow_with_goals(self):
+        few = self.count_queries('/goals/workspaces/?page_size=100')
+        for i in range(20):
+            self.create_goal(f"Goal {i}")
+
+        response = self.client.get('/goals/workspaces/?page_size=100')
+        self.assertEqual(len(response.json()['results']), 21)
+        self.assertEqual(self.count_queries('/goals/workspaces/?page_size=100'), few)
+
+    def test_workspace_etag_changes_with_sub_tasks(self):
+        url = f'/goals/{self.goal.id}/workspace/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        SubTask.objects.create(goal=self.goal, description='One more')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SearchTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        group = StatusGroup.objects.create(name='Place')
+        self.office = StatusOption.objects.create(group=group, name='Office')
+        self.office_context = self.create_context('office', [self.office])
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+        self.note = Note.objects.create(user=self.user, context=self.office_context, title='Quarterly budget',
+                                        content='Spreadsheet for the budget review', chat_session=self.session)
+        self.goal = PersonalGoal.objects.create(user=self.user, context=self.context, title='Budget less',
+                                                description='Spend less on takeout')
+        self.message = ChatMessage.objects.create(session=self.session, role='assistant', content='Help with my budgeting')
+        self.client.force_login(self.user)
+
+    def hits(self, query):
+        response = self.client.get(f'/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {(hit['type'], hit['id']) for hit in response.json()['results']}
+
+    def test_finds_every_type_by_prefix(self):
+        self.assertEqual(self.hits('q=budg'), {('notes', self.note.id), ('goals', self.goal.id), ('chat', self.message.id)})
+        self.assertEqual(self.hits('q=spreadsheet'), {('notes', self.note.id)})
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.hits('q=budget takeout'), {('goals', self.goal.id)})
+
+    def test_hits_have_snippets_and_ranks(self):
+        hit = self.client.get('/search/?q=spreadsheet').json()['results'][0]
+
+        self.assertEqual(hit['title'], 'Quarterly budget')
+        self.assertIn('[Spreadsheet]', hit['snippet'])
+        self.assertEqual(hit['context'], self.office_context.id)
+
+    def test_index_follows_updates_and_deletes(self):
+        Note.objects.filter(id=self.note.id).update(content='Nothing to see')
+        self.assertEqual(self.hits('q=spreadsheet'), set())
+
+        self.goal.delete()
+        self.assertEqual(self.hits('q=takeout'), set())
+
+    def test_other_users_content_is_never_found(self):
+        bob = User.objects.create_user('bob')
+        Note.objects.create(user=bob, context=self.context, title='Budget', content='Bob budget')
+        ChatMessage.objects.create(session=ChatSession.objects.create(user=bob, title='Bob'), role='assistant', content='budget')
+
+        self.assertEqual(self.hits('q=budget&types=notes,chat'), {('notes', self.note.id), ('chat', self.message.id)})
+
+    def test_types_and_filters(self):
+        self.assertEqual(self.hits('q=budget&types=goals'), {('goals', self.goal.id)})
+        self.assertEqual(self.hits(f'q=budget&context={self.context.id}'), {('goals', self.goal.id)})
+        # Chat messages are matched through the session their note is linked to
+        self.assertEqual(self.hits(f'q=budg&option={self.office.id}'), {('notes', self.note.id), ('chat', self.message.id)})
+
+    def test_operators_are_plain_words(self):
+        self.assertEqual(self.hits('q=budget OR NEAR("x"'), set())
+        self.assertEqual(self.hits('q=***'), set())
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/search/?q=x&types=notes,files').status_code, 400)
+        self.assertEqual(self.client.get('/search/?q=x&context=abc').status_code, 400)
+        self.assertEqual(self.client.get('/search/?q=x&context=²').status_code, 400)
+        self.assertEqual(self.client.get('/search/?q=x&option=²').status_code, 400)
+
+
+class RelatedContextTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        context_indexes.clear()
+        self.addCleanup(context_indexes.clear)
+        group = StatusGroup.objects.create(name='Status')
+        self.office, self.laptop, self.morning, self.gym = (
+            StatusOption.objects.create(group=group, name=name) for name in ('Office', 'Laptop', 'Morning', 'Gym')
+        )
+        self.office_laptop = self.create_context('office-laptop', [self.office, self.laptop])
+        self.office_laptop_morning = self.create_context('office-laptop-morning', [self.office, self.laptop, self.morning])
+        self.gym_morning = self.create_context('gym-morning', [self.gym, self.morning])
+        self.gym_only = self.create_context('gym', [self.gym])
+        for context in (self.office_laptop, self.office_laptop_morning, self.gym_morning, self.gym_only):
+            record_context_usage(self.user.id, context.id)
+        self.client.force_login(self.user)
+
+    def test_index_matches_brute_force_jaccard(self):
+        contexts = {
+            context_id: set(options)
+            for context_id, options in enumerate([{1}, {1, 2}, {1, 2, 3}, {2, 3}, {4}, {1, 4, 5, 6}, set()])
+        }
+        index = ContextIndex(contexts, [(c, o) for c, options in contexts.items() for o in options])
+
+        for query in ({1}, {1, 2}, {2, 3, 4}, {7}, {1, 7}):
+            expected = sorted(
+                ((len(query & options) / len(query | options), context_id)
+                 for context_id, options in contexts.items() if query & options),
+                key=lambda hit: -hit[0],
+            )
+            hits = index.similar(query, k=len(contexts))
+            self.assertEqual(sorted(hits, key=lambda hit: hit[1]), sorted(expected, key=lambda hit: hit[1]), query)
+            self.assertEqual([score for score, _ in hits], [score for score, _ in expected], query)
+
+    def test_index_k_and_exclude(self):
+        index = ContextIndex([10, 20, 30], [(10, 1), (20, 1), (20, 2), (30, 1)])
+
+        self.assertEqual(index.similar([1], k=2), [(1.0, 10), (1.0, 30)])
+        self.assertEqual(index.similar([1], k=5, exclude=10), [(1.0, 30), (0.5, 20)])
+        self.assertEqual(index.similar([1], k=0), [])
+        self.assertEqual(index.similar([9]), [])
+
+    def test_related_ranks_contexts_and_their_content(self):
+        Note.objects.create(user=self.user, context=self.office_laptop, title='Desk setup', content='c')
+        Note.objects.create(user=self.user, context=self.gym_morning, title='Stretch', content='c')
+        AiRecommendation.objects.create(user=self.user, context=self.office_laptop, title='Take breaks',
+                                        summary='s', recommendation='r')
+
+        related = self.client.get(f'/contexts/{self.office_laptop_morning.id}/related/').json()
+
+        self.assertEqual(related['contexts'], [
+            {'id': self.office_laptop.id, 'similarity': round(2 / 3, 4)},
+            {'id': self.gym_morning.id, 'similarity': 0.25},
+        ])
+        self.assertEqual([(note['title'], note['similarity']) for note in related['notes']],
+                         [('Desk setup', round(2 / 3, 4)), ('Stretch', 0.25)])
+        self.assertEqual([rec['title'] for rec in related['recommendations']], ['Take breaks'])
+
+    def test_only_the_users_contexts_and_content(self):
+        bob = User.objects.create_user('bob')
+        office = self.create_context('office', [self.office])
+        record_context_usage(bob.id, office.id)
+        Note.objects.create(user=bob, context=self.office_laptop, title='Not yours', content='c')
+
+        related = self.client.get(f'/contexts/{self.office_laptop.id}/related/').json()
+
+        self.assertNotIn(office.id, [context['id'] for context in related['contexts']])
+        self.assertEqual(related['notes'], [])
+
+    def test_index_is_rebuilt_for_new_contexts(self):
+        self.client.get(f'/contexts/{self.office_laptop.id}/related/')
+        office = self.create_context('office', [self.office])
+        record_context_usage(self.user.id, office.id)
+
+        related = self.client.get(f'/contexts/{self.office_laptop.id}/related/').json()
+
+        self.assertIn({'id': office.id, 'similarity': 0.5}, related['contexts'])
+
+
+class RelatedNoteTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        note_corpora.clear()
+        self.addCleanup(note_corpora.clear)
+        self.marathon = self.create_note('Marathon training', 'Long runs on sunday, intervals on tuesday')
+        self.running = self.create_note('Running shoes', 'Shoes for long runs and intervals')
+        self.recipes = self.create_note('Recipes', 'Pasta with tomato sauce')
+        self.client.force_login(self.user)
+
+    def create_note(self, title, content, user=None, context=None):
+        return Note.objects.create(user=user or self.user, context=context or self.context, title=title, content=content)
+
+    def related_ids(self, note, query=''):
+        response = self.client.get(f'/notes/{note.id}/related/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [hit['id'] for hit in response.json()]
+
+    def test_term_frequencies(self):
+        terms, weights = term_frequencies('Run', 'the run and the walk 42')
+
+        self.assertEqual(len(terms), 2)
+        self.assertEqual(list(terms), sorted(terms))
+        # 'run': twice for the title, once in the content
+        self.assertAlmostEqual(float(weights.max()), 1 + np.log(3), places=5)
+        self.assertEqual(len(term_frequencies('the and', '')[0]), 0)
+
+    def test_saving_a_note_stores_its_vector(self):
+        vector = NoteVector.objects.get(note=self.marathon)
+
+        self.assertEqual(vector.user, self.user)
+        self.assertEqual(len(np.frombuffer(vector.terms, dtype=np.int32)), len(np.frombuffer(vector.weights, dtype=np.float32)))
+
+    def test_related_ranks_similar_notes(self):
+        hits = self.client.get(f'/notes/{self.marathon.id}/related/').json()
+
+        self.assertEqual([hit['id'] for hit in hits], [self.running.id])
+        self.assertGreater(hits[0]['similarity'], 0)
+        self.assertEqual(hits[0]['title'], 'Running shoes')
+
+    def test_related_follows_edits_and_deletes(self):
+        self.assertEqual(self.related_ids(self.marathon), [self.running.id])
+
+        self.recipes.content = 'Pasta before long runs and intervals'
+        self.recipes.save()
+        self.assertEqual(set(self.related_ids(self.marathon)), {self.running.id, self.recipes.id})
+
+        self.running.delete()
+        self.assertEqual(self.related_ids(self.marathon), [self.recipes.id])
+
+    def test_related_limit(self):
+        self.create_note('Intervals', 'Intervals on tuesday')
+
+        self.assertEqual(len(self.related_ids(self.marathon)), 2)
+        self.assertEqual(len(self.related_ids(self.marathon, '?limit=1')), 1)
+        self.assertEqual(len(self.related_ids(self.marathon, '?limit=²')), 2)
+
+    def test_only_the_users_notes(self):
+        bob = User.objects.create_user('bob')
+        bobs = self.create_note('Marathon training', 'Long runs on sunday', user=bob)
+
+        self.assertEqual(self.related_ids(self.marathon), [self.running.id])
+        self.assertEqual(self.client.get(f'/notes/{bobs.id}/related/').status_code, 404)
+
+    def test_bulk_created_notes_are_indexed(self):
+        items = [{'context': self.context.id, 'title': 'Tempo runs', 'content': 'Intervals and long runs'}]
+        created = self.client.post('/notes/bulk/', items, content_type='application/json').json()
+
+        self.assertIn(created[0]['id'], self.related_ids(self.marathon))
+
+    @override_settings(N8N_CONTEXT_RELEVANT_NOTES=2)
+    def test_context_payload_includes_relevant_notes_from_other_contexts(self):
+        other_context = SituationContext.objects.create(unique_signature='elsewhere')
+        Note.objects.filter(id=self.running.id).update(context=other_context)
+        Note.objects.filter(id=self.recipes.id).update(context=other_context)
+
+        _, payload, _ = N8nIntegrationService.build_context_payload(self.context.id)
+
+        self.assertEqual([note['title'] for note in payload['notes']], ['Marathon training'])
+        self.assertEqual([note['title'] for note in payload['relevant_notes']], ['Running shoes'])
+
+
+class QuickSwitchTests(LifeManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        quick_switch_lists.clear()
+        self.addCleanup(quick_switch_lists.clear)
+        group = StatusGroup.objects.create(name='Place')
+        self.home = StatusOption.objects.create(group=group, name='Home')
+        self.work = StatusOption.objects.create(group=group, name='Work')
+        self.home_context = self.create_context('home', [self.home])
+        self.work_context = self.create_context('work', [self.work])
+        self.start = timezone.now()
+        self.client.force_login(self.user)
+
+    def visit(self, context, minutes):
+        with mock.patch('django.utils.timezone.now', return_value=self.start + timedelta(minutes=minutes)):
+            record_context_visit(self.user.id, context.id)
+
+    def usage(self, context):
+        return ContextUsage.objects.get(user=self.user, context=context)
+
+    def test_visits_and_dwell_time(self):
+        self.visit(self.home_context, 0)
+        self.visit(self.home_context, 1)  # a reload
+        self.visit(self.work_context, 10)
+        self.visit(self.home_context, 15)
+
+        home, work = self.usage(self.home_context), self.usage(self.work_context)
+        self.assertEqual((home.visit_count, home.total_dwell_seconds), (2, 600))
+        self.assertEqual((work.visit_count, work.total_dwell_seconds), (1, 300))
+
+    @override_settings(CONTEXT_DWELL_MAX_SECONDS=60)
+    def test_dwell_is_capped_and_long_absences_are_new_visits(self):
+        self.visit(self.home_context, 0)
+        self.visit(self.home_context, 120)
+
+        home = self.usage(self.home_context)
+        self.assertEqual((home.visit_count, home.total_dwell_seconds), (2, 60))
+
+    def usage_version(self):
+        return ResourceVersion.objects.get(user=self.user, resource='context_usage').version
+
+    def test_dashboard_reloads_keep_the_lists_cached(self):
+        with mock.patch('life_manager.quick_switch.build_lists', wraps=build_lists) as build:
+            self.assertEqual(self.client.get(f'/?options={self.home.id}').status_code, 200)
+            version = self.usage_version()
+            self.assertEqual(self.client.get(f'/?options={self.home.id}').status_code, 200)
+
+            self.assertEqual(build.call_count, 1)
+            self.assertEqual(self.usage_version(), version)
+
+            # Switching contexts is a visit: the lists change
+            self.client.get(f'/?options={self.work.id}')
+            self.assertEqual(build.call_count, 2)
+
+    def test_usage_bumps_only_when_the_order_changes(self):
+        record_context_usage(self.user.id, self.home_context.id)
+        record_context_usage(self.user.id, self.work_context.id)
+        version = self.usage_version()
+
+        record_context_usage(self.user.id, self.work_context.id)
+        self.assertEqual(self.usage_version(), version)
+
+        record_context_usage(self.user.id, self.home_context.id)
+        self.assertEqual(self.usage_version(), version + 1)
+
+    def test_recent_and_frequent_lists(self):
+        self.visit(self.work_context, 0)
+        self.visit(self.home_context, 5)
+        self.visit(self.work_context, 10)
+        self.visit(self.home_context, 15)
+        self.visit(self.work_context, 20)
+        self.visit(self.home_context, 25)
+
+        lists = self.client.get('/contexts/quick_switch/').json()
+
+        self.assertEqual([entry['id'] for entry in lists['recent']], [self.home_context.id, self.work_context.id])
+        self.assertEqual([entry['id'] for entry in lists['frequent']], [self.home_context.id, self.work_context.id])
+        self.assertEqual(lists['recent'][0]['visit_count'], 3)
+        self.assertEqual(lists['recent'][0]['options'], [self.home.id])
+        self.assertEqual([option['name'] for option in lists['recent'][0]['options_details']], ['Home'])
+
+        self.visit(self.work_context, 30)
+        lists = self.client.get('/contexts/quick_switch/?limit=1').json()
+        self.assertEqual([entry['id'] for entry in lists['recent']], [self.work_context.id])
+        self.assertEqual([entry['id'] for entry in lists['frequent']], [self.work_context.id])
+
+    def test_contexts_used_but_never_visited_are_only_recent(self):
+        record_context_usage(self.user.id, self.home_context.id)
+
+        lists = self.client.get('/contexts/quick_switch/').json()
+
+        self.assertEqual([entry['id'] for entry in lists['recent']], [self.home_context.id])
+        self.assertEqual(lists['frequent'], [])
+
+    def test_cached_lists_cost_one_query(self):
+        record_context_usage(self.user.id, self.home_context.id)
+        quick_switch_lists.get(self.user.id)
+
+        with self.assertNumQueries(1):
+            lists = quick_switch_lists.get(self.user.id)
+        self.assertEqual(len(lists['recent']), 1)
+
+        # A new usage changes the version token
+        record_context_usage(self.user.id, self.work_context.id)
+        self.assertEqual(len(quick_switch_lists.get(self.user.id)['recent']), 2)
+
+    @override_settings(CONTEXT_QUICK_SWITCH_MAX_USERS=1)
+    def test_least_recently_requested_users_are_evicted(self):
+        bob = User.objects.create_user('bob')
+        quick_switch_lists.get(self.user.id)
+        quick_switch_lists.get(bob.id)
+
+        self.assertEqual(list(quick_switch_lists.lists), [bob.id])
+
+    def test_only_the_users_contexts(self):
+        record_context_usage(User.objects.create_user('bob').id, self.work_context.id)
+
+        self.assertEqual(self.client.get('/contexts/quick_switch/').json(), {'recent': [], 'frequent': []})
+
+
+class DatabaseRoutingTests(LifeManagerTestCase):
+
+    def test_chat_models_use_the_chat_database(self):
+        for model in (ChatSession, ChatMessage, ChatArchive):
+            self.assertEqual(router.db_for_read(model), 'chat')
+            self.assertEqual(router.db_for_write(model), 'chat')
+        self.assertEqual(router.db_for_read(Note), 'default')
+        self.assertEqual(router.db_for_write(Note), 'default')
+
+    def test_related_rows_of_analytics_results_are_read_from_the_replica(self):
+        self.context._state.db = 'replica'
+
+        self.assertEqual(router.db_for_read(StatusOption, instance=self.context), 'replica')
+
+    def test_allow_migrate(self):
+        self.assertIs(router.allow_migrate('chat', 'life_manager', model_name='chatmessage'), True)
+        self.assertIs(router.allow_migrate('default', 'life_manager', model_name='chatmessage'), False)
+        self.assertIs(router.allow_migrate('chat', 'life_manager', model_name='note'), False)
+        self.assertIs(router.allow_migrate('default', 'life_manager', model_name='note'), True)
+        self.assertIs(router.allow_migrate('replica', 'life_manager', model_name='note'), False)
+        self.assertNotIn(ChatSession._meta.db_table, connections['default'].introspection.table_names())
+
+    @override_settings(CHAT_DATABASE='default')
+    def test_without_a_chat_database_everything_stays_on_default(self):
+        self.assertEqual(router.db_for_write(ChatMessage), 'default')
+        self.assertIs(router.allow_migrate('default', 'life_manager', model_name='chatmessage'), True)
+
+    def test_links_resolve_across_databases(self):
+        session = ChatSession.objects.create(user=self.user, title='Chat')
+        note = Note.objects.create(user=self.user, context=self.context, title='t', content='c', chat_session=session)
+
+        self.assertEqual(Note.objects.get(id=note.id).chat_session.title, 'Chat')
+        self.assertEqual(ChatSession.objects.get(id=session.id).note_linked.id, note.id)
+
+    def test_deleting_a_session_unlinks_it(self):
+        session = ChatSession.objects.create(user=self.user, title='Chat')
+        note = Note.objects.create(user=self.user, context=self.context, title='t', content='c', chat_session=session)
+        goal = PersonalGoal.objects.create(user=self.user, context=self.context, title='g', chat_session=session)
+
+        session.delete()
+
+        self.assertIsNone(Note.objects.get(id=note.id).chat_session_id)
+        self.assertIsNone(PersonalGoal.objects.get(id=goal.id).chat_session_id)
+        self.check_constraints()
+
+    def test_deleting_a_user_deletes_their_chat(self):
+        bob = User.objects.create_user('bob')
+        session = ChatSession.objects.create(user=self.user, title='Chat')
+        ChatMessage.objects.create(session=session, role='assistant', content='Hi')
+        archived = ChatSession.objects.create(user=self.user, title='Old')
+        ChatMessage.objects.create(session=archived, role='assistant', content='Old')
+        archive_session(archived.id)
+        kept = ChatSession.objects.create(user=bob, title='Kept')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertEqual(list(ChatSession.objects.values_list('id', flat=True)), [kept.id])
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertFalse(ChatArchive.objects.exists())
+
+
+class CopyChatDatabaseTests(LifeManagerTestCase):
+    """The chat tables of an install migrated before the split, stuck at 0010 on default."""
+
+    def setUp(self):
+        super().setUp()
+        connection = connections['default']
+        self.old = timezone.now() - timedelta(days=400)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE "life_manager_chatsession" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+                '"created_at" datetime NOT NULL, "title" varchar(200) NOT NULL, "user_id" integer NOT NULL)'
+            )
+            cursor.execute(
+                'CREATE TABLE "life_manager_chatmessage" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+                '"role" varchar(10) NOT NULL, "content" text NOT NULL, "timestamp" datetime NOT NULL, '
+                '"session_id" bigint NOT NULL)'
+            )
+            for session_id in (3, 7):
+                cursor.execute(
+                    'INSERT INTO life_manager_chatsession (id, created_at, title, user_id) VALUES (%s, %s, %s, %s)',
+                    [session_id, connection.ops.adapt_datetimefield_value(self.old), f"Chat {session_id}", self.user.id],
+                )
+            for message_id, minutes in ((10, 0), (11, 1), (12, 2)):
+                cursor.execute(
+                    'INSERT INTO life_manager_chatmessage (id, role, content, timestamp, session_id) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    [message_id, 'user', f"Message {message_id}",
+                     connection.ops.adapt_datetimefield_value(self.old + timedelta(minutes=minutes)), 3],
+                )
+
+    def copy(self, *args):
+        out = io.StringIO()
+        call_command('copy_chat_database', *args, stdout=out)
+        return out.getvalue()
+
+    def test_copies_legacy_tables_keeping_ids_and_timestamps(self):
+        self.assertIn('Copied 2 chat sessions, 3 messages and 0 archives', self.copy())
+
+        sessions = ChatSession.objects.order_by('id')
+        self.assertEqual([session.id for session in sessions], [3, 7])
+        self.assertEqual(sessions[0].created_at, self.old)
+        self.assertEqual(sessions[0].summary, '')
+        self.assertEqual(
+            list(ChatMessage.objects.order_by('id').values_list('id', 'timestamp')),
+            [(10, self.old), (11, self.old + timedelta(minutes=1)), (12, self.old + timedelta(minutes=2))],
+        )
+
+    def test_recomputes_message_stats(self):
+        self.copy()
+
+        stats = {session.id: (session.message_count, session.last_message_preview, session.last_message_at)
+                 for session in ChatSession.objects.all()}
+        self.assertEqual(stats, {3: (3, 'Message 12', self.old + timedelta(minutes=2)), 7: (0, '', None)})
+
+    def test_copied_sessions_can_be_archived(self):
+        self.copy()
+
+        self.assertEqual([archive.session_id for archive in archive_inactive_sessions()], [3])
+
+    def test_new_rows_get_new_ids(self):
+        self.copy()
+
+        session = ChatSession.objects.create(user=self.user, title='New')
+        self.assertGreater(session.id, 7)
+
+    def test_refuses_to_overwrite_without_force(self):
+        self.copy()
+
+        with self.assertRaises(CommandError):
+            self.copy()
+        self.assertIn('Copied 2 chat sessions', self.copy('--force'))
+        self.assertEqual(ChatMessage.objects.count(), 3)
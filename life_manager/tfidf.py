@@ -0,0 +1,198 @@
+"""
+Related notes by TF-IDF cosine similarity.
+
+Every note gets a NoteVector when it is saved: its title and content are
+tokenized, terms are hashed into a fixed id space (no vocabulary table to
+keep in sync) and stored with their sublinear tf weights as packed int32 /
+float32 arrays. IDF is corpus dependent, so it is applied at query time.
+
+Each user's notes form one corpus, held per process as column-sorted NumPy
+arrays (term -> notes) with L2-normalized TF-IDF weights. A query only
+touches the columns of its own terms. The cache is refreshed incrementally:
+one aggregate query tells whether vectors changed, and only the changed
+rows are reloaded.
+"""
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Note, NoteVector
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+
+HASH_BITS = 22
+TITLE_WEIGHT = 2
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its me my of on or our so
+that the their them then there these they this to was we were what when which who will with
+you your not no do does did can could should would just about than too very also only
+""".split())
+
+_EMPTY_TERMS = np.empty(0, dtype=np.int32)
+_EMPTY_WEIGHTS = np.empty(0, dtype=np.float32)
+
+
+def term_frequencies(title, content):
+    """(terms, weights): sorted hashed term ids and their 1 + log(tf) weights."""
+    counts = Counter()
+    for text, weight in ((title, TITLE_WEIGHT), (content, 1)):
+        for token in _TOKEN.findall((text or '').lower()):
+            if token not in STOP_WORDS:
+                counts[zlib.crc32(token.encode('utf-8')) & ((1 << HASH_BITS) - 1)] += weight
+    if not counts:
+        return _EMPTY_TERMS, _EMPTY_WEIGHTS
+    terms = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+    weights = 1.0 + np.log(np.array([counts[term] for term in terms.tolist()], dtype=np.float32))
+    return terms, weights.astype(np.float32)
+
+
+def _vector_fields(note):
+    terms, weights = term_frequencies(note.title, note.content)
+    return {'user_id': note.user_id, 'terms': terms.tobytes(), 'weights': weights.tobytes()}
+
+
+def index_note(note):
+    """Stores (or refreshes) the note's vector."""
+    NoteVector.objects.update_or_create(note_id=note.id, defaults=_vector_fields(note))
+
+
+def index_notes(notes):
+    """index_note for many notes, in two queries (bulk writes send no signals)."""
+    notes = list(notes)
+    if not notes:
+        return
+    NoteVector.objects.filter(note_id__in=[note.id for note in notes]).delete()
+    NoteVector.objects.bulk_create([NoteVector(note_id=note.id, **_vector_fields(note)) for note in notes])
+
+
+class NoteCorpus:
+    """One user's note vectors, and the TF-IDF arrays derived from them."""
+
+    def __init__(self):
+        self.rows = {}  # note_id -> (terms, weights)
+        self.count = 0
+        self.updated_at = None
+        self._matrix = None
+
+    def apply(self, vectors):
+        for note_id, terms, weights in vectors:
+            self.rows[note_id] = (np.frombuffer(terms, dtype=np.int32), np.frombuffer(weights, dtype=np.float32))
+        self._matrix = None
+
+    def retain(self, note_ids):
+        for note_id in set(self.rows) - set(note_ids):
+            del self.rows[note_id]
+        self._matrix = None
+
+    def matrix(self):
+        """
+        note_ids, vocabulary (sorted term ids), column pointers, rows and
+        normalized weights of the TF-IDF matrix in column (term) order, idf.
+        """
+        if self._matrix is not None:
+            return self._matrix
+
+        note_ids = np.fromiter(self.rows, dtype=np.int64, count=len(self.rows))
+        parts = list(self.rows.values())
+        lengths = np.array([len(terms) for terms, _ in parts], dtype=np.int64)
+        terms = np.concatenate([terms for terms, _ in parts]) if parts else _EMPTY_TERMS
+        tf = np.concatenate([weights for _, weights in parts]) if parts else _EMPTY_WEIGHTS
+        rows = np.repeat(np.arange(len(parts), dtype=np.int64), lengths)
+
+        # One sort by term gives the vocabulary, document frequencies and column order
+        order = np.argsort(terms, kind='stable')
+        terms, tf, rows = terms[order], tf[order], rows[order]
+        starts = np.flatnonzero(np.diff(terms)) + 1 if len(terms) else np.empty(0, dtype=np.int64)
+        pointers = np.concatenate(([0], starts, [len(terms)])) if len(terms) else np.zeros(1, dtype=np.int64)
+        vocabulary = terms[pointers[:-1]]
+        document_frequency = np.diff(pointers)
+        idf = (np.log((1.0 + len(parts)) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+
+        weights = tf * np.repeat(idf, document_frequency)
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=len(parts)))
+        weights = (weights / np.where(norms > 0, norms, 1.0)[rows]).astype(np.float32)
+
+        self._matrix = (note_ids, vocabulary, pointers, rows, weights, idf)
+        return self._matrix
+
+    def similar(self, terms, tf, k, exclude=()):
+        """[(similarity, note_id)] for the k notes closest to the query terms, best first."""
+        note_ids, vocabulary, pointers, rows, weights, idf = self.matrix()
+        if not len(note_ids) or not len(terms):
+            return []
+
+        positions = np.searchsorted(vocabulary, terms)
+        positions = np.minimum(positions, len(vocabulary) - 1)
+        known = vocabulary[positions] == terms
+        columns, query = positions[known], tf[known] * idf[positions[known]]
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        query = query / norm
+
+        slices = [slice(pointers[column], pointers[column + 1]) for column in columns.tolist()]
+        hit_rows = np.concatenate([rows[s] for s in slices])
+        hit_weights = np.concatenate([weights[s] * q for s, q in zip(slices, query.tolist())])
+        scores = np.bincount(hit_rows, weights=hit_weights, minlength=len(note_ids))
+        if exclude:
+            scores[np.isin(note_ids, list(exclude))] = 0.0
+
+        candidates = np.flatnonzero(scores > getattr(settings, 'RELATED_NOTES_MIN_SIMILARITY', 0.05))
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.lexsort((-note_ids[candidates], -scores[candidates]))]
+        return [(float(scores[row]), int(note_ids[row])) for row in candidates]
+
+
+class NoteCorpusCache:
+    """Per-process LRU of user corpora, refreshed from NoteVector.updated_at."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.corpora = OrderedDict()  # user_id -> NoteCorpus
+
+    def get(self, user_id):
+        vectors = NoteVector.objects.filter(user_id=user_id)
+        state = vectors.aggregate(count=Count('note_id'), updated_at=Max('updated_at'))
+        with self.lock:
+            corpus = self.corpora.get(user_id) or NoteCorpus()
+            self.corpora[user_id] = corpus
+            self.corpora.move_to_end(user_id)
+            while len(self.corpora) > getattr(settings, 'RELATED_NOTES_MAX_USERS', 64):
+                self.corpora.popitem(last=False)
+
+            if (corpus.count, corpus.updated_at) != (state['count'], state['updated_at']):
+                changed = vectors if corpus.updated_at is None else vectors.filter(updated_at__gte=corpus.updated_at)
+                corpus.apply(changed.values_list('note_id', 'terms', 'weights'))
+                if len(corpus.rows) != state['count']:
+                    # Deleted notes
+                    corpus.retain(vectors.values_list('note_id', flat=True))
+                corpus.count, corpus.updated_at = state['count'], state['updated_at']
+            return corpus
+
+    def clear(self):
+        with self.lock:
+            self.corpora.clear()
+
+
+note_corpora = NoteCorpusCache()
+
+
+def related_notes(note, k=None):
+    """[(similarity, note_id)]: the owner's notes most similar to `note`, best first."""
+    if k is None:
+        k = getattr(settings, 'RELATED_NOTES_LIMIT', 10)
+    terms, tf = term_frequencies(note.title, note.content)
+    return note_corpora.get(note.user_id).similar(terms, tf, k, exclude={note.id})
+
+
+def relevant_notes(user_id, text, k, exclude=()):
+    """[(similarity, note_id)]: the user's notes most similar to free text."""
+    terms, tf = term_frequencies('', text)
+    return note_corpora.get(user_id).similar(terms, tf, k, exclude=exclude)
@@ -4,7 +4,8 @@ from .views import (
     dashboard_view, analytics_view, GroupViewSet, CategoryViewSet,
     OptionViewSet, ContextViewSet, NoteViewSet, GoalViewSet,
     AchievementViewSet, RecommendationViewSet, PresetViewSet,
-    ChatSessionViewSet, ChatMessageViewSet, register_user, change_password
+    ChatSessionViewSet, ChatMessageViewSet, SubTaskViewSet, register_user, change_password,
+    event_stream, n8n_health, sync_changes, metrics, search_view
 )
 
 app_name = 'life_manager'
@@ -18,6 +19,7 @@ router.register(r'presets', PresetViewSet)
 router.register(r'contexts', ContextViewSet)
 router.register(r'notes', NoteViewSet)
 router.register(r'goals', GoalViewSet)
+router.register(r'subtasks', SubTaskViewSet)
 router.register(r'achievements', AchievementViewSet)
 router.register(r'recommendations', RecommendationViewSet)
 router.register(r'chat_sessions', ChatSessionViewSet)
@@ -31,4 +33,9 @@ urlpatterns = [
     # API Routes managed by Router
     path('', include(router.urls)),
     path('change-password/', change_password, name='change_password'),
+    path('events/', event_stream, name='event_stream'),
+    path('health/n8n/', n8n_health, name='n8n_health'),
+    path('sync/', sync_changes, name='sync'),
+    path('metrics/', metrics, name='metrics'),
+    path('search/', search_view, name='search'),
 ]
@@ -0,0 +1,93 @@
+"""
+Per-user, per-resource version counters for conditional API requests.
+
+Every write to an API resource bumps its ResourceVersion row (the owner's,
+or the shared row for system data). A response's ETag is derived from the
+versions of the resources it depends on, so an unchanged resource can be
+answered with 304 after one indexed lookup, before any queryset runs.
+"""
+import hashlib
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    StatusGroup, OptionCategory, StatusOption, ContextPreset, SituationContext,
+    Note, PersonalGoal, GoalPlan, GoalTaskInfo, SubTask, Achievement, AiRecommendation,
+    ChatSession, ChatMessage, ResourceVersion
+)
+
+VERSIONED_RESOURCES = {
+    StatusGroup: 'groups',
+    OptionCategory: 'categories',
+    StatusOption: 'options',
+    ContextPreset: 'presets',
+    SituationContext: 'contexts',
+    Note: 'notes',
+    PersonalGoal: 'goals',
+    # Part of the goal workspace
+    GoalPlan: 'goals',
+    GoalTaskInfo: 'goals',
+    SubTask: 'subtasks',
+    Achievement: 'achievements',
+    AiRecommendation: 'recommendations',
+    ChatSession: 'chat_sessions',
+    ChatMessage: 'chat_messages',
+}
+
+
+def owner_id(instance):
+    """
+    The user whose view of the resource changed, or None for shared rows.
+    Rows whose owner can no longer be resolved (cascade deletes) count as
+    shared, which invalidates more than needed but never serves stale data.
+    """
+    try:
+        if isinstance(instance, (SubTask, GoalPlan, GoalTaskInfo)):
+            return instance.goal.user_id
+        if isinstance(instance, ChatMessage):
+            return instance.session.user_id
+    except ObjectDoesNotExist:
+        return None
+    return getattr(instance, 'user_id', None)
+
+
+def bump_version(resource, user_id=None):
+    now = timezone.now()
+    for _ in range(2):
+        if ResourceVersion.objects.filter(user_id=user_id, resource=resource).update(version=F('version') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                ResourceVersion.objects.create(user_id=user_id, resource=resource, version=1, updated_at=now)
+            return
+        except IntegrityError:
+            # Created concurrently; the update will find it now
+            continue
+
+
+def bump_version_for(model, user_id=None):
+    bump_version(VERSIONED_RESOURCES[model], user_id)
+
+
+def resource_state(user_id, resources):
+    """
+    Returns (token, last_modified) for `resources` as seen by `user_id`
+    (their own rows and the shared ones). token changes whenever any of them
+    is written; last_modified is None until the first write is recorded.
+    """
+    owners = Q(user__isnull=True) | Q(user_id=user_id) if user_id else Q(user__isnull=True)
+    rows = sorted(
+        ResourceVersion.objects.filter(owners, resource__in=resources)
+        .values_list('resource', 'user_id', 'version', 'updated_at'),
+        key=lambda row: (row[0], row[1] or 0)
+    )
+    token = ';'.join(f"{resource}:{owner or 0}:{version}" for resource, owner, version, _ in rows)
+    last_modified = max((row[3] for row in rows), default=None)
+    return token, last_modified
+
+
+def make_etag(*parts):
+    return 'W/"%s"' % hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
@@ -1,29 +1,55 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, urlencode
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.db.models import Count, Sum
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.contrib.auth.models import User
 from django.db.models import Q, Prefetch
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import api_view, action, permission_classes # Import permission_classes
 from rest_framework.permissions import AllowAny # Import AllowAny
+import re
 import requests
 import json
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, AuthenticationFailed, ValidationError
+from rest_framework.authentication import TokenAuthentication
 
 from .models import (
     StatusGroup, StatusOption, ContextPreset, PersonalGoal, 
     Achievement, SituationContext, OptionCategory,
-    AiRecommendation, ChatSession, ChatMessage, Note, Profile
+    AiRecommendation, ChatSession, ChatMessage, Note, Profile, SubTask
+)
+from .services import (
+    get_situation_from_selection, get_smart_defaults, get_all_relevant_goals, AnalyticsService, record_context_usage, record_context_visit,
+    N8nIntegrationService, CircuitOpenError, plan_cache_key, plan_single_flight
 )
-from .services import get_situation_from_selection, get_smart_defaults, get_all_relevant_goals, AnalyticsService, N8nIntegrationService
 from .serializers import (
     StatusGroupSerializer, OptionCategorySerializer, StatusOptionSerializer,
     SituationContextSerializer, NoteSerializer, PersonalGoalSerializer,
     AchievementSerializer, ContextPresetSerializer, AiRecommendationSerializer,
-    ChatSessionSerializer, ChatMessageSerializer, UserRegistrationSerializer
+    ChatSessionSerializer, ChatSessionListSerializer, ChatMessageSerializer, UserRegistrationSerializer,
+    SubTaskSerializer, GoalWorkspaceSerializer
 )
 from rest_framework.authtoken.models import Token # Import Token
+from .fast_serializers import FastStatusOptionSerializer, FastPersonalGoalSerializer, FastSituationContextSerializer
+from .events import StreamCursor, stream_events
+from .sync import build_changes, decode_token
+from .middleware import route_stats
+from .archive import archived_message, archived_messages
+from .quick_switch import quick_switch
+from .related import related_content
+from .routers import chat_db
+from .search import SEARCH_SOURCE_NAMES, search
+from .tfidf import index_notes, related_notes
+from .versions import bump_version_for, make_etag, resource_state
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -59,7 +85,7 @@ def dashboard_view(request):
     else:
         # B. Handle Manual Selection + Defaults
         # Get manually selected options
-        manual_ids = [int(x) for x in request.GET.getlist('options') if x.isdigit()]
+        manual_ids = [int(x) for x in request.GET.getlist('options') if _is_id(x)]
         
         # Get defaults (only if not full manual override intended - logic depends on UX)
         # Here we mix them: Defaults apply unless specifically overridden or if empty.
@@ -76,11 +102,18 @@ def dashboard_view(request):
 
     # C. Get Context
     context, created = get_situation_from_selection(selected_ids)
+    if context and request.user.is_authenticated:
+        record_context_visit(request.user.id, context.id)
     
     # D. Get Notes & Goals
     notes = context.notes.all() if context else []
     goals = get_all_relevant_goals(context)
     recommendations = context.recommendations.filter(priority__gte=1).order_by('-priority', '-created_at') if context else []
+
+    # E. Notes & Recommendations from the user's most similar contexts
+    _, related_notes, related_recommendations = related_content(
+        request.user, selected_ids, exclude=context.id if context else None
+    )
     
     
     # Filter groups/options for dashboard: System Defaults + User's Own
@@ -102,6 +135,17 @@ def dashboard_view(request):
     
     presets = ContextPreset.objects.all()
 
+    # Recently used contexts, next to the presets
+    recent_contexts = []
+    if request.user.is_authenticated:
+        for entry in quick_switch(request.user.id)['recent']:
+            if context and entry['id'] == context.id:
+                continue
+            recent_contexts.append({
+                'query': urlencode([('options', option_id) for option_id in entry['options']]),
+                'options': entry['options_details'],
+            })
+
     # F. Get/Resolve selected options objects for display
     # Order by Group Name to support {% regroup %} in template
     selected_options = StatusOption.objects.filter(id__in=selected_ids).select_related('group').order_by('group__name', 'category__name', 'name')
@@ -113,8 +157,11 @@ def dashboard_view(request):
         'notes': notes,
         'goals': goals,
         'recommendations': recommendations,
+        'related_notes': related_notes,
+        'related_recommendations': related_recommendations,
         'groups': groups,
         'presets': presets,
+        'recent_contexts': recent_contexts[:getattr(settings, 'DASHBOARD_RECENT_CONTEXTS', 6)],
     }
     return render(request, 'life_manager/dashboard.html', context_data)
 
@@ -144,25 +191,168 @@ def analytics_view(request):
 # --- API ViewSets ---
 
 
-class ChatSessionViewSet(viewsets.ModelViewSet):
+class ConditionalRequestMixin:
+    """
+    Conditional GETs for list/retrieve: responses carry a weak ETag built from
+    the ResourceVersion counters of `etag_resources` (plus the user and the
+    full URL, so ?fields=, cursors etc. get their own tags) and Last-Modified.
+    A matching If-None-Match (or, without one, If-Modified-Since) is answered
+    with 304 after one lookup on the version table, before the queryset is
+    built, evaluated or serialized.
+    """
+    etag_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def use_conditional(self, request):
+        return True
+
+    def get_etag_resources(self):
+        return self.etag_resources
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        if not self.use_conditional(request):
+            return handler(request, *args, **kwargs)
+        token, last_modified = resource_state(request.user.id, self.get_etag_resources())
+        etag = make_etag(request.user.id, request.get_full_path(), token)
+        headers = {'ETag': etag}
+        if last_modified:
+            headers['Last-Modified'] = http_date(last_modified.timestamp())
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = parse_etags(if_none_match)
+            # Weak comparison (RFC 9110 13.1.2)
+            not_modified = '*' in tags or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
+        else:
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+            not_modified = bool(since and last_modified and int(last_modified.timestamp()) <= since)
+
+        response = Response(status=304, headers=headers) if not_modified else handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            for header, value in headers.items():
+                response[header] = value
+            # Clients must revalidate, and tags differ per user
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+class SparseFieldsetViewMixin:
+    """
+    Companion of SparseFieldsetMixin (serializers.py): on list/retrieve, the
+    columns behind fields the response won't render (?fields=, ?expand=) are
+    deferred, so e.g. ?fields=id,title on notes never reads note contents.
+    Views pick their prefetches with wants_field().
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def response_fields(self):
+        """Field names the serializer will render for this request."""
+        if not hasattr(self, '_response_fields'):
+            self._response_fields = list(self.get_serializer().fields)
+        return self._response_fields
+
+    def is_sparse_read(self):
+        return self.action in self.sparse_actions and self.request.method in permissions.SAFE_METHODS
+
+    def wants_field(self, name):
+        return not self.is_sparse_read() or name in self.response_fields()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.is_sparse_read():
+            return queryset
+        deferred = self.deferrable_columns(queryset.model)
+        return queryset.defer(*deferred) if deferred else queryset
+
+    def deferrable_columns(self, model):
+        needed = {name.lstrip('-') for name in getattr(self, 'keyset_ordering', ())}
+        serializer = self.get_serializer()
+        for name in self.response_fields():
+            source = serializer.fields[name].source.split('.')[0]
+            display = re.fullmatch(r'get_(\w+)_display', source)
+            if display:
+                source = display.group(1)
+            try:
+                needed.add(model._meta.get_field(source).name)
+            except FieldDoesNotExist:
+                # A computed attribute ('*', properties): can't tell which columns it reads
+                return []
+        return [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and not field.is_relation and field.name not in needed
+        ]
+
+class ChatSessionViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API for managing chat sessions.
     """
     queryset = ChatSession.objects.all()
     serializer_class = ChatSessionSerializer
+    keyset_ordering = ('-created_at', '-id')
+    etag_resources = ('chat_sessions', 'chat_messages')
 
     def get_queryset(self):
-        return ChatSession.objects.filter(user=self.request.user).prefetch_related('messages')
+        queryset = ChatSession.objects.filter(user=self.request.user)
+        if self.action == 'retrieve' and self.wants_field('messages'):
+            # Archived sessions have no messages to prefetch, their transcript comes with the join
+            return queryset.select_related('archive').prefetch_related('messages')
+        return queryset
+
+    def get_serializer_class(self):
+        # Only a single-session retrieve nests its messages
+        if self.action == 'retrieve':
+            return ChatSessionSerializer
+        return ChatSessionListSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Messages of one session, oldest first.
+        ?after=<message id> returns only newer messages (incremental fetch);
+        without it, the newest ?limit= messages (default 50, max 200).
+        """
+        session = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+        except ValueError:
+            limit = 50
+
+        after = request.query_params.get('after')
+        archived = archived_messages(session.id)
+        if archived is not None:
+            # Same pages, cut from the decompressed transcript
+            if after and _is_id(after):
+                page = [message for message in archived if message.id > int(after)][:limit]
+            else:
+                page = archived[-limit:]
+            return Response(ChatMessageSerializer(page, many=True).data)
+
+        messages = ChatMessage.objects.filter(session_id=session.id)
+        if after and _is_id(after):
+            page = list(messages.filter(id__gt=int(after)).order_by('id')[:limit])
+        else:
+            page = list(messages.order_by('-id')[:limit])[::-1]
+
+        return Response(ChatMessageSerializer(page, many=True).data)
+
+class ChatMessageViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API for managing chat messages.
+    The list only has messages of unarchived sessions (see archive.py);
+    read archived ones through /chat_sessions/<id>/messages/ or one by one.
     """
     queryset = ChatMessage.objects.none()
     serializer_class = ChatMessageSerializer
+    keyset_ordering = ('-timestamp', '-id')
+    etag_resources = ('chat_messages',)
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -171,6 +361,21 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
              return ChatMessage.objects.all()
         return ChatMessage.objects.filter(session__user=user)
 
+    def use_conditional(self, request):
+        # Staff see every user's messages, which the per-user versions don't cover
+        return not request.user.is_staff
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Messages of archived sessions can still be read one by one
+            pk = str(self.kwargs.get(self.lookup_field, ''))
+            message = archived_message(self.request.user, int(pk)) if self.action == 'retrieve' and _is_id(pk) else None
+            if message is None:
+                raise
+            return message
+
     def perform_create(self, serializer):
         # 0. Check session ownership
         initial_data = serializer.validated_data
@@ -197,6 +402,10 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 
         serializer.save()
 
+def _is_id(value):
+    # str.isdigit() also accepts digits int() can't parse ('²')
+    return value.isascii() and value.isdigit()
+
 def _create_related_chat_session(instance, user, initial_message):
     """
     Helper: Creates a ChatSession and Initial Message for an instance.
@@ -218,9 +427,201 @@ def _create_related_chat_session(instance, user, initial_message):
         instance.chat_session = session
         instance.save()
 
-class GroupViewSet(viewsets.ModelViewSet):
+def _create_related_chat_sessions(instances, user, message_for):
+    """
+    Batch version of _create_related_chat_session for bulk endpoints:
+    one insert for the sessions, one for the system messages and one update
+    linking them, instead of three queries (and signals) per instance.
+    `message_for(instance)` returns the initial system message.
+    """
+    if not user or not instances:
+        return
+    now = timezone.now()
+    messages = [message_for(instance) for instance in instances]
+    # bulk_create skips the ChatMessage signals, so fill in the stats they would have set
+    sessions = ChatSession.objects.bulk_create([
+        ChatSession(
+            user=user,
+            title=f"Chat: {getattr(instance, 'title', 'New Item')}",
+            message_count=1,
+            last_message_preview=message[:200],
+            last_message_at=now,
+        )
+        for instance, message in zip(instances, messages)
+    ])
+    ChatMessage.objects.bulk_create([
+        ChatMessage(session=session, role="system", content=message)
+        for session, message in zip(sessions, messages)
+    ])
+    for instance, session in zip(instances, sessions):
+        instance.chat_session = session
+    type(instances[0]).objects.bulk_update(instances, ['chat_session'])
+    bump_version_for(ChatSession, user.id)
+    bump_version_for(ChatMessage, user.id)
+
+def _trigger_contexts_on_commit(context_ids):
+    """
+    Send each distinct context to n8n once, after the batch commits.
+    """
+    for context_id in sorted({cid for cid in context_ids if cid}):
+        transaction.on_commit(lambda cid=context_id: N8nIntegrationService.trigger_context_processing(cid))
+
+def _record_context_usages(user, context_ids):
+    for context_id in {cid for cid in context_ids if cid}:
+        record_context_usage(user.id, context_id)
+
+class BulkWriteMixin:
+    """
+    Adds POST/PATCH <resource>/bulk/ taking a JSON list of rows.
+    POST creates them, PATCH partially updates them (each row needs its "id").
+    All rows are validated before anything is written; the writes are one
+    bulk_create/bulk_update in one transaction and the per-row side effects
+    (chat sessions, n8n triggers) run once per batch. Any invalid row rejects
+    the whole batch with the errors listed per row.
+    """
+    bulk_max_items = getattr(settings, 'BULK_MAX_ITEMS', 500)
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of objects.'}, status=400)
+        if len(items) > self.bulk_max_items:
+            return Response({'error': f"At most {self.bulk_max_items} objects per request."}, status=400)
+        if not all(isinstance(item, dict) for item in items):
+            return Response({'error': 'Expected a non-empty list of objects.'}, status=400)
+
+        if request.method == 'POST':
+            return self._bulk_create(items)
+        return self._bulk_update(items)
+
+    def _bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=400)
+
+        # Chat sessions created for the new rows (possibly in the chat database) commit with them
+        with transaction.atomic(), transaction.atomic(using=chat_db()):
+            model = self.get_queryset().model
+            instances = model.objects.bulk_create(self.bulk_build(serializer.validated_data))
+            # bulk writes send no signals
+            bump_version_for(model, self.request.user.id)
+            self.after_bulk_create(instances)
+        return Response(self.get_serializer(instances, many=True).data, status=201)
+
+    def _bulk_update(self, items):
+        ids = [item.get('id') for item in items]
+        if not all(isinstance(pk, int) for pk in ids) or len(set(ids)) != len(ids):
+            return Response({'error': 'Every object needs a unique integer "id".'}, status=400)
+
+        instances = self.get_bulk_update_queryset().in_bulk(ids)
+        missing = [pk for pk in ids if pk not in instances]
+        if missing:
+            return Response({'error': 'Not found.', 'ids': missing}, status=404)
+
+        errors = []
+        validated = []
+        for item in items:
+            instance = instances[item['id']]
+            serializer = self.get_serializer(instance, data=item, partial=True)
+            if serializer.is_valid():
+                validated.append((instance, serializer.validated_data))
+            else:
+                errors.append({'id': instance.pk, 'errors': serializer.errors})
+        if errors:
+            return Response({'errors': errors}, status=400)
+
+        model = self.get_queryset().model
+        previous = {instance.pk: model(**{f.attname: getattr(instance, f.attname) for f in model._meta.concrete_fields})
+                    for instance, _ in validated}
+        changed = set()
+        for instance, data in validated:
+            changed |= self.bulk_apply(instance, data)
+
+        updated = [instances[pk] for pk in ids]
+        with transaction.atomic(), transaction.atomic(using=chat_db()):
+            if changed:
+                # bulk_update doesn't run auto_now, and sync relies on updated_at
+                if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+                    now = timezone.now()
+                    for instance in updated:
+                        instance.updated_at = now
+                    changed.add('updated_at')
+                model.objects.bulk_update(updated, sorted(changed))
+                bump_version_for(model, self.request.user.id)
+            self.after_bulk_update(updated, previous)
+        return Response(self.get_serializer(updated, many=True).data)
+
+    # --- Hooks ---
+
+    def get_bulk_update_queryset(self):
+        return self.get_queryset()
+
+    def bulk_build(self, validated_items):
+        """Unsaved model instances for the validated rows."""
+        model = self.get_queryset().model
+        return [model(**{**data, 'user': self.request.user}) for data in validated_items]
+
+    def bulk_apply(self, instance, data):
+        """Applies one validated row to its instance; returns the changed field names."""
+        for field, value in data.items():
+            setattr(instance, field, value)
+        return set(data)
+
+    def after_bulk_create(self, instances):
+        pass
+
+    def after_bulk_update(self, instances, previous):
+        """`previous` maps pk -> a copy of the row as it was before the update."""
+        pass
+
+class FastReadMixin(SparseFieldsetViewMixin):
+    """
+    Opt-in fast path for read-only list/retrieve: with ?fast=1 (or
+    FAST_READ_SERIALIZATION = True; ?fast=0 opts back out) rows are read with
+    .values() and rendered by `fast_serializer_class` (see fast_serializers.py)
+    instead of the ModelSerializer. The JSON is identical either way,
+    ?fields=/?expand= included.
+    """
+    fast_serializer_class = None
+
+    def use_fast_read(self):
+        flag = self.request.query_params.get('fast')
+        if flag is not None:
+            return flag in ('1', 'true')
+        return getattr(settings, 'FAST_READ_SERIALIZATION', False)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().list(request, *args, **kwargs)
+        fast = self.fast_serializer_class(fields=self.response_fields())
+        rows = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+        return Response(fast.to_representation(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().retrieve(request, *args, **kwargs)
+        fast = self.fast_serializer_class(fields=self.response_fields())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            rows = fast.values(self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ))
+            data = fast.to_representation(rows[:1])
+        except (TypeError, ValueError):
+            raise Http404
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+class GroupViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = StatusGroup.objects.none()
     serializer_class = StatusGroupSerializer
+    keyset_ordering = ('id',)
+    etag_resources = ('groups',)
 
     def get_queryset(self):
         # Hybrid Access: Public (System) + Private (User)
@@ -232,9 +633,11 @@ class GroupViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = OptionCategory.objects.none()
     serializer_class = OptionCategorySerializer
+    keyset_ordering = ('id',)
+    etag_resources = ('categories', 'groups')
 
     def get_queryset(self):
         user = self.request.user
@@ -245,29 +648,155 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class OptionViewSet(viewsets.ModelViewSet):
+class OptionViewSet(ConditionalRequestMixin, FastReadMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """
     API for listing and retrieving StatusOptions.
     """
     queryset = StatusOption.objects.none()
     serializer_class = StatusOptionSerializer
+    fast_serializer_class = FastStatusOptionSerializer
+    keyset_ordering = ('id',)
+    etag_resources = ('options', 'groups')
 
     def get_queryset(self):
         user = self.request.user
+        queryset = StatusOption.objects.all()
+        if self.wants_field('group_name'):
+            queryset = queryset.select_related('group')
         if user.is_authenticated:
-            return StatusOption.objects.select_related('group', 'category').filter(Q(user=user) | Q(user__isnull=True))
-        return StatusOption.objects.select_related('group', 'category').filter(user__isnull=True)
+            return queryset.filter(Q(user=user) | Q(user__isnull=True))
+        return queryset.filter(user__isnull=True)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class ContextViewSet(viewsets.ModelViewSet):
-    queryset = SituationContext.objects.prefetch_related('options').all()
+    def get_bulk_update_queryset(self):
+        # System options are readable by everyone but only editable one by one (admin)
+        return StatusOption.objects.select_related('group', 'category').filter(user=self.request.user)
+
+    def _resolve_categories(self, rows):
+        """
+        Replaces category_name with a category for every row that names one
+        without passing a category id, like StatusOptionSerializer.create but
+        with one lookup (and one insert for the missing ones) for the batch.
+        rows: [(group, data)]
+        """
+        wanted = {(group.id, data['category_name']) for group, data in rows
+                  if data.get('category_name') and not data.get('category')}
+        categories = {}
+        if wanted:
+            existing = OptionCategory.objects.filter(
+                group_id__in={g for g, _ in wanted}, name__in={n for _, n in wanted}
+            ).order_by('id')
+            for category in existing:
+                categories.setdefault((category.group_id, category.name), category)
+            missing = [OptionCategory(group_id=g, name=n) for g, n in sorted(wanted) if (g, n) not in categories]
+            for category in OptionCategory.objects.bulk_create(missing):
+                categories[(category.group_id, category.name)] = category
+            if missing:
+                bump_version_for(OptionCategory)
+
+        for group, data in rows:
+            category_name = data.pop('category_name', None)
+            if category_name and not data.get('category'):
+                data['category'] = categories[(group.id, category_name)]
+
+    def bulk_build(self, validated_items):
+        self._resolve_categories([(data['group'], data) for data in validated_items])
+        return super().bulk_build(validated_items)
+
+    def bulk_apply(self, instance, data):
+        self._resolve_categories([(data.get('group', instance.group), data)])
+        return super().bulk_apply(instance, data)
+
+class ContextViewSet(ConditionalRequestMixin, FastReadMixin, viewsets.ModelViewSet):
+    """
+    The contexts the user has used (ContextUsage).
+    ?options_all=1,2,3 keeps contexts containing all of these options,
+    ?options_any=1,2,3 those containing at least one.
+    """
+    queryset = SituationContext.objects.none()
     serializer_class = SituationContextSerializer
+    fast_serializer_class = FastSituationContextSerializer
+    keyset_ordering = ('-created_at', '-id')
+    etag_resources = ('contexts', 'options', 'groups')
+
+    def get_queryset(self):
+        queryset = SituationContext.objects.filter(usages__user=self.request.user)
+
+        # Both filters read the option -> context index on the through table
+        membership = SituationContext.options.through.objects
+        options_all = self._option_ids('options_all')
+        if options_all:
+            queryset = queryset.filter(id__in=membership.filter(statusoption_id__in=options_all)
+                                       .values('situationcontext_id')
+                                       .annotate(matched=Count('statusoption_id'))
+                                       .filter(matched=len(options_all))
+                                       .values('situationcontext_id'))
+        options_any = self._option_ids('options_any')
+        if options_any:
+            queryset = queryset.filter(id__in=membership.filter(statusoption_id__in=options_any)
+                                       .values('situationcontext_id'))
+
+        if self.wants_field('options_details'):
+            # ?expand=options_details renders each option's group name
+            return queryset.prefetch_related(Prefetch('options', queryset=StatusOption.objects.select_related('group')))
+        if self.wants_field('options'):
+            return queryset.prefetch_related('options')
+        return queryset
+
+    def _option_ids(self, param):
+        # A filter whose ids were all dropped would silently match everything
+        values = [value.strip() for value in self.request.query_params.get(param, '').split(',') if value.strip()]
+        if not all(_is_id(value) for value in values):
+            raise ValidationError({param: "Expected a comma-separated list of option ids."})
+        return sorted({int(value) for value in values})
+
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        record_context_usage(self.request.user.id, instance.id)
+
+    @action(detail=False, methods=['get'])
+    def quick_switch(self, request):
+        """
+        The user's most recently used and most visited contexts, with their
+        options and usage statistics: {"recent": [...], "frequent": [...]}.
+        ?limit= entries each (default and max CONTEXT_QUICK_SWITCH_LIMIT).
+        Served from a per-process cache (see quick_switch.py).
+        """
+        max_limit = getattr(settings, 'CONTEXT_QUICK_SWITCH_LIMIT', 10)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', max_limit)), max_limit))
+        except ValueError:
+            limit = max_limit
+        return Response(quick_switch(request.user.id, limit))
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        The user's contexts most similar to this one (Jaccard over options),
+        and their notes and recommendations, most similar context first.
+        """
+        context = self.get_object()
+        option_ids = list(SituationContext.options.through.objects.filter(
+            situationcontext_id=context.id
+        ).values_list('statusoption_id', flat=True))
+        similar, notes, recommendations = related_content(request.user, option_ids, exclude=context.id)
+        return Response({
+            'contexts': [{'id': context_id, 'similarity': round(score, 4)} for score, context_id in similar],
+            'notes': [
+                {**NoteSerializer(note).data, 'similarity': round(note.similarity, 4)} for note in notes
+            ],
+            'recommendations': [
+                {**AiRecommendationSerializer(rec).data, 'similarity': round(rec.similarity, 4)} for rec in recommendations
+            ],
+        })
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, BulkWriteMixin, viewsets.ModelViewSet):
     queryset = Note.objects.none()
     serializer_class = NoteSerializer
+    keyset_ordering = ('-created_at', '-id')
+    etag_resources = ('notes',)
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
@@ -282,15 +811,88 @@ class NoteViewSet(viewsets.ModelViewSet):
             f"I am ready to discuss your note: '{instance.title}'."
         )
 
-class GoalViewSet(viewsets.ModelViewSet):
+    def after_bulk_create(self, instances):
+        _create_related_chat_sessions(
+            instances,
+            self.request.user,
+            lambda instance: f"I am ready to discuss your note: '{instance.title}'."
+        )
+        _trigger_contexts_on_commit(instance.context_id for instance in instances)
+        _record_context_usages(self.request.user, [instance.context_id for instance in instances])
+        index_notes(instances)
+
+    def after_bulk_update(self, instances, previous):
+        _trigger_contexts_on_commit(instance.context_id for instance in instances)
+        index_notes(instances)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        The user's notes most similar to this one (TF-IDF cosine), best first.
+        ?limit= caps the count (default RELATED_NOTES_LIMIT).
+        """
+        note = self.get_object()
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), 100) if _is_id(limit) else None
+        similar = related_notes(note, k=limit)
+        by_id = Note.objects.filter(user=request.user).in_bulk([note_id for _, note_id in similar])
+        return Response([
+            {**self.get_serializer(by_id[note_id]).data, 'similarity': round(score, 4)}
+            for score, note_id in similar if note_id in by_id
+        ])
+
+class GoalViewSet(ConditionalRequestMixin, FastReadMixin, BulkWriteMixin, viewsets.ModelViewSet):
     queryset = PersonalGoal.objects.none()
     serializer_class = PersonalGoalSerializer
+    fast_serializer_class = FastPersonalGoalSerializer
+    keyset_ordering = ('-importance', '-created_at', '-id')
+    etag_resources = ('goals',)
     
+    workspace_actions = ('workspace', 'workspaces')
+
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return PersonalGoal.objects.filter(user=self.request.user)
+            queryset = PersonalGoal.objects.filter(user=self.request.user)
+            if self.action in self.workspace_actions:
+                # One query for the goal with plan and task info, one for all sub-tasks and one
+                # for the chat sessions (prefetched: they may be in the chat database)
+                queryset = queryset.select_related('plan', 'tasks_info').prefetch_related(
+                    Prefetch('sub_tasks', queryset=SubTask.objects.order_by('created_at', 'id')),
+                    'chat_session',
+                )
+            return queryset
         return PersonalGoal.objects.none()
 
+    def get_serializer_class(self):
+        if self.action in self.workspace_actions:
+            return GoalWorkspaceSerializer
+        return PersonalGoalSerializer
+
+    def get_etag_resources(self):
+        if self.action in self.workspace_actions:
+            return ('goals', 'subtasks', 'chat_sessions', 'chat_messages')
+        return self.etag_resources
+
+    @action(detail=True, methods=['get'])
+    def workspace(self, request, pk=None):
+        """
+        The goal with its plan, task info, sub-tasks and chat metadata.
+        Edit sub-tasks in batches with PATCH /subtasks/bulk/.
+        """
+        return self.conditional_response(
+            request, lambda request: Response(self.get_serializer(self.get_object()).data)
+        )
+
+    @action(detail=False, methods=['get'])
+    def workspaces(self, request):
+        """
+        Paginated workspaces of all the user's goals, in the same fixed number of queries.
+        """
+        def handler(request):
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return self.conditional_response(request, handler)
+
     def perform_create(self, serializer):
         instance = serializer.save(user=self.request.user)
         _create_related_chat_session(
@@ -299,9 +901,71 @@ class GoalViewSet(viewsets.ModelViewSet):
             f"Let's work on your goal: '{instance.title}'. How can I help you achieve it?"
         )
 
-class AchievementViewSet(viewsets.ModelViewSet):
+    def after_bulk_create(self, instances):
+        _create_related_chat_sessions(
+            instances,
+            self.request.user,
+            lambda instance: f"Let's work on your goal: '{instance.title}'. How can I help you achieve it?"
+        )
+        self._create_achievements([instance for instance in instances if instance.is_completed])
+        _trigger_contexts_on_commit(instance.context_id for instance in instances)
+        _record_context_usages(self.request.user, [instance.context_id for instance in instances])
+
+    def after_bulk_update(self, instances, previous):
+        self._create_achievements([
+            instance for instance in instances
+            if instance.is_completed and not previous[instance.pk].is_completed
+        ])
+        _trigger_contexts_on_commit(
+            [instance.context_id for instance in instances] + [row.context_id for row in previous.values()]
+        )
+
+    def _create_achievements(self, goals):
+        """
+        What trigger_n8n_on_goal_save does for single saves, once for the batch.
+        """
+        if not goals:
+            return
+        already = set(Achievement.objects.filter(goal__in=goals).values_list('goal_id', flat=True))
+        bump_version_for(Achievement, self.request.user.id)
+        Achievement.objects.bulk_create([
+            Achievement(
+                goal=goal,
+                user=goal.user,
+                title=f"Achieved: {goal.title}",
+                reflection="Completed via API",
+                context_id=goal.context_id,
+                points=AnalyticsService.calculate_points(goal.importance)
+            )
+            for goal in goals if goal.pk not in already
+        ])
+
+class SubTaskViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, BulkWriteMixin, viewsets.ModelViewSet):
+    """
+    API for the sub-tasks of the user's goals.
+    """
+    queryset = SubTask.objects.none()
+    serializer_class = SubTaskSerializer
+    keyset_ordering = ('created_at', 'id')
+    etag_resources = ('subtasks',)
+
+    def get_queryset(self):
+        if self.request.user.is_authenticated:
+            queryset = SubTask.objects.filter(goal__user=self.request.user)
+            goal_id = self.request.query_params.get('goal')
+            if goal_id and _is_id(goal_id):
+                queryset = queryset.filter(goal_id=int(goal_id))
+            return queryset
+        return SubTask.objects.none()
+
+    def bulk_build(self, validated_items):
+        return [SubTask(**data) for data in validated_items]
+
+class AchievementViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Achievement.objects.none()
     serializer_class = AchievementSerializer
+    keyset_ordering = ('-date_achieved', '-id')
+    etag_resources = ('achievements',)
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
@@ -312,9 +976,11 @@ class AchievementViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
     serializer_class = AchievementSerializer
 
-class RecommendationViewSet(viewsets.ModelViewSet):
+class RecommendationViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = AiRecommendation.objects.none()
     serializer_class = AiRecommendationSerializer
+    keyset_ordering = ('-created_at', '-id')
+    etag_resources = ('recommendations',)
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
@@ -331,6 +997,17 @@ class RecommendationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def generate_plan(self, request):
+        """
+        Asks n8n for a plan and stores it as an AiRecommendation.
+        Results are cached per user under a hash of the normalized payload
+        (context, goals, notes) for PLAN_CACHE_TTL seconds, and identical
+        requests in flight at the same time share one upstream call.
+        Pass ?refresh=1 to bypass the cache.
+        Both are per process: the cache is the default (local memory) cache
+        and requests are coalesced with an in-process lock, so each worker
+        may call n8n once for the same payload. A request that gives up
+        waiting for the call in flight gets 503 with Retry-After.
+        """
         n8n_url = N8nIntegrationService.N8N_WEBHOOK_URL
         try:
             # Prepare payload
@@ -339,30 +1016,8 @@ class RecommendationViewSet(viewsets.ModelViewSet):
             # Compatibility Mapping: Frontend sends 'goals', but N8N Context Workflow expects 'active_goals'
             if 'goals' in payload and 'active_goals' not in payload:
                 payload['active_goals'] = payload['goals']
-            
-            # Forward to N8N
-            # We strictly pass what we received (plus mapping). 
-            # If the user says "all notes and goals... are already present in the context", 
-            # we trust the frontend sends a rich payload or at least the context reference.
-            
-            # USE RETRY SERVICE
-            response = N8nIntegrationService.post_with_retry(n8n_url, payload, "Generate Plan", timeout=120)
-            # response.raise_for_status() # Handled inside post_with_retry
 
-            
-            n8n_data = response.json()
-            
-            # Extract recommendation details
-            # Assuming N8N returns { "title": "...", "summary": "...", "recommendation": "..." }
-            # Provide defaults if keys missing
-            title = n8n_data.get('title', 'AI Plan')
-            summary = n8n_data.get('summary', 'Generated Plan')
-            recommendation_text = n8n_data.get('recommendation', '')
-            if not recommendation_text:
-                # Fallback: if 'output' or just raw json
-                recommendation_text = n8n_data.get('output', json.dumps(n8n_data, indent=2))
-            
-            # Resolve Context
+            # Resolve Context first, so a request without one never costs an LLM run
             # request.data might have 'context_id' or 'context': {'id': ...}
             context_id = payload.get('context_id')
             if not context_id and isinstance(payload.get('context'), dict):
@@ -380,47 +1035,93 @@ class RecommendationViewSet(viewsets.ModelViewSet):
                     context_id = goals[0].get('context')
 
             # Lookup by Signature (Frontend seems to send 'signature')
+            situation_context = None
             if not context_id:
                 signature = payload.get('signature')
                 if signature:
-                    try:
-                        situation_context = SituationContext.objects.get(unique_signature=signature)
+                    situation_context = SituationContext.objects.filter(unique_signature=signature).first()
+                    if situation_context:
                         context_id = situation_context.id
-                    except SituationContext.DoesNotExist:
-                        pass
 
             # Use the first context if absolutely nothing is provided but context objects exist?
             # No, that's dangerous. Fail if no context.
             if not context_id: 
                  return Response({"error": "Context ID is required. Please include 'context_id', 'signature', OR ensure notes/goals objects have 'context' field."}, status=400)
 
-            if 'situation_context' not in locals():
+            if situation_context is None:
                 situation_context = get_object_or_404(SituationContext, pk=context_id)
 
-            # Create Recommendation
-            rec = AiRecommendation.objects.create(
-                context=situation_context,
-                user=request.user,
-                title=title,
-                summary=summary,
-                recommendation=recommendation_text,
-                priority=2 # Medium default
-            )
+            cache_key = plan_cache_key(request.user.id, payload)
+            if request.query_params.get('refresh') != '1':
+                rec_id = cache.get(cache_key)
+                rec = AiRecommendation.objects.filter(id=rec_id, user=request.user).first() if rec_id else None
+                if rec:
+                    return Response(self.get_serializer(rec).data)
+
+            def _generate():
+                # Forward to N8N
+                # We strictly pass what we received (plus mapping). 
+                # If the user says "all notes and goals... are already present in the context", 
+                # we trust the frontend sends a rich payload or at least the context reference.
+                
+                # USE RETRY SERVICE
+                response = N8nIntegrationService.post_with_retry(n8n_url, payload, "Generate Plan", timeout=120)
+                # response.raise_for_status() # Handled inside post_with_retry
+
+                n8n_data = response.json()
+                
+                # Extract recommendation details
+                # Assuming N8N returns { "title": "...", "summary": "...", "recommendation": "..." }
+                # Provide defaults if keys missing
+                title = n8n_data.get('title', 'AI Plan')
+                summary = n8n_data.get('summary', 'Generated Plan')
+                recommendation_text = n8n_data.get('recommendation', '')
+                if not recommendation_text:
+                    # Fallback: if 'output' or just raw json
+                    recommendation_text = n8n_data.get('output', json.dumps(n8n_data, indent=2))
+
+                # Create Recommendation
+                rec = AiRecommendation.objects.create(
+                    context=situation_context,
+                    user=request.user,
+                    title=title,
+                    summary=summary,
+                    recommendation=recommendation_text,
+                    priority=2 # Medium default
+                )
+                cache.set(cache_key, rec.id, getattr(settings, 'PLAN_CACHE_TTL', 600))
+                return rec.id
+
+            # Double taps / client retries wait for the run already in flight
+            rec_id = plan_single_flight.do(cache_key, _generate, timeout=getattr(settings, 'PLAN_SINGLE_FLIGHT_TIMEOUT', 150))
+            rec = AiRecommendation.objects.get(id=rec_id)
             
             serializer = self.get_serializer(rec)
             return Response(serializer.data)
             
+        except CircuitOpenError as e:
+            retry_after = N8nIntegrationService.breaker.retry_after()
+            return Response({"error": f"N8N Unavailable: {str(e)}"}, status=503, headers={"Retry-After": str(retry_after)})
         except requests.exceptions.RequestException as e:
             return Response({"error": f"N8N Error: {str(e)}"}, status=502)
+        except TimeoutError:
+            # Waited PLAN_SINGLE_FLIGHT_TIMEOUT for the identical request in flight;
+            # its plan will be cached once it lands
+            return Response({"error": "A plan for this request is still being generated. Retry shortly."},
+                            status=503, headers={"Retry-After": str(getattr(settings, 'PLAN_RETRY_AFTER_SECONDS', 5))})
+        except Http404:
+            raise
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
-class PresetViewSet(viewsets.ModelViewSet):
+class PresetViewSet(ConditionalRequestMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API for creating and listing ContextPresets.
     """
     queryset = ContextPreset.objects.none()
     serializer_class = ContextPresetSerializer
+    keyset_ordering = ('id',)
+    etag_resources = ('presets',)
 
     def get_queryset(self):
         user = self.request.user
@@ -452,3 +1153,113 @@ def change_password(request):
     user.save()
     
     return Response({'message': 'Password changed successfully.'}, status=200)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def n8n_health(request):
+    """
+    Circuit breaker state of the n8n integration.
+    503 while the circuit is open so load balancers/monitors can alert on it.
+    Only staff see the full snapshot (last error, thresholds); anyone else
+    gets the state, the failure count and when the next probe is due.
+    """
+    breaker = N8nIntegrationService.breaker
+    snapshot = breaker.snapshot()
+    status = 503 if snapshot['state'] == 'open' else 200
+    if request.user and request.user.is_staff:
+        return Response(snapshot, status=status)
+    return Response({
+        "state": snapshot['state'],
+        "consecutive_failures": snapshot['consecutive_failures'],
+        "retry_after": breaker.retry_after(),
+    }, status=status)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """
+    Per-route request/SQL stats of this worker in Prometheus text format
+    (see QueryInstrumentationMiddleware).
+    """
+    return HttpResponse(route_stats.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+def search_view(request):
+    """
+    Full-text search over the user's notes, goals, recommendations and chat.
+    ?q= text (every word must match, the last one as a prefix)
+    ?types=notes,goals,recommendations,chat (default all)
+    ?context= / ?option= restrict hits to a context / contexts with that option
+    ?limit= up to 50 (default 20)
+    """
+    types = [name for name in request.query_params.get('types', '').split(',') if name]
+    unknown = [name for name in types if name not in SEARCH_SOURCE_NAMES]
+    if unknown:
+        return Response({'error': f"Unknown types: {', '.join(unknown)}"}, status=400)
+
+    filters = {}
+    for param in ('context', 'option'):
+        value = request.query_params.get(param)
+        if value is not None:
+            if not _is_id(value):
+                return Response({'error': f"'{param}' must be an id."}, status=400)
+            filters[f"{param}_id"] = int(value)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+    except ValueError:
+        limit = 20
+
+    results = search(request.user, request.query_params.get('q', ''), types=types, limit=limit, **filters)
+    return Response({'results': results})
+
+@api_view(['GET'])
+def sync_changes(request):
+    """
+    Delta sync for offline clients.
+    Without ?since= returns everything (full=true); with the token from the
+    previous response returns only rows created/updated since then plus the
+    ids deleted since then, across groups, categories, options, presets,
+    goals, notes, achievements and recommendations.
+    """
+    since = None
+    token = request.query_params.get('since')
+    if token:
+        since = decode_token(token)
+        if since is None:
+            return Response({'error': 'Invalid sync token.'}, status=400)
+    return Response(build_changes(request.user, since))
+
+# --- Live Events (Server-Sent Events) ---
+
+async def _authenticate_stream(request):
+    """
+    Plain async view, so resolve the user the same way the API does:
+    Token header first, then the session.
+    """
+    try:
+        auth = await sync_to_async(TokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    if auth:
+        return auth[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+async def event_stream(request):
+    """
+    Per-user SSE stream of new chat messages, new recommendations and
+    streamed reply chunks. Serve under ASGI (mantor.asgi) so each open
+    stream doesn't pin a worker thread.
+    Resume with the Last-Event-ID header (or ?last_event_id= on first connect).
+    """
+    user = await _authenticate_stream(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    cursor = StreamCursor.parse(last_event_id) if last_event_id else None
+
+    response = StreamingHttpResponse(stream_events(user.id, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
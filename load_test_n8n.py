@@ -0,0 +1,197 @@
+"""
+End-to-end load test of the n8n integration paths against fake_n8n.py.
+
+    python load_test_n8n.py --spawn-fake --latency lognormal:-1.5,0.6 --concurrency 16 --chat 200 --notes 200 --plans 50
+
+Runs on throwaway test databases, one per alias (loadtest_<alias>.sqlite3,
+deleted afterwards), and exercises:
+    chat   POST /chat_messages/  -> post_save signal -> n8n thread -> assistant reply saved
+    notes  POST /notes/          -> post_save signal -> context payload to n8n
+    plans  POST /recommendations/generate_plan/ (synchronous n8n call)
+
+Reports p50/p95/p99 request latency per path, peak thread count and the lag
+between a user chat message being saved and the assistant reply landing in
+the database.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, errors):
+    ms = [v * 1000 for v in latencies]
+    print(f"{name:<8} n={len(ms):<5} errors={errors:<4} "
+          f"p50={percentile(ms, 50):8.1f}ms  p95={percentile(ms, 95):8.1f}ms  p99={percentile(ms, 99):8.1f}ms  "
+          f"max={max(ms) if ms else 0:8.1f}ms")
+
+
+class ThreadSampler(threading.Thread):
+    """Samples threading.active_count() until stopped."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the n8n integration")
+    parser.add_argument('--n8n-url', default='http://127.0.0.1:5678')
+    parser.add_argument('--spawn-fake', action='store_true', help="Run fake_n8n in-process on the --n8n-url port")
+    parser.add_argument('--latency', default='fixed:0.05')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--started-rate', type=float, default=0.0)
+    parser.add_argument('--stream-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--chat', type=int, default=100)
+    parser.add_argument('--notes', type=int, default=100)
+    parser.add_argument('--plans', type=int, default=20)
+    parser.add_argument('--lag-timeout', type=float, default=60.0, help="Max wait for assistant replies to land")
+    args = parser.parse_args()
+
+    # Must be set before Django settings are loaded
+    os.environ['N8N_BASE_URL'] = args.n8n_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mantor.settings')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    if args.spawn_fake:
+        from urllib.parse import urlparse
+        from fake_n8n import make_server
+        parsed = urlparse(args.n8n_url)
+        server, fake_config = make_server(
+            parsed.hostname, parsed.port or 80, latency=args.latency, error_rate=args.error_rate,
+            started_rate=args.started_rate, stream_rate=args.stream_rate
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment
+    from django.contrib.auth.models import User
+    from life_manager.models import StatusGroup, StatusOption, SituationContext, ChatSession, ChatMessage
+
+    setup_test_environment()
+    # Throwaway databases for every alias (chat rows live in the chat database),
+    # on disk so the worker threads share them
+    test_names = [str(settings.BASE_DIR / f'loadtest_{alias}.sqlite3') for alias in connections]
+    for alias, name in zip(connections, test_names):
+        connections[alias].settings_dict['TEST']['NAME'] = name
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+
+    try:
+        user = User.objects.create_user('loadtest', password='loadtest')
+        group = StatusGroup.objects.create(name='Load Test')
+        options = [StatusOption.objects.create(group=group, name=f"Option {i}") for i in range(10)]
+        contexts = []
+        for i in range(10):
+            context = SituationContext.objects.create(unique_signature=f"load-{i}")
+            context.options.add(*options[i:i + 3])
+            contexts.append(context)
+        sessions = [ChatSession.objects.create(user=user, title=f"Load {i}") for i in range(args.concurrency)]
+
+        results = {'chat': [], 'notes': [], 'plans': []}
+        errors = {'chat': 0, 'notes': 0, 'plans': 0}
+        sent_messages = []  # (session_id, message_id, saved_at)
+        lock = threading.Lock()
+
+        def run(kind, i):
+            client = Client()
+            client.force_login(user)
+            start = time.perf_counter()
+            try:
+                if kind == 'chat':
+                    session = sessions[i % len(sessions)]
+                    response = client.post('/chat_messages/', {'session': session.id, 'role': 'user', 'content': f"Hello {i}"},
+                                           content_type='application/json')
+                    if response.status_code == 201:
+                        with lock:
+                            sent_messages.append((session.id, response.json()['id'], time.time()))
+                elif kind == 'notes':
+                    response = client.post('/notes/', {'context': contexts[i % len(contexts)].id, 'title': f"Note {i}", 'content': 'Body'},
+                                           content_type='application/json')
+                else:
+                    # Every other plan repeats a payload, to exercise caching/coalescing
+                    response = client.post('/recommendations/generate_plan/',
+                                           {'context_id': contexts[(i // 2) % len(contexts)].id, 'goals': [{'title': f"Goal {i // 2}"}]},
+                                           content_type='application/json')
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                results[kind].append(elapsed)
+                if not ok:
+                    errors[kind] += 1
+            connections.close_all()
+
+        sampler = ThreadSampler()
+        sampler.start()
+        wall_start = time.perf_counter()
+        jobs = [('chat', i) for i in range(args.chat)] + [('notes', i) for i in range(args.notes)] + [('plans', i) for i in range(args.plans)]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda job: run(*job), jobs))
+        wall = time.perf_counter() - wall_start
+
+        # Persistence lag: user message saved -> assistant reply row exists
+        lags = []
+        pending = list(sent_messages)
+        deadline = time.time() + args.lag_timeout
+        while pending and time.time() < deadline:
+            still_pending = []
+            for session_id, message_id, saved_at in pending:
+                reply = ChatMessage.objects.filter(session_id=session_id, role='assistant', id__gt=message_id).order_by('id').first()
+                if reply:
+                    lags.append(max(0.0, reply.timestamp.timestamp() - saved_at))
+                else:
+                    still_pending.append((session_id, message_id, saved_at))
+            pending = still_pending
+            if pending:
+                time.sleep(0.2)
+        sampler.stop()
+
+        print(f"\n--- n8n load test ({args.concurrency} workers, {len(jobs)} requests in {wall:.1f}s, "
+              f"{len(jobs) / wall if wall else 0:.1f} req/s) ---")
+        for kind in ('chat', 'notes', 'plans'):
+            summarize(kind, results[kind], errors[kind])
+        summarize('lag', lags, len(pending))
+        print(f"threads  start={threading.active_count()} peak={sampler.peak}")
+        print(f"replies  saved={len(lags)} missing={len(pending)} (missing includes 'Workflow was started' and errors)")
+        if args.spawn_fake:
+            print(f"fake n8n {fake_config.stats}")
+    finally:
+        connections.close_all()
+        runner.teardown_databases(old_config)
+        # WAL files of connections reply threads still held
+        for name in test_names:
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(name + suffix):
+                    os.remove(name + suffix)
+
+
+if __name__ == "__main__":
+    main()
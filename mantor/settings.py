@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # First, so its timings cover the rest of the stack
+    'life_manager.middleware.QueryInstrumentationMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,13 +88,64 @@ WSGI_APPLICATION = 'mantor.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite is shared by request threads and the n8n worker threads:
+# - WAL lets readers run while a write is in progress
+# - synchronous=NORMAL is durable in WAL mode except across a power loss
+# - write transactions (atomic blocks) take the write lock up front with
+#   BEGIN IMMEDIATE, so they queue on the busy timeout instead of failing
+#   with "database is locked" when upgrading a read lock
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    'PRAGMA cache_size=-32000',  # KiB, per connection
+    'PRAGMA temp_store=MEMORY',
+]
+
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(SQLITE_PRAGMAS),
+    'transaction_mode': 'IMMEDIATE',
+    # Busy timeout, in seconds
+    'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+}
+
+# Reads only; SQLite rejects writes on these connections
+SQLITE_READ_ONLY_OPTIONS = {
+    'init_command': ';'.join(['PRAGMA query_only=ON'] + SQLITE_PRAGMAS[2:]),
+    'timeout': SQLITE_OPTIONS['timeout'],
+}
+
+# 'chat': ChatSession/ChatMessage, written by the n8n worker threads, in their
+# own file so they don't contend with the main database's write lock.
+# 'replica': read-only connection for analytics queries; a copy of the main
+# database (SQLITE_REPLICA_PATH, e.g. kept in sync by litestream), or by
+# default the main file itself. Routing: life_manager/routers.py.
+# Migrate each database: manage.py migrate && manage.py migrate --database=chat
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': SQLITE_OPTIONS,
+    },
+    'chat': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_CHAT_PATH', BASE_DIR / 'chat.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_REPLICA_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': SQLITE_READ_ONLY_OPTIONS,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['life_manager.routers.DatabaseRouter']
+
+CHAT_DATABASE = 'chat'
+
+ANALYTICS_DATABASE = 'replica'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,4 +193,124 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Keyset pagination on every list endpoint; clients may ask for up to 200 with ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'life_manager.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
+
+
+# Chat history sent to n8n
+# The newest messages go verbatim until the token budget (~4 chars per token)
+# is spent; older ones are folded into ChatSession.summary every N messages.
+
+CHAT_HISTORY_TOKEN_BUDGET = 2000
+
+CHAT_HISTORY_MAX_TAIL = 40
+
+CHAT_SUMMARY_EVERY = 10
+
+CHAT_SUMMARY_MAX_CHARS = 4000
+
+
+# n8n integration
+
+N8N_BASE_URL = os.environ.get('N8N_BASE_URL', 'http://localhost:5678')
+
+# Batch mode: context payloads are collected and sent as one gzip-compressed
+# array to the context-batch webhook per flush interval (or once MAX_SIZE
+# payloads are pending). Failed items are retried individually.
+
+N8N_CONTEXT_BATCH_ENABLED = os.environ.get('N8N_CONTEXT_BATCH_ENABLED', '') == '1'
+
+N8N_CONTEXT_BATCH_FLUSH_SECONDS = 2.0
+
+N8N_CONTEXT_BATCH_MAX_SIZE = 100
+
+N8N_CONTEXT_BATCH_MAX_ATTEMPTS = 3
+
+# Circuit breaker around all n8n calls: after FAILURE_THRESHOLD consecutive
+# failures calls fail fast; after RESET_SECONDS one probe call is let through
+# and closes the circuit again if it succeeds.
+
+N8N_CIRCUIT_FAILURE_THRESHOLD = 5
+
+N8N_CIRCUIT_RESET_SECONDS = 30
+
+# generate_plan results are cached per user and normalized payload (seconds).
+# Per process: the default cache is local memory and identical requests are
+# coalesced with an in-process lock. A request waiting on an identical one in
+# flight gives up after PLAN_SINGLE_FLIGHT_TIMEOUT seconds with a 503 asking
+# to retry after PLAN_RETRY_AFTER_SECONDS.
+
+PLAN_CACHE_TTL = 600
+
+PLAN_SINGLE_FLIGHT_TIMEOUT = 150
+
+PLAN_RETRY_AFTER_SECONDS = 5
+
+# Delta sync (GET /sync/?since=<token>)
+# Tokens older than the tombstone retention get a full sync instead.
+
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+SYNC_CLOCK_SKEW_SECONDS = 5
+
+# Bulk write endpoints (POST/PATCH <resource>/bulk/): max rows per request
+
+BULK_MAX_ITEMS = 500
+
+# Read-only list/retrieve of options, goals and contexts via .values() dicts
+# instead of ModelSerializers (same JSON). Per request: ?fast=1 / ?fast=0
+
+FAST_READ_SERIALIZATION = False
+
+# SQL instrumentation (life_manager.middleware): Server-Timing header on
+# sampled responses, per-route stats at /metrics/ (admin only, Prometheus format)
+
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('SQL_INSTRUMENTATION_SAMPLE_RATE', '1.0'))
+
+SQL_SLOW_QUERY_MS = 100
+
+SQL_INSTRUMENTATION_TOP_N = 3
+
+# Related contexts (life_manager.related): per-process index of each user's
+# contexts, for the dashboard and GET contexts/<id>/related/
+
+RELATED_CONTEXTS_TOP_K = 20
+
+RELATED_CONTEXTS_MIN_SIMILARITY = 0.25
+
+RELATED_CONTENT_LIMIT = 10
+
+RELATED_CONTEXT_INDEX_MAX_USERS = 256
+
+# Related notes (life_manager.tfidf): TF-IDF cosine over each user's notes,
+# for GET notes/<id>/related/. N8N_CONTEXT_RELEVANT_NOTES > 0 adds that many
+# of the owners' most relevant notes from other contexts to context payloads.
+
+RELATED_NOTES_LIMIT = 10
+
+RELATED_NOTES_MIN_SIMILARITY = 0.05
+
+RELATED_NOTES_MAX_USERS = 64
+
+N8N_CONTEXT_RELEVANT_NOTES = 0
+
+# Chat archive (life_manager.archive, manage.py archive_chats): messages of
+# sessions inactive this long move to one zlib-compressed transcript per session
+
+CHAT_ARCHIVE_AFTER_DAYS = 30
+
+CHAT_ARCHIVE_COMPRESSION_LEVEL = 6
+
+# Context usage statistics and quick switch (life_manager.quick_switch):
+# dashboard visits count visits and dwell time per context (dwell capped per
+# visit), GET contexts/quick_switch/ lists the most recent and most visited
+
+CONTEXT_DWELL_MAX_SECONDS = 1800
+
+CONTEXT_QUICK_SWITCH_LIMIT = 10
+
+CONTEXT_QUICK_SWITCH_MAX_USERS = 1024
+
+DASHBOARD_RECENT_CONTEXTS = 6
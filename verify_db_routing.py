@@ -0,0 +1,124 @@
+"""
+Checks the database routing (life_manager/routers.py) end to end, on
+throwaway test databases created for every alias in DATABASES:
+
+    python verify_db_routing.py
+
+- chat sessions and messages created through the API land in the chat
+  database, everything else in the main one
+- links between them (Note.chat_session, ...) resolve, in the goal workspace too
+- chat search runs on the chat database
+- deleting a chat session unlinks it, deleting a user deletes their chat
+- analytics read through the replica alias, whose connection options reject writes
+"""
+import os
+import sys
+
+
+def main():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mantor.settings')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+    from django.test import Client
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment
+    from django.contrib.auth.models import User
+    from life_manager.models import SituationContext, Note, PersonalGoal, ChatSession, ChatMessage
+    from life_manager.routers import chat_db, analytics_db
+    from life_manager.services import AnalyticsService
+
+    failures = []
+
+    def check(label, ok, detail=''):
+        print(f"{'SUCCESS' if ok else 'FAILURE'}: {label}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failures.append(label)
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        print(f"--- Routing: chat -> '{chat_db()}', analytics -> '{analytics_db()}' ---")
+        check("chat models are written to the chat database",
+              router.db_for_write(ChatSession) == router.db_for_write(ChatMessage) == chat_db())
+        check("other models are written to the main database", router.db_for_write(Note) == DEFAULT_DB_ALIAS)
+        check("chat tables are only migrated on the chat database",
+              router.allow_migrate(chat_db(), 'life_manager', model_name='chatmessage') is not False
+              and (chat_db() == DEFAULT_DB_ALIAS
+                   or router.allow_migrate(DEFAULT_DB_ALIAS, 'life_manager', model_name='chatmessage') is False))
+
+        user = User.objects.create_user('routing-check', password='routing-check')
+        context = SituationContext.objects.create(unique_signature='routing-check')
+        client = Client()
+        client.force_login(user)
+
+        print("\n--- Writes across databases ---")
+        response = client.post('/notes/', {'title': 'Routing note', 'content': 'Where does the chat go?',
+                                           'context': context.id}, content_type='application/json')
+        check("note created through the API", response.status_code == 201, response.content[:200])
+        note = Note.objects.get(title='Routing note')
+        check("its chat session is in the chat database", note.chat_session_id is not None
+              and ChatSession.objects.using(chat_db()).filter(id=note.chat_session_id).exists())
+        if chat_db() != DEFAULT_DB_ALIAS:
+            check("the main database has no chat tables",
+                  ChatSession._meta.db_table not in connections[DEFAULT_DB_ALIAS].introspection.table_names())
+        check("the link resolves from the note", note.chat_session.title == 'Chat: Routing note')
+        check("and from the session", ChatSession.objects.get(id=note.chat_session_id).note_linked.id == note.id)
+
+        response = client.post('/chat_messages/', {'session': note.chat_session_id, 'role': 'user',
+                                                   'content': 'Thinking about lighthouses today'},
+                               content_type='application/json')
+        check("message posted through the API", response.status_code == 201, response.content[:200])
+        response = client.get('/search/', {'q': 'lighthouses', 'types': 'chat'})
+        hits = response.json().get('results', []) if response.status_code == 200 else []
+        check("chat search finds it on the chat database", any(hit['type'] == 'chat' for hit in hits),
+              response.content[:200])
+
+        goal = PersonalGoal.objects.create(user=user, title='Routing goal', context=context)
+        session = ChatSession.objects.create(user=user, title='Goal chat')
+        PersonalGoal.objects.filter(id=goal.id).update(chat_session=session)
+        response = client.get(f'/goals/{goal.id}/workspace/')
+        check("goal workspace includes the chat session", response.status_code == 200
+              and str(session.id) in response.content.decode(), response.content[:200])
+
+        print("\n--- Cascades ---")
+        session.delete()
+        check("deleting a chat session unlinks it", PersonalGoal.objects.get(id=goal.id).chat_session_id is None)
+        chatter = User.objects.create_user('routing-chatter', password='routing-check')
+        chatter_session = ChatSession.objects.create(user=chatter, title='Chatter')
+        ChatMessage.objects.create(session=chatter_session, role='user', content='Only chatting')
+        chatter_id = chatter.id
+        chatter.delete()
+        check("deleting a user deletes their chat", not ChatSession.objects.filter(user_id=chatter_id).exists()
+              and not ChatMessage.objects.filter(session_id=chatter_session.id).exists())
+
+        print("\n--- Analytics replica ---")
+        streaks = AnalyticsService.calculate_streaks(None)
+        check("analytics read through the replica alias", isinstance(streaks, list))
+        replica = DatabaseWrapper({**connections[DEFAULT_DB_ALIAS].settings_dict,
+                                   'OPTIONS': settings.SQLITE_READ_ONLY_OPTIONS}, alias='replica-check')
+        try:
+            with replica.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM life_manager_note")
+                try:
+                    cursor.execute("DELETE FROM life_manager_note")
+                    check("replica connections reject writes", False, "DELETE succeeded")
+                except OperationalError as exc:
+                    check("replica connections reject writes", 'readonly' in str(exc) or 'read-only' in str(exc), exc)
+        finally:
+            replica.close()
+    finally:
+        runner.teardown_databases(old_config)
+
+    print(f"\n{'All checks passed.' if not failures else f'{len(failures)} check(s) failed.'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()